@@ -1,90 +1,169 @@
 
 import cv2
 import numpy as np
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, send_file
 from flask_cors import CORS
 import time
 import threading
 import os
 from datetime import datetime
 import random
+import argparse
+import atexit
+import copy
+import multiprocessing
+from functools import partial
 import pymongo
 from bson import ObjectId
+from inference import InferenceEngine, decode_detections
+from tracker import TrackIdAllocator, VehicleTracker
+from pipeline import LatestFrameBuffer, StageStats
+from streaming import FrameBroadcaster
+from asgi import AsyncTrafficServer, run_async_server
+from events import EventBus, EventStreamSession, parse_resume_token
+from emergency import EmergencyColorMap
+from metrics import PipelineMetrics
+from controller import AdaptiveController
+from evidence import EvidenceEncoder, EvidenceStore
+from history import TrafficHistory
+from models import load_model_registry
+from motion import MotionGate
+from registry import load_intersection_registry
+from replay import ReplaySource
+from scheduler import FairScheduler
+from simulation import TrafficSimulator
+from signals import NEXT_PHASE, PhaseTimer, phase_duration, traffic_level
+from shm_transport import (ADAPTIVE_STATS_DTYPE, MOTION_STATS_DTYPE, PIPELINE_METRICS_DTYPE, WORKER_METRIC_STAGES,
+                           SharedDetectionState, SharedFrameRing, SharedSignalBoard, SharedStatsBoard)
+from violations import MongoViolationStore, SQLiteViolationStore, ViolationWriter, VIOLATION_FIELDS
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes
 
-# MongoDB setup - connect to local MongoDB or skip if not available
+# Per-stage latency histograms and counters, served in Prometheus format at /api/metrics
+pipeline_metrics = PipelineMetrics()
+metrics_config = {
+    "publish_interval": 1.0  # Worker mode: seconds between copies of a camera's metrics to the web process
+}
+
+# Violation storage: MongoDB if available, otherwise an embedded store (opened by init_services)
 mongo_client = None
 db = None
-try:
-    mongo_client = pymongo.MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=2000)
-    mongo_client.server_info()  # Will raise exception if connection fails
-    db = mongo_client["traffic_management"]
-    violations_collection = db["violations"]
-    print("Successfully connected to MongoDB")
-except Exception as e:
-    print(f"Warning: Could not connect to MongoDB: {e}")
-    print("Vehicle violations will not be stored in database")
+violation_store = None
+
+# Embedded violation store used when MongoDB is not available
+local_store_config = {
+    "path": os.path.join(os.path.dirname(os.path.abspath(__file__)), 'violations.db'),
+    "retention_days": 90,  # Monthly partitions older than this are dropped
+    "compaction_interval": 3600  # Seconds between compaction passes
+}
+
+# Violation query API paging limits
+violation_query_config = {
+    "default_limit": 50,
+    "max_limit": 200
+}
+
+# Write-behind violation persistence (batched off the detection/API threads)
+violation_writer_config = {
+    "max_queue_size": 10000,  # Violations held in memory before spilling to disk
+    "batch_size": 100,  # Documents per insert_many
+    "flush_interval": 1.0,  # Seconds before a partial batch is written
+    "max_retries": 3,  # Retries (with exponential backoff) before spilling a batch
+    "retry_backoff": 0.5,  # Initial retry delay in seconds
+    "max_replay_delay": 60.0,  # Longest wait between failed replays of the spill file
+    "spill_path": os.path.join(os.path.dirname(os.path.abspath(__file__)), 'violations_spill.jsonl')
+}
+violation_writer = None
+
+# Violation evidence snapshots (encoded and written off the request/detection threads)
+evidence_config = {
+    "root": os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evidence'),
+    "max_bytes": 2 * 1024 ** 3,  # Oldest snapshots are evicted beyond this total size
+    "workers": 2,  # Encoder threads
+    "max_pending": 64,  # Captures queued before new ones are dropped
+    "frame_quality": 85,  # JPEG quality of the full frame
+    "roi_quality": 95,  # JPEG quality of the vehicle crop
+    "cache_max_age": 31536000  # Snapshots never change, so clients may cache them for a year
+}
+evidence_store = None
+evidence_encoder = None
+
+# Intersections, camera sources and neighbour relations
+intersections_config_path = os.environ.get(
+    "INTERSECTIONS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intersections.json'))
+intersection_registry = load_intersection_registry(intersections_config_path)
+print(f"Loaded {len(intersection_registry)} intersections from {intersections_config_path}")
+
+# Detection models cameras can choose from (model files live in the yolo directory)
+models_config_path = os.environ.get(
+    "MODELS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models.json'))
+model_registry = load_model_registry(models_config_path, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolo'))
+for intersection in intersection_registry:
+    if intersection.model is not None and intersection.model not in model_registry:
+        raise ValueError(f"Unknown model {intersection.model} for intersection {intersection.id}")
 
 # Store the latest traffic data
 traffic_data = {
-    "int-001": {"vehicleCount": 0, "hasEmergencyVehicle": False, "timestamp": ""},
-    "int-002": {"vehicleCount": 0, "hasEmergencyVehicle": False, "timestamp": ""},
+    intersection_id: {"vehicleCount": 0, "hasEmergencyVehicle": False, "timestamp": ""}
+    for intersection_id in intersection_registry.ids()
 }
 
 # Traffic signal status
-traffic_signals = {
-    "int-001": "red",
-    "int-002": "green",
+traffic_signals = {intersection.id: intersection.initial_signal for intersection in intersection_registry}
+
+# Vehicle count and signal history kept in memory for /api/traffic/history
+history_config = {
+    "raw_capacity": 3600,  # Latest detection results and signal changes kept per intersection
+    "rollups": {  # Resolution -> (bucket seconds, buckets kept)
+        "1s": (1, 3600),
+        "1m": (60, 1440),
+        "1h": (3600, 720)
+    },
+    "default_resolution": "1m",
+    "default_points": 60  # Buckets (or seconds of raw records) returned when no range is given
 }
+traffic_history = TrafficHistory(traffic_signals, history_config["raw_capacity"], history_config["rollups"])
 
-# Automatic control configuration
-auto_control = {
-    "int-001": {
-        "enabled": False,
-        "last_change_time": time.time(),
-        "cycle_times": {
-            "red": 30,  # 30 seconds for red
-            "yellow": 5,  # 5 seconds for yellow
-            "green": 30,  # 30 seconds for green
-        },
-        "vehicle_thresholds": {
-            "low": 5,    # 0-5 vehicles
-            "medium": 15,  # 6-15 vehicles
-            "high": 99999  # >15 vehicles
-        },
-        "cycle_adjustments": {
-            "low": 0.7,     # Reduce times by 30%
-            "medium": 1.0,  # Normal times
-            "high": 1.3,    # Increase times by 30%
-        }
+# Automatic control settings applied to every intersection
+auto_control_defaults = {
+    "enabled": False,
+    "cycle_times": {
+        "red": 30,  # 30 seconds for red
+        "yellow": 5,  # 5 seconds for yellow
+        "green": 30,  # 30 seconds for green
     },
-    "int-002": {
-        "enabled": False,
-        "last_change_time": time.time(),
-        "cycle_times": {
-            "red": 30,  # 30 seconds for red
-            "yellow": 5,  # 5 seconds for yellow
-            "green": 30,  # 30 seconds for green
-        },
-        "vehicle_thresholds": {
-            "low": 5,    # 0-5 vehicles
-            "medium": 15,  # 6-15 vehicles
-            "high": 99999  # >15 vehicles
-        },
-        "cycle_adjustments": {
-            "low": 0.7,     # Reduce times by 30%
-            "medium": 1.0,  # Normal times
-            "high": 1.3,    # Increase times by 30%
-        }
+    "vehicle_thresholds": {
+        "low": 5,    # 0-5 vehicles
+        "medium": 15,  # 6-15 vehicles
+        "high": 99999  # >15 vehicles
+    },
+    "cycle_adjustments": {
+        "low": 0.7,     # Reduce times by 30%
+        "medium": 1.0,  # Normal times
+        "high": 1.3,    # Increase times by 30%
     }
 }
 
+# Automatic control configuration (each intersection's phase plan may override the cycle times)
+auto_control = {
+    intersection.id: dict(copy.deepcopy(auto_control_defaults), last_change_time=time.time())
+    for intersection in intersection_registry
+}
+for intersection in intersection_registry:
+    auto_control[intersection.id]["cycle_times"].update(intersection.phase_plan)
+
+# Fires every automatic phase change at its due time (see schedule_phase_end)
+signal_timer = PhaseTimer("signal-phases")
+
 # Configuration for emergency vehicle detection
 emergency_config = {
     "min_size": 80,  # Minimum size of emergency vehicle to detect
     "confidence_threshold": 0.5,  # Confidence threshold for detection
+    "min_color_percent": 5,  # Share of red or blue light pixels that marks an emergency vehicle
+    "color_map_scale": 1.0,  # Below 1, emergency colours are mapped on a frame downscaled by this factor (faster,
+                             # but small or distant lights may fall under min_color_percent)
+    "screen_skipped_frames": True  # Re-check the last detected vehicles on frames that skip inference
 }
 
 # Two-wheeler violation detection configuration
@@ -94,234 +173,424 @@ two_wheeler_config = {
     "person_count_threshold": 2  # Maximum allowed people on a two-wheeler
 }
 
-# Store detected vehicle information
-detected_vehicles = {
-    "int-001": [],  # List to store vehicle data like position, speed, etc.
-    "int-002": []   # List to store vehicle data for the second intersection
+# Vehicle detection configuration
+detection_config = {
+    "vehicle_classes": ["car", "truck", "bus", "motorcycle", "bicycle"],
+    "nms_threshold": 0.4  # IoU above which overlapping boxes are suppressed
 }
 
-# Last stored vehicle positions for speed estimation
-last_vehicle_positions = {
-    "int-001": {},  # Dictionary of vehicle IDs to positions
-    "int-002": {}   # Dictionary of vehicle IDs to positions for the second intersection
+# Store detected vehicle information
+detected_vehicles = {intersection_id: [] for intersection_id in intersection_registry.ids()}
+
+# Vehicle tracking configuration
+tracker_config = {
+    "iou_threshold": 0.3,  # Minimum overlap to continue a track
+    "max_distance": 50,  # Centre distance (pixels) still considered the same vehicle
+    "max_age": 2.0,  # Seconds a track survives without being detected
+    "cell_size": 64  # Spatial index cell size in pixels
 }
 
-# Vehicle ID counter
-next_vehicle_id = 1
+# Vehicle ID allocation shared by all intersections
+vehicle_id_allocator = TrackIdAllocator()
+
+def create_vehicle_tracker():
+    """
+    Create a tracker for one camera using the shared ID allocator
+    """
+    return VehicleTracker(
+        vehicle_id_allocator,
+        iou_threshold=tracker_config["iou_threshold"],
+        max_distance=tracker_config["max_distance"],
+        max_age=tracker_config["max_age"],
+        cell_size=tracker_config["cell_size"]
+    )
+
+# Live vehicle tracks per intersection (used for identity and speed estimation)
+vehicle_trackers = {intersection_id: create_vehicle_tracker() for intersection_id in intersection_registry.ids()}
 
 # Lock for thread-safe access to shared data
 data_lock = threading.Lock()
-# Latest frames for video streaming
-latest_frames = {
-    "int-001": None,
-    "int-002": None
+
+# Delta events pushed to dashboard clients (published while holding data_lock)
+traffic_events = EventBus(history_size=1000)
+event_stream_config = {
+    "keepalive_interval": 15  # Seconds between SSE keepalive comments
+}
+# Frame each intersection's detected_vehicles were found in (for evidence)
+detection_frames = {intersection_id: None for intersection_id in intersection_registry.ids()}
+detection_frame_seqs = {intersection_id: None for intersection_id in intersection_registry.ids()}  # Worker mode: raw ring seq
+last_detection_times = {intersection_id: 0.0 for intersection_id in intersection_registry.ids()}
+
+# Encode-once JPEG fan-out of the processed frames to stream viewers; each
+# broadcaster also holds the current front buffer of its stream
+frame_broadcasters = {intersection_id: FrameBroadcaster(intersection_id, pipeline_metrics)
+                      for intersection_id in intersection_registry.ids()}
+
+# Shared inference engine (one copy of the model for all cameras)
+inference_engines = {}  # Model name -> engine
+inference_engine_lock = threading.Lock()
+inference_config = {
+    "input_size": 416,  # Network input width/height
+    "max_batch_size": 8,  # Maximum frames batched into one forward pass
+    "max_batch_wait": 0.005,  # Seconds to wait for other cameras to join a batch
+    "result_timeout": 10.0  # Seconds a camera waits for its forward pass before giving up on the frame
 }
-processed_frames = {
-    "int-001": None,
-    "int-002": None
-}  # Store the processed frames separately
-frame_lock = threading.Lock()
 
 # Frame processing configuration
 frame_processing = {
-    "skip_frames": 5,  # Process only every Nth frame
-    "last_full_process_time": 0,
+    "skip_frames": 2,  # While the scene is moving, detect on every Nth frame
     "frame_quality": 70,  # JPEG quality for streaming (0-100)
     "max_width": 640,  # Maximum width for streaming
     "stream_fps": 15  # Target FPS for streaming
 }
 
-def coordinate_traffic_signals():
+# Named stream profiles, each encoded and cached independently
+stream_profiles = {
+    "thumbnail": {"max_width": 320, "quality": 50, "fps": 1},  # Overview tiles and remote sites
+    "operator": {"max_width": 640, "quality": 70, "fps": 5},  # Control room dashboard
+    "evidence": {"max_width": 1280, "quality": 90, "fps": 15}  # Full detail for review
+}
+
+# Motion gating: the detector only runs when the scene has changed since its last pass
+motion_config = {
+    "enabled": True,  # False runs the detector on every skip_frames-th frame regardless of motion
+    "thumbnail_width": 160,  # Frames are compared as grayscale thumbnails this wide
+    "pixel_threshold": 25,  # Grey-level change that marks a thumbnail pixel as changed
+    "min_motion": 0.005,  # Share of changed pixels that counts as motion
+    "max_static_interval": 5.0,  # Seconds between refresh detections on a static scene
+    "rate_window": 10.0  # Seconds over which the inference rate is measured
+}
+
+# Per-intersection motion gates (in the process that runs the camera)
+motion_gates = {}
+
+# Closed-loop tuning of each camera's frame skip and network input size
+adaptive_config = {
+    "enabled": True,  # False keeps skip_frames and the engine's input size fixed
+    "target_latency": 0.5,  # Seconds from frame capture to detection result
+    "busy_budget": 0.5,  # Share of wall time one camera's detection may keep a worker busy
+    "input_sizes": [320, 416, 608],  # Network input sizes to choose from (multiples of 32)
+    "min_skip_frames": 1,
+    "max_skip_frames": 10,
+    "tolerance": 0.2,  # Dead band around the targets
+    "smoothing": 0.2,  # Weight of the newest measurement in the moving averages
+    "cooldown": 2.0  # Seconds between adjustments
+}
+
+# Per-intersection adaptive controllers (in the process that runs the camera)
+adaptive_controllers = {}
+
+# Recorded clips replayed instead of live cameras ("replay:<video file or image directory>" cameras)
+replay_config = {
+    "pace": "realtime",  # realtime: at the clip's frame rate; fast: as fast as the pipeline takes frames
+    "backpressure_timeout": 5.0,  # fast: seconds a frame for inference waits for the previous one to be taken
+    "loop": True,  # Start the clip over at its end (False: the camera stops)
+    "image_fps": 15.0  # Frame rate of image directories
+}
+
+# Replay sources by intersection (in the process that runs the camera)
+replay_sources = {}
+
+# Camera-free simulation (python app.py --simulate): synthetic detection results for every configured intersection
+simulation_config = {
+    "detection_interval": 0.5,  # Seconds between detection results per intersection
+    "arrival_rate": (0.05, 0.5),  # Range of mean vehicle arrivals per second (drawn per intersection)
+    "discharge_rate": 0.8,  # Vehicles leaving per second while the signal is green
+    "wave_amplitude": 0.5,  # Demand swings this far above and below the mean
+    "wave_period": 900.0,  # Seconds per demand wave
+    "two_wheeler_share": 0.15,
+    "helmet_violation_rate": 0.1,  # Share of two-wheelers without a helmet
+    "passenger_violation_rate": 0.05,  # Share of two-wheelers with too many passengers
+    "emergency_rate": 1.0,  # Emergency vehicles per intersection per hour
+    "emergency_duration": (10.0, 30.0),  # Seconds an emergency vehicle stays in view
+    "auto_control": True,  # Start every intersection in auto mode
+    "threads": 4,  # Threads applying results, standing in for detection workers
+    "seed": 42
+}
+traffic_simulator = None
+
+# Capture / inference / render pipeline configuration
+pipeline_config = {
+    "buffer_size": 1  # Frames held between stages (oldest is dropped when full)
+}
+
+# Per-intersection pipeline buffers and stage counters
+pipeline_stats = {}
+metrics_published = {}  # Worker mode: intersection -> last time its metrics were copied to the web process
+
+# Inference and render steps for every camera share one pool of workers:
+# one per core for the numpy/drawing work, plus one per inference batch slot
+# because a worker waiting on the shared engine holds no CPU
+scheduler_config = {
+    "workers": (os.cpu_count() or 4) + inference_config["max_batch_size"]
+}
+detection_scheduler = FairScheduler("detection", scheduler_config["workers"])
+
+# Multi-process detection (python app.py --detection-workers N): each worker
+# process runs capture, inference and rendering for a group of cameras and
+# shares frames and results with the web process through shared memory
+worker_config = {
+    "frame_slots": 4,  # Frames per shared ring; a reader must finish with a frame before the writer wraps around
+    "max_frame_shape": (720, 1280, 3),  # Largest frame a ring slot holds; larger frames are downscaled
+    "max_vehicles": 128,  # Detections per intersection in the shared state block
+    "poll_interval": 0.005  # Seconds between checks for new frames and results in the web process
+}
+shared_transport = None  # Shared memory rings, state blocks and signal board in worker mode
+detection_workers = []
+
+def init_services():
     """
-    Coordinates traffic signals between intersections to optimize traffic flow
+    Connect the violation store (MongoDB, or the embedded store when MongoDB
+    is not available) and start the violation writer and evidence encoder.
+    Called by the server entry point, so importing this module (e.g. from a
+    benchmark) has no side effects.
     """
-    while True:
+    global mongo_client, db, violation_store, violation_writer, evidence_store, evidence_encoder
+    
+    # MongoDB setup - connect to local MongoDB or skip if not available
+    try:
+        mongo_client = pymongo.MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=2000)
+        mongo_client.server_info()  # Will raise exception if connection fails
+        db = mongo_client["traffic_management"]
+        violation_store = MongoViolationStore(db["violations"])
+        print("Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"Warning: Could not connect to MongoDB: {e}")
+    
+    if violation_store is None:
         try:
-            with data_lock:
-                # If both intersections are in auto mode, coordinate their signals
-                if (auto_control["int-001"]["enabled"] and 
-                    auto_control["int-002"]["enabled"]):
-                    
-                    # Get current signals
-                    signal_1 = traffic_signals["int-001"]
-                    signal_2 = traffic_signals["int-002"]
-                    
-                    # If one is green, make sure the other is red (unless transitioning through yellow)
-                    if signal_1 == "green" and signal_2 != "yellow":
-                        traffic_signals["int-002"] = "red"
-                    elif signal_2 == "green" and signal_1 != "yellow":
-                        traffic_signals["int-001"] = "red"
-            
-            # Run at a reasonable interval
-            time.sleep(1)
+            violation_store = SQLiteViolationStore(
+                local_store_config["path"],
+                retention_days=local_store_config["retention_days"],
+                compaction_interval=local_store_config["compaction_interval"]
+            )
+            print(f"Storing violations locally in {local_store_config['path']}")
         except Exception as e:
-            print(f"Error in signal coordination: {e}")
-            time.sleep(1)
+            print(f"Warning: Could not open local violation store: {e}")
+            print("Vehicle violations will not be stored in database")
+    
+    if violation_store is not None:
+        try:
+            violation_store.ensure_indexes()
+        except Exception as e:
+            print(f"Warning: Could not create violation indexes: {e}")
+        
+        violation_writer = ViolationWriter(
+            violation_store,
+            violation_writer_config["spill_path"],
+            max_queue_size=violation_writer_config["max_queue_size"],
+            batch_size=violation_writer_config["batch_size"],
+            flush_interval=violation_writer_config["flush_interval"],
+            max_retries=violation_writer_config["max_retries"],
+            retry_backoff=violation_writer_config["retry_backoff"],
+            max_replay_delay=violation_writer_config["max_replay_delay"],
+            metrics=pipeline_metrics
+        ).start()
+        atexit.register(violation_writer.close)
+    
+    evidence_store = EvidenceStore(evidence_config["root"], max_bytes=evidence_config["max_bytes"])
+    evidence_encoder = EvidenceEncoder(
+        evidence_store,
+        workers=evidence_config["workers"],
+        max_pending=evidence_config["max_pending"],
+        frame_quality=evidence_config["frame_quality"],
+        roi_quality=evidence_config["roi_quality"]
+    ).start()
+
+def set_traffic_signal(intersection_id, status):
+    """
+    Change a traffic signal and publish the change to event subscribers.
+    Caller must hold data_lock.
+    """
+    if traffic_signals.get(intersection_id) != status:
+        traffic_signals[intersection_id] = status
+        traffic_events.publish("signal", intersection_id, status=status)
+        traffic_history.record_signal(intersection_id, status)
+        update_signal_board(intersection_id)
 
-def update_traffic_signal_automatic(intersection_id):
+def update_signal_board(intersection_id):
     """
-    Automatically update the traffic signal based on time and vehicle count
+    Mirror an intersection's signal state to detection worker processes.
+    Caller must hold data_lock.
     """
-    # Skip if auto mode is not enabled
-    if not auto_control[intersection_id]["enabled"]:
+    if shared_transport is not None:
+        shared_transport["board"].set(intersection_id, traffic_signals[intersection_id],
+                                      auto_control[intersection_id]["enabled"])
+
+def start_signal_phase(intersection_id, status, now):
+    """
+    Switch a signal to a new phase that starts now and, in auto mode,
+    schedule its end. Caller must hold data_lock.
+    """
+    set_traffic_signal(intersection_id, status)
+    auto_control[intersection_id]["last_change_time"] = now
+    schedule_phase_end(intersection_id)
+
+def schedule_phase_end(intersection_id):
+    """
+    (Re)schedule the end of an intersection's current phase from its phase
+    plan and current vehicle count, or cancel it outside auto mode. Called
+    whenever the phase, auto mode or traffic level changes; a deadline that
+    has already passed fires at once. Caller must hold data_lock.
+    """
+    control = auto_control[intersection_id]
+    if not control["enabled"]:
+        signal_timer.cancel(intersection_id)
         return
-        
-    current_time = time.time()
-    last_change_time = auto_control[intersection_id]["last_change_time"]
-    current_signal = traffic_signals[intersection_id]
-    
-    # Get current vehicle count
-    vehicle_count = traffic_data[intersection_id]["vehicleCount"]
-    
-    # Determine traffic level
-    thresholds = auto_control[intersection_id]["vehicle_thresholds"]
-    if vehicle_count <= thresholds["low"]:
-        traffic_level = "low"
-    elif vehicle_count <= thresholds["medium"]:
-        traffic_level = "medium"
-    else:
-        traffic_level = "high"
-    
-    # Adjust cycle times based on traffic
-    adjustment = auto_control[intersection_id]["cycle_adjustments"][traffic_level]
-    
-    # Get time for current phase
-    cycle_times = auto_control[intersection_id]["cycle_times"]
-    adjusted_time = cycle_times[current_signal] * adjustment
-    
-    # Check if we need to change the signal
-    if current_time - last_change_time >= adjusted_time:
-        # Change to next signal
-        if current_signal == "red":
-            new_signal = "green"
-        elif current_signal == "green":
-            new_signal = "yellow"
-        else:  # yellow
-            new_signal = "red"
-            
-        # Update signal
-        with data_lock:
-            traffic_signals[intersection_id] = new_signal
-            auto_control[intersection_id]["last_change_time"] = current_time
-            
-        print(f"Auto mode: Changed signal at {intersection_id} from {current_signal} to {new_signal} (Traffic: {traffic_level})")
-
-        # If both intersections are in auto mode, coordinate the other intersection's signal
-        other_id = "int-002" if intersection_id == "int-001" else "int-001"
-        if auto_control[other_id]["enabled"]:
-            # Make sure the other signal is complementary
-            if new_signal == "green":
-                # If this signal is green, other should be red unless it's currently yellow
-                if traffic_signals[other_id] != "yellow":
-                    traffic_signals[other_id] = "red"
-                    print(f"Coordinated: Setting {other_id} to red")
-            elif new_signal == "red" and traffic_signals[other_id] == "red":
-                # Both shouldn't be red for too long (unless transitioning)
-                # If the other has been red longer, make it green
-                if time.time() - auto_control[other_id]["last_change_time"] > 5:
-                    traffic_signals[other_id] = "green"
-                    auto_control[other_id]["last_change_time"] = time.time()
-                    print(f"Coordinated: Setting {other_id} to green after mutual red period")
-
-def detect_helmet(person_roi, net, classes, output_layers):
-    """
-    Detect if a person is wearing a helmet
-    """
-    # Basic helmet detection using YOLO
-    height, width, _ = person_roi.shape
-    blob = cv2.dnn.blobFromImage(person_roi, 1/255.0, (416, 416), swapRB=True, crop=False)
-    net.setInput(blob)
-    outputs = net.forward(output_layers)
-    
-    # Look for helmet class or similar
-    for output in outputs:
-        for detection in output:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-            
-            if confidence > two_wheeler_config["helmet_detection_threshold"]:
-                # Check if class is a helmet or similar (helmet might not be in COCO dataset)
-                # We'll check for "helmet" in the class name or use a similar class like "cap"
-                if classes[class_id].lower() in ["helmet", "cap", "hat"]:
-                    return True
+    duration = phase_duration(control, traffic_signals[intersection_id], traffic_data[intersection_id]["vehicleCount"])
+    signal_timer.schedule(intersection_id, control["last_change_time"] + duration)
+
+def coordinate_neighbors(intersection_id, now):
+    """
+    Keep auto-mode neighbours complementary to a signal that just changed.
+    Caller must hold data_lock.
+    """
+    status = traffic_signals[intersection_id]
+    for other_id in intersection_registry.neighbors(intersection_id):
+        if not auto_control[other_id]["enabled"]:
+            continue
+        if status == "green":
+            # If this signal is green, other should be red unless it's currently yellow
+            if traffic_signals[other_id] not in ("yellow", "red"):
+                start_signal_phase(other_id, "red", now)
+                print(f"Coordinated: Setting {other_id} to red")
+        elif status == "red" and traffic_signals[other_id] == "red":
+            # Both shouldn't be red for too long (unless transitioning)
+            # If the other has been red longer, make it green, unless one of its own neighbours is green
+            if (now - auto_control[other_id]["last_change_time"] > 5 and
+                    all(traffic_signals[n] != "green" for n in intersection_registry.neighbors(other_id))):
+                start_signal_phase(other_id, "green", now)
+                coordinate_neighbors(other_id, now)
+                print(f"Coordinated: Setting {other_id} to green after mutual red period")
+
+def advance_signal_phase(intersection_id, due, now):
+    """
+    Phase timer callback: move an auto-mode signal to its next phase and
+    coordinate its neighbours. The next phase starts at due, so a late
+    firing does not shift the cycle. A deadline superseded while the call
+    waited for data_lock (by preemption, a traffic-level change or auto
+    mode being toggled) no longer matches the current phase and is ignored.
+    """
+    with data_lock:
+        control = auto_control[intersection_id]
+        if not control["enabled"]:
+            return
+        current_signal = traffic_signals[intersection_id]
+        vehicle_count = traffic_data[intersection_id]["vehicleCount"]
+        if abs(control["last_change_time"] + phase_duration(control, current_signal, vehicle_count) - due) > 1e-6:
+            return
+        new_signal = NEXT_PHASE[current_signal]
+        start_signal_phase(intersection_id, new_signal, due)
+        level = traffic_level(control, vehicle_count)
+        print(f"Auto mode: Changed signal at {intersection_id} from {current_signal} to {new_signal} (Traffic: {level})")
+        coordinate_neighbors(intersection_id, due)
+
+def enable_auto_control(intersection_id, enabled, now):
+    """
+    Turn automatic control on or off; the current phase counts as starting
+    now. Caller must hold data_lock.
+    """
+    auto_control[intersection_id]["enabled"] = enabled
+    auto_control[intersection_id]["last_change_time"] = now
+    schedule_phase_end(intersection_id)
+    if not enabled:
+        return
+    if traffic_signals[intersection_id] == "green":
+        coordinate_neighbors(intersection_id, now)
+    elif traffic_signals[intersection_id] != "yellow" and any(
+            auto_control[other_id]["enabled"] and traffic_signals[other_id] == "green"
+            for other_id in intersection_registry.neighbors(intersection_id)):
+        # Joining next to a green auto-mode neighbour: wait on red
+        start_signal_phase(intersection_id, "red", now)
+
+def preempt_for_emergency(intersection_id, now):
+    """
+    Give an intersection green at once for an emergency vehicle and stop its
+    neighbours. Applies in manual mode too. Caller must hold data_lock.
+    """
+    start_signal_phase(intersection_id, "green", now)
+    print(f"Emergency vehicle detected at {intersection_id}. Setting signal to green.")
     
-    return False
+    # Set neighbouring intersections to red for emergency priority
+    for other_id in intersection_registry.neighbors(intersection_id):
+        if traffic_signals[other_id] not in ("yellow", "red"):  # Don't interrupt yellow phase
+            start_signal_phase(other_id, "red", now)
+            print(f"Setting {other_id} to red for emergency priority")
 
-def count_people_on_vehicle(vehicle_roi, net, classes, output_layers):
+def get_inference_engine(model_name=None):
     """
-    Count the number of people on a vehicle
+    Return the shared inference engine for a model (the default model if
+    None), loading the model on first use. Cameras using the same model
+    share its engine and are batched together. An engine whose worker
+    thread has died is replaced by a new one on the same model.
     """
-    height, width, _ = vehicle_roi.shape
-    blob = cv2.dnn.blobFromImage(vehicle_roi, 1/255.0, (416, 416), swapRB=True, crop=False)
-    net.setInput(blob)
-    outputs = net.forward(output_layers)
+    model_name = model_name or model_registry.default
+    with inference_engine_lock:
+        engine = inference_engines.get(model_name)
+        if engine is None or not engine.is_alive():
+            if engine is None:
+                model = model_registry.load(model_name)
+            else:
+                model = engine.model
+                print(f"Shared {model_name} inference engine stopped; restarting it")
+            engine = InferenceEngine(
+                model,
+                input_size=inference_config["input_size"],
+                max_batch_size=inference_config["max_batch_size"],
+                max_wait=inference_config["max_batch_wait"]
+            ).start()
+            if model_name not in inference_engines:
+                print(f"Successfully loaded shared {model_name} model")
+            inference_engines[model_name] = engine
+        return engine
+
+def analyze_two_wheelers(vehicle_rois, engine, intersection_id):
+    """
+    Run every two-wheeler ROI from a frame through one batched forward pass
+    and derive both the rider count and helmet result from the same output.
+    Returns a list of (person_count, has_helmet) tuples, one per ROI.
+    """
+    if not vehicle_rois:
+        return []
     
-    person_count = 0
+    classes = engine.classes
+    person_threshold = two_wheeler_config["confidence_threshold"]
+    helmet_threshold = two_wheeler_config["helmet_detection_threshold"]
     
-    for output in outputs:
-        for detection in output:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-            
-            if confidence > two_wheeler_config["confidence_threshold"]:
-                if classes[class_id] == "person":
-                    person_count += 1
+    # Helmet might not be in the COCO dataset, so similar classes like "cap" count too
+    helmet_class_ids = [i for i, name in enumerate(classes) if name.lower() in ["helmet", "cap", "hat"]]
+    person_class_ids = [i for i, name in enumerate(classes) if name == "person"]
     
-    return person_count
+    batch_outputs = engine.infer(intersection_id, vehicle_rois, timeout=inference_config["result_timeout"])
+    
+    results = []
+    for roi, outputs in zip(vehicle_rois, batch_outputs):
+        height, width = roi.shape[:2]
+        people = decode_detections(outputs, width, height, person_threshold,
+                                   detection_config["nms_threshold"], person_class_ids)
+        helmets = decode_detections(outputs, width, height, helmet_threshold,
+                                    detection_config["nms_threshold"], helmet_class_ids)
+        results.append((len(people), len(helmets) > 0))
+    
+    return results
 
-def detect_vehicles(camera_index, intersection_id):
+def open_video_source(camera_source, intersection_id):
     """
-    Process video feed to count vehicles and detect emergency vehicles
+    Open a camera, stream or video file with OpenCV, or a recorded clip for
+    a "replay:<path>" source
+    """
+    if isinstance(camera_source, str) and camera_source.startswith("replay:"):
+        source = ReplaySource(camera_source[len("replay:"):], replay_config["pace"],
+                              replay_config["loop"], replay_config["image_fps"])
+        with data_lock:
+            replay_sources[intersection_id] = source
+        return source
+    return cv2.VideoCapture(camera_source)
+
+def open_camera(camera_index, intersection_id):
+    """
+    Open the camera with explicit retry logic and return the capture object
     """
-    global latest_frames, processed_frames, next_vehicle_id
-    print(f"Starting vehicle detection for intersection {intersection_id} using camera index {camera_index}")
-    
-    # Load pre-trained vehicle detection model (using YOLO)
-    try:
-        # Check if we're running in development or production
-        yolo_dir = os.path.join(os.path.dirname(__file__), 'yolo')
-        
-        # Try to load YOLO model - make sure these files exist in your backend/yolo directory
-        config_path = os.path.join(yolo_dir, 'yolov4.cfg')
-        weights_path = os.path.join(yolo_dir, 'yolov4.weights')
-        classes_path = os.path.join(yolo_dir, 'coco.names')
-        
-        if not os.path.exists(config_path) or not os.path.exists(weights_path) or not os.path.exists(classes_path):
-            print(f"YOLO files not found at {yolo_dir}. Please download them as mentioned in README.md")
-            raise FileNotFoundError(f"Required YOLO files not found in {yolo_dir}")
-            
-        net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
-        with open(classes_path, "r") as f:
-            classes = [line.strip() for line in f.readlines()]
-        
-        # Configure the network to use available hardware acceleration
-        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
-        try:
-            # Try to use OpenCL acceleration if available
-            if cv2.ocl.haveOpenCL():
-                cv2.ocl.setUseOpenCL(True)
-                net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
-                print("Using OpenCL acceleration")
-            else:
-                net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-                print("Using CPU for inference")
-        except:
-            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-            print("Fallback to CPU for inference")
-        
-        # Get output layer names
-        layer_names = net.getLayerNames()
-        output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
-        
-        print(f"Successfully loaded YOLO model for {intersection_id}")
-    except Exception as e:
-        print(f"Error loading YOLO model: {e}")
-        print(f"Cannot proceed without object detection model")
-        raise
-    
-    # Initialize video capture with explicit retry logic
     cap = None
     max_retries = 5
     retry_count = 0
@@ -329,13 +598,14 @@ def detect_vehicles(camera_index, intersection_id):
     while cap is None or not cap.isOpened():
         try:
             print(f"Attempt {retry_count + 1}/{max_retries} to connect to camera {camera_index}")
-            cap = cv2.VideoCapture(camera_index)  # Use the camera index provided
+            cap = open_video_source(camera_index, intersection_id)  # Use the camera index provided
             
             # Set camera properties for better performance
             cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             cap.set(cv2.CAP_PROP_FPS, 30)  # Request 30 FPS
             cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))  # Use MJPG codec for better speed
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short so reads stay fresh
             
             if not cap.isOpened():
                 print(f"Failed to open camera {camera_index}. Retrying...")
@@ -347,6 +617,9 @@ def detect_vehicles(camera_index, intersection_id):
                 continue
             
             print(f"Successfully connected to camera {camera_index} for {intersection_id}")
+            if isinstance(cap, ReplaySource):
+                break  # A test read would skip the clip's first frame
+            
             # Read a test frame to verify camera is working
             ret, test_frame = cap.read()
             if not ret or test_frame is None:
@@ -376,7 +649,7 @@ def detect_vehicles(camera_index, intersection_id):
                     time.sleep(10)
                     try:
                         print(f"Periodic retry: Attempting to connect to camera {camera_index}")
-                        cap = cv2.VideoCapture(camera_index)
+                        cap = open_video_source(camera_index, intersection_id)
                         if cap.isOpened():
                             print(f"Successfully reconnected to camera {camera_index}")
                             break
@@ -384,288 +657,738 @@ def detect_vehicles(camera_index, intersection_id):
                     except Exception as retry_e:
                         print(f"Periodic retry failed: {retry_e}")
     
-    print(f"Starting main detection loop for {intersection_id} with camera {camera_index}")
-    
-    # Main processing loop
+    return cap
+
+def capture_stage(camera_source, intersection_id, render_buffer, inference_buffer, motion_gate, stats):
+    """
+    Read frames as fast as the camera delivers them and hand the newest one to
+    the render stage. Frames also go to the inference stage when the motion
+    gate decides the scene has changed (every Nth frame without gating).
+    This is the only per-camera thread: it spends most of its time blocked on
+    camera I/O.
+    """
     frame_count = 0
-    process_every_n_frames = frame_processing["skip_frames"]  # Process every Nth frame to reduce CPU usage
-    last_auto_control_update = time.time()
+    
+    try:
+        cap = open_camera(camera_source, intersection_id)
+    except IOError as e:
+        print(f"Camera for {intersection_id} unavailable: {e}")
+        return
     
     while True:
         try:
             start_time = time.time()
             
-            # Check if we need to update auto traffic control
-            current_time = time.time()
-            if current_time - last_auto_control_update >= 1.0:  # Check every second
-                update_traffic_signal_automatic(intersection_id)
-                last_auto_control_update = current_time
-            
             # Read a frame from the camera
             ret, frame = cap.read()
             
             if not ret or frame is None:
-                print(f"Error reading frame from camera {camera_index}. Reconnecting...")
+                if getattr(cap, "finished", False):
+                    print(f"Replay of {cap.path} for {intersection_id} finished")
+                    cap.release()
+                    return
+                print(f"Error reading frame from camera {camera_source}. Reconnecting...")
+                pipeline_metrics.inc("traffic_camera_reconnects_total", intersection=intersection_id)
                 cap.release()
                 time.sleep(1)
-                cap = cv2.VideoCapture(camera_index)
+                cap = open_video_source(camera_source, intersection_id)
                 if not cap.isOpened():
-                    print(f"Failed to reconnect to camera {camera_index}")
+                    print(f"Failed to reconnect to camera {camera_source}")
                     time.sleep(5)  # Wait longer before retry
                 continue
             
-            # Update the latest frame for video streaming (unprocessed)
-            with frame_lock:
-                latest_frames[intersection_id] = frame.copy()
-            
-            # Only process every nth frame to improve performance
             frame_count += 1
+            pipeline_metrics.observe("capture", time.time() - start_time, intersection_id)
             
-            # Create a copy for processing
-            process_frame = frame.copy()
-            
-            # Full processing (object detection) only on every nth frame
-            full_processing = (frame_count % process_every_n_frames == 0)
+            # Full processing (object detection) only when the scene has changed,
+            # on every nth frame. Frames that skip inference are owned by the
+            # render stage alone.
+            skip_frames = detection_settings(intersection_id)[1]
+            if motion_config["enabled"]:
+                shared, static = motion_gate.check(frame, skip_frames)
+                publish_motion_stats(intersection_id)
+            else:
+                shared, static = frame_count % skip_frames == 0, False
+            render_buffer.put((frame_count, frame, shared))
+            detection_scheduler.notify(f"{intersection_id}/render")
             
-            # Always add timestamp and basic info to the frame
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            intersection_name = "Main Street Intersection" if intersection_id == "int-001" else "Park Avenue Intersection"
-            cv2.putText(process_frame, f"Traffic Camera: {current_time}", (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(process_frame, intersection_name, (10, 60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            if shared:
+                # Fast replays wait for inference instead of overwriting frames it has not seen
+                backpressure = replay_config["backpressure_timeout"] if getattr(cap, "pace", None) == "fast" else 0
+                inference_buffer.put((frame_count, frame, static, start_time), backpressure)
+                detection_scheduler.notify(f"{intersection_id}/inference")
             
-            # Add the current signal status
+            stats.record(time.time() - start_time)
+        except Exception as e:
+            stats.record_error()
+            print(f"Error capturing frame for {intersection_id}: {e}")
+            time.sleep(0.1)
+
+def draw_frame_overlays(frame, intersection_id, vehicles):
+    """
+    Draw the camera header and the most recent detections onto a frame
+    """
+    # Always add timestamp and basic info to the frame
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    intersection_name = intersection_registry.name(intersection_id)
+    cv2.putText(frame, f"Traffic Camera: {current_time}", (10, 30), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(frame, intersection_name, (10, 60), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    
+    # Add the current signal status (owned by the web process in worker mode)
+    if shared_transport is not None:
+        signal_status, auto_enabled = shared_transport["board"].get(intersection_id)
+    else:
+        with data_lock:
+            signal_status = traffic_signals.get(intersection_id, "unknown")
+            auto_enabled = auto_control.get(intersection_id, {}).get("enabled", False)
+    
+    signal_color = (0, 0, 255)  # red
+    if signal_status == "green":
+        signal_color = (0, 255, 0)
+    elif signal_status == "yellow":
+        signal_color = (0, 255, 255)
+        
+    cv2.putText(frame, f"Signal: {signal_status.upper()}", (10, 90), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, signal_color, 2)
+               
+    cv2.putText(frame, f"Auto Mode: {('ON' if auto_enabled else 'OFF')}", (10, 120), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 165, 0) if auto_enabled else (128, 128, 128), 2)
+    
+    for vehicle in vehicles:
+        x, y, w, h = vehicle["box"]
+        
+        if vehicle["is_emergency"]:
+            cv2.putText(frame, "EMERGENCY VEHICLE", (x, y - 10), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        
+        if vehicle["passenger_violation"]:
+            cv2.putText(frame, f"VIOLATION: {vehicle['person_count']} PASSENGERS", (x, y + h + 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        
+        if vehicle["helmet_violation"]:
+            cv2.putText(frame, "VIOLATION: NO HELMET", (x, y + h + 15), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        
+        # Draw bounding box for each vehicle
+        box_color = (0, 0, 255) if vehicle["is_emergency"] else (255, 0, 0)
+        if vehicle["helmet_violation"] or vehicle["passenger_violation"]:
+            box_color = (0, 165, 255)  # Orange for violations
+        
+        cv2.rectangle(frame, (x, y), (x + w, y + h), box_color, 2)
+        label = f"{vehicle['type']} {vehicle['id']}"
+        cv2.putText(frame, label, (x, y - 5), 
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 2)
+        
+        # Add license plate if available
+        if vehicle["license_plate"]:
+            cv2.putText(frame, vehicle["license_plate"], (x, y + h + 15), 
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
+
+def render_step(intersection_id, render_buffer, stats):
+    """
+    One render slice: annotate the newest captured frame and publish it for
+    streaming. Returns the delay until the next frame is due at the stream
+    FPS, or None to wait for the camera if no new frame has arrived.
+    """
+    start_time = time.time()
+    try:
+        item = render_buffer.get(timeout=0)
+        if item is None:
+            return None
+        _, frame, shared = item
+        
+        if not shared and emergency_config["screen_skipped_frames"]:
+            # Inference checks the frames it gets; screen the rest (before overlays are drawn)
+            vehicles = screen_emergency_vehicles(intersection_id, frame)
+        else:
             with data_lock:
-                signal_status = traffic_signals.get(intersection_id, "unknown")
-                auto_enabled = auto_control.get(intersection_id, {}).get("enabled", False)
-            
-            signal_color = (0, 0, 255)  # red
-            if signal_status == "green":
-                signal_color = (0, 255, 0)
-            elif signal_status == "yellow":
-                signal_color = (0, 255, 255)
-                
-            cv2.putText(process_frame, f"Signal: {signal_status.upper()}", (10, 90), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, signal_color, 2)
-                       
-            cv2.putText(process_frame, f"Auto Mode: {('ON' if auto_enabled else 'OFF')}", (10, 120), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 165, 0) if auto_enabled else (128, 128, 128), 2)
-            
-            # Update processed frame that will be used for streaming
-            with frame_lock:
-                processed_frames[intersection_id] = process_frame.copy()
-            
-            # Skip full processing if not needed this frame
-            if not full_processing:
-                elapsed = time.time() - start_time
-                sleep_time = max(0.001, (1.0/frame_processing["stream_fps"]) - elapsed)
-                time.sleep(sleep_time)  # Control the loop speed
-                continue
-                
-            # Record time of full processing
-            frame_processing["last_full_process_time"] = time.time()
-                
-            # Preprocess the frame
-            height, width, channels = frame.shape
-            blob = cv2.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
-            net.setInput(blob)
+                vehicles = detected_vehicles.get(intersection_id, [])
+        
+        if shared_transport is not None:
+            # Worker process: draw straight into the next shared-memory slot for the web process
+            ring = shared_transport["annotated"][intersection_id]
+            frame = ring.fit(frame)
+            process_frame = ring.begin_write(*frame.shape[:2])
+            np.copyto(process_frame, frame)
+            with pipeline_metrics.timer("draw", intersection_id):
+                draw_frame_overlays(process_frame, intersection_id, vehicles)
+            ring.commit()
+            publish_pipeline_metrics(intersection_id)
+        else:
+            broadcaster = frame_broadcasters[intersection_id]
+            if shared:
+                # Inference reads this frame too, so draw on a recycled back buffer
+                process_frame = broadcaster.back_buffer(frame)
+            else:
+                # Nobody else holds this frame: draw on it in place
+                process_frame = frame
+            with pipeline_metrics.timer("draw", intersection_id):
+                draw_frame_overlays(process_frame, intersection_id, vehicles)
             
-            # Get detections
-            outputs = net.forward(output_layers)
+            # Swap it in as the frame streamed to viewers
+            broadcaster.publish(process_frame)
+        
+        stats.record(time.time() - start_time)
+        
+        # Pace rendering to the target FPS
+        return (1.0/frame_processing["stream_fps"]) - (time.time() - start_time)
+    except Exception as e:
+        stats.record_error()
+        print(f"Error rendering frame for {intersection_id}: {e}")
+        return 0.1
+
+def is_emergency_candidate(box, width, height):
+    """
+    Whether a vehicle box is large enough, and fully inside the frame, to be
+    checked for emergency lights
+    """
+    x, y, w, h = box
+    return (w > emergency_config["min_size"] and h > emergency_config["min_size"]
+            and x >= 0 and y >= 0 and x+w < width and y+h < height)
+
+def screen_emergency_vehicles(intersection_id, frame):
+    """
+    Re-check the last detected vehicles for emergency lights on a frame that
+    skipped inference, so emergency priority does not wait for the next
+    detection. The frame's colour map is built once and each box costs O(1).
+    Results are published only when a vehicle's emergency flag changes, and
+    never over newer detections. Returns the vehicles to draw on the frame.
+    """
+    with data_lock:
+        vehicles = detected_vehicles.get(intersection_id, [])
+    
+    height, width = frame.shape[:2]
+    candidates = [is_emergency_candidate(vehicle["box"], width, height) for vehicle in vehicles]
+    if not any(candidates) and not any(vehicle["is_emergency"] for vehicle in vehicles):
+        return vehicles
+    
+    color_map = EmergencyColorMap(frame, emergency_config["color_map_scale"]) if any(candidates) else None
+    flags = [
+        candidate and color_map.has_emergency_lights(vehicle["box"], emergency_config["min_color_percent"])
+        for vehicle, candidate in zip(vehicles, candidates)
+    ]
+    if all(flag == vehicle["is_emergency"] for vehicle, flag in zip(vehicles, flags)):
+        return vehicles
+    
+    screened = [dict(vehicle, is_emergency=flag) for vehicle, flag in zip(vehicles, flags)]
+    has_emergency = any(flags)
+    if shared_transport is not None:
+        # Worker process: hand the update to the web process like a detection result
+        with data_lock:
+            if detected_vehicles.get(intersection_id) is not vehicles:
+                return detected_vehicles[intersection_id]
+            detected_vehicles[intersection_id] = screened
+            shared_transport["states"][intersection_id].write(
+                len(screened), has_emergency, screened, detection_frame_seqs[intersection_id])
+    else:
+        with data_lock:
+            frame_for_evidence = detection_frames[intersection_id]
+        if not apply_detection_results(intersection_id, len(screened), has_emergency, screened,
+                                       frame_for_evidence, replaces=vehicles):
+            with data_lock:
+                return detected_vehicles[intersection_id]
+    
+    if has_emergency:
+        print(f"Emergency vehicle detected at {intersection_id} between detections!")
+    return screened
+
+def process_detections(frame, intersection_id, engine, vehicle_class_ids, input_size=None):
+    """
+    Run the detector on one frame and return (vehicle_count, has_emergency, vehicles)
+    """
+    classes = engine.classes
+    
+    # Preprocess the frame
+    height, width, channels = frame.shape
+    
+    # Get detections from the shared engine (batched with other cameras)
+    inference_request = engine.submit(intersection_id, [frame], input_size)
+    outputs = inference_request.result(inference_config["result_timeout"])[0]
+    
+    # Process detections
+    vehicle_count = 0
+    has_emergency = False
+    current_vehicles = []
+    
+    decode_start = time.time()
+    detections = decode_detections(outputs, width, height,
+                                   emergency_config["confidence_threshold"],
+                                   detection_config["nms_threshold"],
+                                   vehicle_class_ids)
+    
+    # Blob and forward times are those of the batch this frame was part of
+    timings = inference_request.timings
+    pipeline_metrics.observe("blob", timings["blob"], intersection_id)
+    pipeline_metrics.observe("forward", timings["forward"], intersection_id)
+    pipeline_metrics.observe("decode", timings["decode"] + time.time() - decode_start, intersection_id)
+    
+    # Analyze all two-wheelers in the frame with a single batched forward pass
+    two_wheeler_indices = [
+        i for i, (class_id, _, (x, y, w, h)) in enumerate(detections)
+        if classes[class_id] in ["motorcycle", "bicycle"] and x >= 0 and y >= 0 and x+w < width and y+h < height
+    ]
+    two_wheeler_rois = [
+        frame[y:y+h, x:x+w]
+        for _, _, (x, y, w, h) in (detections[i] for i in two_wheeler_indices)
+    ]
+    two_wheeler_results = dict(zip(
+        two_wheeler_indices,
+        analyze_two_wheelers(two_wheeler_rois, engine, intersection_id)
+    ))
+    
+    # Assign a stable vehicle ID to every detection
+    with pipeline_metrics.timer("tracking", intersection_id):
+        vehicle_ids = vehicle_trackers[intersection_id].update([box for _, _, box in detections])
+    
+    # Emergency colours are mapped once per frame, and only if some vehicle needs checking
+    color_map = None
+    
+    for index, (class_id, confidence, (x, y, w, h)) in enumerate(detections):
+        vehicle_count += 1
+        vehicle_id = vehicle_ids[index]
+        vehicle_position = (x + w // 2, y + h // 2)
+        
+        # Check for emergency vehicles (ambulances, police cars) by their red or blue lights
+        is_emergency = False
+        if is_emergency_candidate((x, y, w, h), width, height):
+            if color_map is None:
+                color_map = EmergencyColorMap(frame, emergency_config["color_map_scale"])
+            if color_map.has_emergency_lights((x, y, w, h), emergency_config["min_color_percent"]):
+                is_emergency = True
+                has_emergency = True
+                print(f"Emergency vehicle detected at {intersection_id}!")
+        
+        # Add two-wheeler detection with helmet and passenger violations
+        helmet_violation = False
+        passenger_violation = False
+        person_count = 0
+        
+        if index in two_wheeler_results:
+            # People on the bike and helmet result from the batched analysis
+            person_count, has_helmet = two_wheeler_results[index]
             
-            # Process detections
-            vehicle_count = 0
-            has_emergency = False
-            current_vehicles = []
+            # Check if the count exceeds the limit
+            if person_count > two_wheeler_config["person_count_threshold"]:
+                passenger_violation = True
+                print(f"Passenger violation detected: {person_count} people on two-wheeler")
             
-            for output in outputs:
-                for detection in output:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    
-                    if confidence > emergency_config["confidence_threshold"]:
-                        # Check if the detected object is a vehicle
-                        if classes[class_id] in ["car", "truck", "bus", "motorcycle", "bicycle"]:
-                            vehicle_count += 1
-                            
-                            # Get bounding box dimensions
-                            center_x = int(detection[0] * width)
-                            center_y = int(detection[1] * height)
-                            w = int(detection[2] * width)
-                            h = int(detection[3] * height)
-                            
-                            # Calculate position
-                            x = int(center_x - w / 2)
-                            y = int(center_y - h / 2)
-                            
-                            # Generate vehicle ID if new, track if existing
-                            vehicle_position = (center_x, center_y)
-                            vehicle_id = None
-                            
-                            # Check if this is a vehicle we're already tracking
-                            for known_id, known_pos in list(last_vehicle_positions.get(intersection_id, {}).items()):
-                                known_x, known_y = known_pos
-                                # If the center is close enough to a known vehicle, consider it the same one
-                                distance = ((center_x - known_x) ** 2 + (center_y - known_y) ** 2) ** 0.5
-                                if distance < 50:  # Threshold for considering it the same vehicle
-                                    vehicle_id = known_id
-                                    break
-                            
-                            # If no matching vehicle, create new ID
-                            if vehicle_id is None:
-                                vehicle_id = f"v-{next_vehicle_id}"
-                                next_vehicle_id += 1
-                            
-                            # Update position
-                            if intersection_id not in last_vehicle_positions:
-                                last_vehicle_positions[intersection_id] = {}
-                            last_vehicle_positions[intersection_id][vehicle_id] = vehicle_position
-                            
-                            # Check for emergency vehicles (ambulances, police cars)
-                            is_emergency = False
-                            if w > emergency_config["min_size"] and h > emergency_config["min_size"]:
-                                # Extract vehicle region
-                                if x >= 0 and y >= 0 and x+w < width and y+h < height:
-                                    vehicle_roi = frame[y:y+h, x:x+w]
-                                    
-                                    # Convert to HSV color space
-                                    hsv = cv2.cvtColor(vehicle_roi, cv2.COLOR_BGR2HSV)
-                                    
-                                    # Define color ranges for red and blue emergency lights
-                                    lower_red = np.array([0, 120, 70])
-                                    upper_red = np.array([10, 255, 255])
-                                    lower_blue = np.array([110, 50, 50])
-                                    upper_blue = np.array([130, 255, 255])
-                                    
-                                    # Create masks for red and blue colors
-                                    mask_red = cv2.inRange(hsv, lower_red, upper_red)
-                                    mask_blue = cv2.inRange(hsv, lower_blue, upper_blue)
-                                    
-                                    # Calculate the percentage of emergency colors
-                                    red_percent = cv2.countNonZero(mask_red) / (w * h) * 100
-                                    blue_percent = cv2.countNonZero(mask_blue) / (w * h) * 100
-                                    
-                                    # If enough red or blue pixels are detected, classify as emergency vehicle
-                                    if red_percent > 5 or blue_percent > 5:
-                                        is_emergency = True
-                                        has_emergency = True
-                                        print(f"Emergency vehicle detected at {intersection_id}!")
-                                        
-                                        # Draw box around emergency vehicle in the processed frame
-                                        with frame_lock:
-                                            cv2.rectangle(processed_frames[intersection_id], (x, y), (x + w, y + h), (0, 0, 255), 2)
-                                            cv2.putText(processed_frames[intersection_id], "EMERGENCY VEHICLE", (x, y - 10), 
-                                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                            
-                            # Add two-wheeler detection with helmet and passenger violations
-                            helmet_violation = False
-                            passenger_violation = False
-                            
-                            if classes[class_id] in ["motorcycle", "bicycle"] and x >= 0 and y >= 0 and x+w < width and y+h < height:
-                                vehicle_roi = frame[y:y+h, x:x+w]
-                                
-                                # Count people on the bike
-                                person_count = count_people_on_vehicle(vehicle_roi, net, classes, output_layers)
-                                
-                                # Check if the count exceeds the limit
-                                if person_count > two_wheeler_config["person_count_threshold"]:
-                                    passenger_violation = True
-                                    print(f"Passenger violation detected: {person_count} people on two-wheeler")
-                                    
-                                    # Add to processed frame
-                                    with frame_lock:
-                                        cv2.putText(processed_frames[intersection_id], 
-                                                  f"VIOLATION: {person_count} PASSENGERS", 
-                                                  (x, y + h + 30), 
-                                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                                
-                                # Check for helmet
-                                if person_count > 0:
-                                    has_helmet = detect_helmet(vehicle_roi, net, classes, output_layers)
-                                    if not has_helmet:
-                                        helmet_violation = True
-                                        print(f"Helmet violation detected on two-wheeler")
-                                        
-                                        # Add to processed frame
-                                        with frame_lock:
-                                            cv2.putText(processed_frames[intersection_id], 
-                                                      "VIOLATION: NO HELMET", 
-                                                      (x, y + h + 15), 
-                                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                            
-                            # Store vehicle data
-                            vehicle_data = {
-                                "id": vehicle_id,
-                                "type": classes[class_id],
-                                "position": vehicle_position,
-                                "size": (w, h),
-                                "is_emergency": is_emergency,
-                                "license_plate": generate_random_license_plate() if random.random() < 0.8 else None,
-                                "helmet_violation": helmet_violation,
-                                "passenger_violation": passenger_violation
-                            }
-                            current_vehicles.append(vehicle_data)
-                            
-                            # Draw bounding box for each vehicle in the processed frame
-                            with frame_lock:
-                                box_color = (0, 0, 255) if is_emergency else (255, 0, 0)
-                                if helmet_violation or passenger_violation:
-                                    box_color = (0, 165, 255)  # Orange for violations
-                                
-                                cv2.rectangle(processed_frames[intersection_id], (x, y), (x + w, y + h), box_color, 2)
-                                label = f"{classes[class_id]} {vehicle_id}"
-                                cv2.putText(processed_frames[intersection_id], label, (x, y - 5), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 2)
-                                
-                                # Add license plate if available
-                                if vehicle_data["license_plate"]:
-                                    cv2.putText(processed_frames[intersection_id], vehicle_data["license_plate"], (x, y + h + 15), 
-                                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
+            # Check for helmet
+            if person_count > 0 and not has_helmet:
+                helmet_violation = True
+                print(f"Helmet violation detected on two-wheeler")
+        
+        # Store vehicle data
+        current_vehicles.append({
+            "id": vehicle_id,
+            "type": classes[class_id],
+            "position": vehicle_position,
+            "size": (w, h),
+            "box": (x, y, w, h),
+            "is_emergency": is_emergency,
+            "license_plate": generate_random_license_plate() if random.random() < 0.8 else None,
+            "helmet_violation": helmet_violation,
+            "passenger_violation": passenger_violation,
+            "person_count": person_count
+        })
+    
+    return vehicle_count, has_emergency, current_vehicles
+
+def apply_detection_results(intersection_id, vehicle_count, has_emergency, current_vehicles, frame, replaces=None,
+                            now=None):
+    """
+    Update shared traffic state from one camera's detections: vehicle list,
+    counts, emergency priority and the delta events for subscribers. With
+    replaces, the update is skipped (returning False) unless the current
+    vehicle list is still that one. now is the signal clock (default: the
+    wall clock).
+    """
+    # One critical section, so readers never see the new vehicle list with
+    # the old counts, and a concurrent update cannot interleave between them
+    with data_lock:
+        if replaces is not None and detected_vehicles[intersection_id] is not replaces:
+            return False
+        # Update the detected vehicles list (and keep the frame they came from)
+        detected_vehicles[intersection_id] = current_vehicles
+        detection_frames[intersection_id] = frame
+        
+        # If emergency is detected, preempt the signal plan with green
+        if has_emergency and traffic_signals[intersection_id] != "green":
+            preempt_for_emergency(intersection_id, time.time() if now is None else now)
             
-            # Update the detected vehicles list
+        previous = traffic_data[intersection_id]
+        traffic_data[intersection_id] = {
+            "vehicleCount": vehicle_count,
+            "hasEmergencyVehicle": has_emergency,
+            "timestamp": datetime.now().isoformat(),
+            "autoMode": auto_control[intersection_id]["enabled"]
+        }
+        traffic_history.record_count(intersection_id, vehicle_count)
+        
+        # Push only what changed to event subscribers
+        if previous.get("vehicleCount") != vehicle_count:
+            traffic_events.publish("vehicleCount", intersection_id, vehicleCount=vehicle_count)
+            # The current phase lasts longer or shorter at another traffic level
+            control = auto_control[intersection_id]
+            if control["enabled"] and traffic_level(control, vehicle_count) != traffic_level(control, previous.get("vehicleCount", 0)):
+                schedule_phase_end(intersection_id)
+        if previous.get("hasEmergencyVehicle") != has_emergency:
+            traffic_events.publish("emergency", intersection_id, hasEmergencyVehicle=has_emergency)
+    return True
+
+def inference_step(intersection_id, model_name, vehicle_class_ids, inference_buffer, stats):
+    """
+    One inference slice: count vehicles and detect emergency vehicles in the
+    newest frame waiting for this camera. Returns None so the scheduler waits
+    until capture hands over the next frame. A frame whose forward pass
+    times out counts as an error and is skipped.
+    """
+    start_time = time.time()
+    try:
+        item = inference_buffer.get(timeout=0)
+        if item is None:
+            return None
+        engine = get_inference_engine(model_name)
+        _, frame, static, captured_at = item
+        
+        # Record time of full processing
+        last_detection_times[intersection_id] = start_time
+        
+        if static:
+            # Nothing moved since the last detection: keep the tracks alive where they were
+            vehicle_trackers[intersection_id].carry_forward(start_time)
+        
+        input_size = detection_settings(intersection_id)[0]
+        vehicle_count, has_emergency, current_vehicles = process_detections(
+            frame, intersection_id, engine, vehicle_class_ids, input_size)
+        
+        if shared_transport is not None:
+            # Worker process: overlays use the local copy, the web process gets the shared one.
+            # The state block has a single writer, so writes happen under the data lock.
+            frame_seq = shared_transport["raw"][intersection_id].write(frame)
             with data_lock:
                 detected_vehicles[intersection_id] = current_vehicles
+                detection_frame_seqs[intersection_id] = frame_seq
+                shared_transport["states"][intersection_id].write(vehicle_count, has_emergency, current_vehicles, frame_seq)
+        else:
+            apply_detection_results(intersection_id, vehicle_count, has_emergency, current_vehicles, frame)
+        
+        end_time = time.time()
+        motion_gates[intersection_id].record_inference(end_time)
+        publish_motion_stats(intersection_id)
+        if adaptive_config["enabled"]:
+            controller = adaptive_controllers[intersection_id]
+            decision = controller.record(end_time - captured_at, start_time - captured_at,
+                                         end_time - start_time, end_time)
+            if decision is not None:
+                print(f"Adaptive control for {intersection_id} ({decision['reason']}): "
+                      f"input {decision['input_size'][0]} -> {decision['input_size'][1]}, "
+                      f"skip {decision['skip_frames'][0]} -> {decision['skip_frames'][1]}")
+            publish_adaptive_stats(intersection_id)
+        stats.record(end_time - start_time, vehicle_count)
+        
+        # Print status update periodically
+        if stats.iterations % 20 == 0:
+            print(f"Intersection {intersection_id}: {vehicle_count} vehicles, Emergency: {has_emergency}")
             
-            # Update traffic data with thread safety
-            with data_lock:
-                # If emergency is detected, automatically set signal to green
-                if has_emergency and traffic_signals[intersection_id] != "green":
-                    traffic_signals[intersection_id] = "green"
-                    auto_control[intersection_id]["last_change_time"] = time.time()
-                    print(f"Emergency vehicle detected at {intersection_id}. Setting signal to green.")
-                    
-                    # Set the other intersection to red for emergency priority
-                    other_id = "int-002" if intersection_id == "int-001" else "int-001"
-                    if traffic_signals[other_id] != "yellow":  # Don't interrupt yellow phase
-                        traffic_signals[other_id] = "red"
-                        print(f"Setting {other_id} to red for emergency priority")
-                    
-                traffic_data[intersection_id] = {
-                    "vehicleCount": vehicle_count,
-                    "hasEmergencyVehicle": has_emergency,
-                    "timestamp": datetime.now().isoformat(),
-                    "autoMode": auto_control[intersection_id]["enabled"]
-                }
-            
-            # Print status update periodically
-            if frame_count % 100 == 0:
-                print(f"Intersection {intersection_id}: {vehicle_count} vehicles, Emergency: {has_emergency}")
+        return None
+    except Exception as e:
+        stats.record_error()
+        print(f"Error in video processing for {intersection_id}: {e}")
+        return 0.1
+
+def detection_settings(intersection_id):
+    """
+    Return the (input_size, skip_frames) a camera's detection currently runs with
+    """
+    if adaptive_config["enabled"]:
+        controller = adaptive_controllers[intersection_id]
+        return controller.input_size, controller.skip_frames
+    return None, frame_processing["skip_frames"]  # None: the engine's input size
+
+def publish_motion_stats(intersection_id):
+    """
+    Worker process: mirror a camera's motion gate statistics to the web process
+    """
+    if shared_transport is not None:
+        shared_transport["motion"].update(intersection_id, motion_gates[intersection_id].get_stats())
+
+def publish_adaptive_stats(intersection_id):
+    """
+    Worker process: mirror a camera's adaptive controller state to the web process
+    """
+    if shared_transport is not None:
+        shared_transport["adaptive"].update(intersection_id, adaptive_controllers[intersection_id].get_stats())
+
+def publish_pipeline_metrics(intersection_id):
+    """
+    Worker process: copy a camera's stage histograms and counters to the web
+    process, at most once per publish interval
+    """
+    now = time.time()
+    if shared_transport is None or now - metrics_published.get(intersection_id, 0.0) < metrics_config["publish_interval"]:
+        return
+    metrics_published[intersection_id] = now
+    values = pipeline_metrics.export_histograms(intersection_id, WORKER_METRIC_STAGES)
+    values["reconnects"] = pipeline_metrics.get("traffic_camera_reconnects_total", intersection=intersection_id)
+    for name, buffer in pipeline_stats[intersection_id]["buffers"].items():
+        values[f"{name}_dropped"] = buffer.get_stats()["drops"]
+    shared_transport["metrics"].update(intersection_id, values)
+
+def collect_pipeline_metrics():
+    """
+    Bring the mirrored counters and gauges up to date before the metrics are
+    rendered; in worker mode, also load the workers' stage histograms
+    """
+    now = time.time()
+    for intersection_id in intersection_registry.ids():
+        if detection_workers:
+            values = shared_transport["metrics"].get(intersection_id)
+            pipeline_metrics.load_histograms(intersection_id, WORKER_METRIC_STAGES, values)
+            pipeline_metrics.set("traffic_camera_reconnects_total", values["reconnects"], intersection=intersection_id)
+            drops = {name: values[f"{name}_dropped"] for name in ("render", "inference")}
+        else:
+            stages = pipeline_stats.get(intersection_id)
+            drops = {name: buffer.get_stats()["drops"] for name, buffer in stages["buffers"].items()} if stages else {}
+        for name, count in drops.items():
+            pipeline_metrics.set("traffic_frames_dropped_total", count, intersection=intersection_id, buffer=name)
+        
+        pipeline_metrics.set("traffic_stream_viewers", frame_broadcasters[intersection_id].get_stats()["viewers"],
+                             intersection=intersection_id)
+        if last_detection_times[intersection_id]:
+            pipeline_metrics.set("traffic_last_detection_age_seconds", now - last_detection_times[intersection_id],
+                                 intersection=intersection_id)
+    
+    for model_name, engine in list(inference_engines.items()):
+        stats = engine.get_stats()
+        pipeline_metrics.set("traffic_inference_batches_total", stats["batches"], model=model_name)
+        pipeline_metrics.set("traffic_inference_images_total", stats["images"], model=model_name)
+
+def get_camera_stats(board_name, local_sources):
+    """
+    Per-intersection statistics from the local objects (motion gates,
+    controllers) or, in worker mode, from the named shared statistics board
+    """
+    if detection_workers:
+        return {intersection_id: shared_transport[board_name].get(intersection_id)
+                for intersection_id in intersection_registry.ids()}
+    return {intersection_id: source.get_stats() for intersection_id, source in list(local_sources.items())}
+
+def start_intersection_pipeline(intersection, engine, vehicle_class_ids):
+    """
+    Set up one camera's pipeline: a capture thread feeding latest-wins
+    buffers, with inference and rendering run as tasks on the shared scheduler
+    """
+    intersection_id = intersection.id
+    render_buffer = LatestFrameBuffer("render", pipeline_config["buffer_size"])
+    inference_buffer = LatestFrameBuffer("inference", pipeline_config["buffer_size"])
+    stage_stats = {
+        "capture": StageStats("capture"),
+        "inference": StageStats("inference"),
+        "render": StageStats("render")
+    }
+    motion_gate = MotionGate(motion_config["thumbnail_width"], motion_config["pixel_threshold"],
+                             motion_config["min_motion"], motion_config["max_static_interval"],
+                             motion_config["rate_window"])
+    # Models exported with a fixed input shape only allow that size
+    input_sizes = [engine.input_size] if engine.model.fixed_input_size else adaptive_config["input_sizes"]
+    controller = AdaptiveController(
+        input_sizes, engine.input_size, frame_processing["skip_frames"],
+        adaptive_config["min_skip_frames"], adaptive_config["max_skip_frames"],
+        adaptive_config["target_latency"], adaptive_config["busy_budget"],
+        adaptive_config["tolerance"], adaptive_config["smoothing"], adaptive_config["cooldown"])
+    with data_lock:
+        pipeline_stats[intersection_id] = {
+            "buffers": {"render": render_buffer, "inference": inference_buffer},
+            "stages": stage_stats
+        }
+        motion_gates[intersection_id] = motion_gate
+        adaptive_controllers[intersection_id] = controller
+    
+    detection_scheduler.add_task(f"{intersection_id}/inference", partial(
+        inference_step, intersection_id, intersection.model or model_registry.default, vehicle_class_ids,
+        inference_buffer, stage_stats["inference"]))
+    detection_scheduler.add_task(f"{intersection_id}/render", partial(
+        render_step, intersection_id, render_buffer, stage_stats["render"]))
+    
+    threading.Thread(
+        target=capture_stage,
+        args=(intersection.camera, intersection_id, render_buffer, inference_buffer, motion_gate, stage_stats["capture"]),
+        name=f"capture-{intersection_id}",
+        daemon=True
+    ).start()
+    print(f"Started pipeline for {intersection_id} with camera {intersection.camera}")
+
+def start_detection(intersection_ids=None):
+    """
+    Load the models the given intersections use (all configured
+    intersections by default) and start their pipelines
+    """
+    intersections = [intersection_registry.get(intersection_id)
+                     for intersection_id in (intersection_ids or intersection_registry.ids())]
+    
+    # Get the shared detection engine of every model in use
+    engines = {}
+    try:
+        for intersection in intersections:
+            model_name = intersection.model or model_registry.default
+            if model_name not in engines:
+                engine = get_inference_engine(model_name)
                 
-            # Control the loop speed based on target FPS
-            elapsed = time.time() - start_time
-            sleep_time = max(0.001, (1.0/frame_processing["stream_fps"]) - elapsed)
-            time.sleep(sleep_time)
+                # Class indices we count as vehicles
+                vehicle_class_ids = [i for i, name in enumerate(engine.classes) if name in detection_config["vehicle_classes"]]
+                engines[model_name] = (engine, vehicle_class_ids)
+    except Exception as e:
+        print(f"Error loading detection model: {e}")
+        print(f"Cannot proceed without object detection model")
+        return False
+    
+    for intersection in intersections:
+        start_intersection_pipeline(intersection, *engines[intersection.model or model_registry.default])
+    detection_scheduler.start()
+    return True
+
+def run_detection_worker(worker_index, worker_count, intersection_ids):
+    """
+    Entry point of a detection worker process. Workers are forked from the
+    web process before it starts any threads, so they inherit the configuration
+    and the shared memory mappings; the model is loaded in each worker.
+    """
+    global detection_scheduler
+    
+    # Track IDs must stay unique across workers
+    vehicle_id_allocator.prefix = f"v{worker_index}-"
+    
+    # This process only runs its own cameras, so size its pool for them
+    workers = max(2, (os.cpu_count() or 4) // worker_count) + \
+        min(inference_config["max_batch_size"], len(intersection_ids))
+    detection_scheduler = FairScheduler(f"detection-{worker_index}", workers)
+    
+    print(f"Detection worker {worker_index} (pid {os.getpid()}) running {', '.join(intersection_ids)}")
+    start_detection(intersection_ids)
+    while True:
+        time.sleep(3600)
+
+def start_detection_workers(worker_count):
+    """
+    Run detection in worker processes, each handling a round-robin share of
+    the cameras, and start the web-process side of the shared memory transport
+    """
+    global shared_transport
+    
+    intersection_ids = intersection_registry.ids()
+    worker_count = max(1, min(worker_count, len(intersection_ids)))
+    prefix = f"tm{os.getpid()}"
+    shared_transport = {
+        "raw": {},  # Frames detections were made on (for evidence)
+        "annotated": {},  # Rendered frames for streaming
+        "states": {},
+        "board": SharedSignalBoard(f"{prefix}_signals", intersection_ids, create=True),
+        "motion": SharedStatsBoard(f"{prefix}_motion", intersection_ids, MOTION_STATS_DTYPE, create=True),
+        "adaptive": SharedStatsBoard(f"{prefix}_adaptive", intersection_ids, ADAPTIVE_STATS_DTYPE, create=True),
+        "metrics": SharedStatsBoard(f"{prefix}_metrics", intersection_ids, PIPELINE_METRICS_DTYPE, create=True)
+    }
+    for index, intersection_id in enumerate(intersection_ids):
+        shared_transport["raw"][intersection_id] = SharedFrameRing(
+            f"{prefix}_{index}_raw", worker_config["frame_slots"], worker_config["max_frame_shape"], create=True)
+        shared_transport["annotated"][intersection_id] = SharedFrameRing(
+            f"{prefix}_{index}_annotated", worker_config["frame_slots"], worker_config["max_frame_shape"], create=True)
+        shared_transport["states"][intersection_id] = SharedDetectionState(
+            f"{prefix}_{index}_state", worker_config["max_vehicles"], create=True)
+    with data_lock:
+        for intersection_id in intersection_ids:
+            update_signal_board(intersection_id)
+    
+    # Fork while this process has no other threads: the entry point calls
+    # this before init_services() starts the violation writer, evidence
+    # encoder and MongoDB client, and the monitor below starts after the fork
+    context = multiprocessing.get_context("fork")
+    for index in range(worker_count):
+        group = intersection_ids[index::worker_count]
+        process = context.Process(target=run_detection_worker, args=(index, worker_count, group),
+                                  name=f"detection-worker-{index}", daemon=True)
+        process.start()
+        detection_workers.append({"process": process, "intersections": group})
+    atexit.register(close_shared_transport)
+    
+    threading.Thread(target=shared_transport_monitor, daemon=True).start()
+    print(f"Started {worker_count} detection worker processes")
+
+def close_shared_transport():
+    """
+    Stop the workers and release the shared memory blocks
+    """
+    for worker in detection_workers:
+        worker["process"].terminate()
+    for worker in detection_workers:
+        worker["process"].join(1.0)
+    blocks = [shared_transport["board"], shared_transport["motion"], shared_transport["adaptive"], shared_transport["metrics"]]
+    for name in ("raw", "annotated", "states"):
+        blocks.extend(shared_transport[name].values())
+    for block in blocks:
+        try:
+            block.close(unlink=True)
+        except (OSError, BufferError):
+            pass
+
+def shared_transport_monitor():
+    """
+    Web-process side of worker mode: hand frames rendered by the workers to
+    the stream broadcasters (as views into shared memory, without copying)
+    and apply their detection results to the traffic state
+    """
+    frame_seqs = {intersection_id: 0 for intersection_id in intersection_registry.ids()}
+    state_seqs = {intersection_id: 0 for intersection_id in intersection_registry.ids()}
+    
+    while True:
+        try:
+            for intersection_id in intersection_registry.ids():
+                ring = shared_transport["annotated"][intersection_id]
+                if ring.seq != frame_seqs[intersection_id]:
+                    seq, frame = ring.read()
+                    if frame is not None:
+                        # The slot is reused once the ring wraps; viewers
+                        # drop a frame whose slot changed while they encoded it
+                        frame_broadcasters[intersection_id].publish(frame, partial(ring.is_current, seq))
+                    frame_seqs[intersection_id] = seq
                 
+                state = shared_transport["states"][intersection_id]
+                if state.seq != state_seqs[intersection_id]:
+                    result = state.read()
+                    if result is None:
+                        continue
+                    seq, vehicle_count, has_emergency, vehicles, frame_seq = result
+                    state_seqs[intersection_id] = seq
+                    last_detection_times[intersection_id] = time.time()
+                    with data_lock:
+                        detection_frame_seqs[intersection_id] = frame_seq
+                    apply_detection_results(intersection_id, vehicle_count, has_emergency, vehicles, None)
+            
+            time.sleep(worker_config["poll_interval"])
         except Exception as e:
-            print(f"Error in video processing for {intersection_id}: {e}")
+            print(f"Error reading from detection workers: {e}")
             time.sleep(0.1)
-        
-    # Cleanup (this will only execute if we break the loop)
-    if cap is not None:
-        cap.release()
-    cv2.destroyAllWindows()
+
+def start_simulation():
+    """
+    Feed synthetic detection results for every configured intersection in
+    real time instead of running cameras and the detector
+    """
+    global traffic_simulator
+    
+    if simulation_config["auto_control"]:
+        with data_lock:
+            for intersection_id in intersection_registry.ids():
+                enable_auto_control(intersection_id, True, time.time())
+    traffic_simulator = TrafficSimulator(
+        intersection_registry.ids(),
+        lambda intersection_id, vehicle_count, has_emergency, vehicles, now: apply_detection_results(
+            intersection_id, vehicle_count, has_emergency, vehicles, None, now=now),
+        traffic_signals.get, simulation_config,
+        seed=simulation_config["seed"], threads=simulation_config["threads"])
+    threading.Thread(target=traffic_simulator.run, args=(None, True), name="simulation", daemon=True).start()
+    print(f"Simulating traffic at {len(intersection_registry)} intersections")
 
 def generate_random_license_plate():
     """Generate random license plate number for simulation"""
@@ -679,129 +1402,221 @@ def generate_random_license_plate():
     
     return license_plate
 
+def store_violation(violation_data, evidence):
+    """
+    Attach evidence snapshot links (if any) and queue the violation for the
+    background writer. Runs on an evidence encoder thread when evidence was captured.
+    """
+    if evidence:
+        violation_data["evidence"] = evidence
+        violation_data["imageUrl"] = f"/api/evidence/{evidence.get('vehicle', evidence['frame'])}"
+    
+    # Queue for the background writer if a database is available
+    if violation_writer is not None:
+        violation_writer.submit(violation_data)
+
 def check_for_violations(intersection_id):
     """
     Check for traffic violations based on current state
     Returns the number of violations detected
     """
-    violations_count = 0
+    # Only hold the lock long enough to snapshot the current state
     with data_lock:
         current_signal = traffic_signals.get(intersection_id)
-        vehicles = detected_vehicles.get(intersection_id, [])
+        vehicles = list(detected_vehicles.get(intersection_id, []))
+        frame = detection_frames.get(intersection_id)
+        frame_seq = detection_frame_seqs.get(intersection_id)
+    
+    if frame is None and frame_seq is not None:
+        # Detections from a worker process: copy the frame out before its ring slot is reused
+        frame = shared_transport["raw"][intersection_id].copy(frame_seq)
+    
+    captures = []  # (box, callback) of each violation, for the evidence encoder
+    for vehicle in vehicles:
+        violation_type = None
+        details = ""
         
-        # Store violations
-        for vehicle in vehicles:
-            violation_type = None
-            details = ""
+        # Red light violation (simulated for demonstration)
+        if current_signal == "red" and random.random() < 0.2:  # 20% chance
+            violation_type = "red_light"
+            details = "Running a red light"
             
-            # Red light violation (simulated for demonstration)
-            if current_signal == "red" and random.random() < 0.2:  # 20% chance
-                violation_type = "red_light"
-                details = "Running a red light"
-                
-            # Speeding violation (simulated for demonstration)  
-            elif random.random() < 0.1:  # 10% chance
-                violation_type = "speeding"
-                details = "Exceeding speed limit"
-                
-            # Two-wheeler violations (actual detection)
-            elif vehicle.get("type") in ["motorcycle", "bicycle"]:
-                if vehicle.get("helmet_violation"):
-                    violation_type = "no_helmet"
-                    details = "Riding without helmet"
-                elif vehicle.get("passenger_violation"):
-                    violation_type = "excess_passengers"
-                    details = "Too many passengers on two-wheeler"
+        # Speeding violation (simulated for demonstration)  
+        elif random.random() < 0.1:  # 10% chance
+            violation_type = "speeding"
+            details = "Exceeding speed limit"
             
-            if violation_type:
-                violations_count += 1
-                intersection_name = "Main Street Intersection" if intersection_id == "int-001" else "Park Avenue Intersection"
-                violation_data = {
-                    "vehicleNumber": vehicle.get("license_plate", "Unknown"),
-                    "type": violation_type,
-                    "timestamp": datetime.now().isoformat(),
-                    "location": intersection_name,
-                    "details": details,
-                    "imageUrl": f"https://example.com/violations/{violation_type}_{random.randint(1, 10)}.jpg"  # Fake URL for demo
-                }
-                
-                # Store in MongoDB if available
-                if db is not None:
-                    try:
-                        result = violations_collection.insert_one(violation_data)
-                        print(f"Violation recorded in database with ID: {result.inserted_id}")
-                    except Exception as e:
-                        print(f"Error saving violation to database: {e}")
+        # Two-wheeler violations (actual detection)
+        elif vehicle.get("type") in ["motorcycle", "bicycle"]:
+            if vehicle.get("helmet_violation"):
+                violation_type = "no_helmet"
+                details = "Riding without helmet"
+            elif vehicle.get("passenger_violation"):
+                violation_type = "excess_passengers"
+                details = "Too many passengers on two-wheeler"
+        
+        if violation_type:
+            intersection_name = intersection_registry.name(intersection_id)
+            violation_data = {
+                "vehicleNumber": vehicle.get("license_plate", "Unknown"),
+                "type": violation_type,
+                "timestamp": datetime.now().isoformat(),
+                "location": intersection_name,
+                "details": details,
+                "imageUrl": None
+            }
+            
+            captures.append((vehicle.get("box"), partial(store_violation, violation_data)))
+    
+    # Records are written once their evidence has been encoded; the frame is
+    # encoded once for all of them
+    if captures and (frame is None or evidence_encoder is None or not evidence_encoder.submit(frame, captures)):
+        for _, callback in captures:
+            callback(None)
     
-    return violations_count
+    return len(captures)
 
-def generate_frames(intersection_id, fps_requested=1):
+def generate_frames(intersection_id, fps_requested=1, max_width=None, quality=None):
     """
-    Generator function for video streaming with adjustable quality
+    Generator function for video streaming with adjustable quality.
+    Waits on the intersection's broadcaster and yields the shared JPEG bytes.
     """
-    global processed_frames
-    
+    broadcaster = frame_broadcasters[intersection_id]
+    max_width = max_width or frame_processing["max_width"]
+    quality = quality or frame_processing["frame_quality"]
     fps_limit = min(fps_requested, frame_processing["stream_fps"])
     interval = 1.0 / max(0.5, fps_limit)  # At least 0.5 FPS, but limit to requested FPS
-    last_frame_time = 0
+    last_seq = 0
     
-    while True:
-        # Respect requested FPS
-        current_time = time.time()
-        elapsed = current_time - last_frame_time
-        if elapsed < interval:
-            time.sleep(0.01)  # Small sleep to prevent CPU hogging
-            continue
-            
-        last_frame_time = current_time
-        
-        # Wait until we have a frame
-        if processed_frames.get(intersection_id) is None:
-            time.sleep(0.1)
-            continue
+    broadcaster.add_viewer()
+    try:
+        while True:
+            frame_start = time.time()
             
-        # Use processed frame with annotations
-        with frame_lock:
-            if processed_frames.get(intersection_id) is not None:
-                frame = processed_frames[intersection_id].copy()
-            else:
+            # Block until a newer frame is published (encoded once per tier)
+            seq, jpeg = broadcaster.get_jpeg(last_seq, max_width, quality, timeout=1.0)
+            if jpeg is None:
                 continue
-        
-        # Resize for streaming if needed
-        if frame_processing["max_width"] < frame.shape[1]:
-            scale = frame_processing["max_width"] / frame.shape[1]
-            new_width = frame_processing["max_width"]
-            new_height = int(frame.shape[0] * scale)
-            frame = cv2.resize(frame, (new_width, new_height))
-                
-        # Encode the frame as JPEG with quality setting
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), frame_processing["frame_quality"]]
-        ret, buffer = cv2.imencode('.jpg', frame, encode_param)
-        if not ret:
-            continue
+            last_seq = seq
             
-        # Yield the frame in the multipart response format
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+            # Yield the frame in the multipart response format (the server
+            # writes it to the client before asking for the next one)
+            send_start = time.time()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+            pipeline_metrics.observe("stream_send", time.time() - send_start, intersection_id)
+            
+            # Respect requested FPS
+            remaining = interval - (time.time() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
+    finally:
+        broadcaster.remove_viewer()
+
+def build_traffic_snapshot():
+    """
+    Build the full traffic state list for all intersections.
+    Caller must hold data_lock.
+    """
+    result = []
+    for intersection_id, data in traffic_data.items():
+        result.append({
+            "intersectionId": intersection_id,
+            "vehicleCount": data["vehicleCount"],
+            "hasEmergencyVehicle": data["hasEmergencyVehicle"],
+            "timestamp": data["timestamp"],
+            "status": traffic_signals[intersection_id],
+            "autoMode": auto_control[intersection_id]["enabled"]
+        })
+    return result
+
+def get_traffic_event_snapshot():
+    """
+    Return (last event ID, full traffic state) taken atomically
+    """
+    with data_lock:
+        return traffic_events.last_id, build_traffic_snapshot()
+
+def open_traffic_event_session(resume_token):
+    """
+    Start an event stream session, resuming from resume_token if possible
+    """
+    return EventStreamSession(traffic_events, get_traffic_event_snapshot, resume_token,
+                              event_stream_config["keepalive_interval"])
+
+def generate_traffic_events(resume_token):
+    """
+    Generator function for the Server-Sent Events traffic stream
+    """
+    session = open_traffic_event_session(resume_token)
+    yield session.start()
+    while True:
+        yield session.next_messages()
 
 @app.route('/api/traffic', methods=['GET'])
 def get_traffic_data():
     """
     Return the current traffic data for all intersections
     """
-    result = []
     with data_lock:
-        for intersection_id, data in traffic_data.items():
-            result.append({
-                "intersectionId": intersection_id,
-                "vehicleCount": data["vehicleCount"],
-                "hasEmergencyVehicle": data["hasEmergencyVehicle"],
-                "timestamp": data["timestamp"],
-                "status": traffic_signals[intersection_id],
-                "autoMode": auto_control[intersection_id]["enabled"]
-            })
+        result = build_traffic_snapshot()
     return jsonify(result)
 
+@app.route('/api/intersections', methods=['GET'])
+def get_intersections():
+    """
+    Return the configured intersections with their neighbour relations and detection models
+    """
+    return jsonify([
+        {"id": intersection.id, "name": intersection.name, "neighbors": intersection.neighbors,
+         "model": intersection.model or model_registry.default}
+        for intersection in intersection_registry
+    ])
+
+@app.route('/api/traffic/events', methods=['GET'])
+def traffic_event_stream():
+    """
+    Server-Sent Events stream of traffic state deltas. Sends a snapshot first,
+    or only the missed events when resuming with Last-Event-ID / ?lastEventId=
+    """
+    resume_token = parse_resume_token(request.headers.get('Last-Event-ID') or request.args.get('lastEventId'))
+    return Response(generate_traffic_events(resume_token), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/traffic/history', methods=['GET'])
+def get_traffic_history():
+    """
+    Vehicle counts and signal changes over a time range, per intersection.
+    resolution: raw, 1s, 1m or 1h (default 1m); since and until are ISO
+    timestamps (default: the last 60 buckets up to now); intersectionId
+    limits the result to one intersection. Times in the result are epoch
+    seconds.
+    """
+    resolution = request.args.get('resolution', history_config["default_resolution"])
+    if resolution not in traffic_history.resolutions:
+        return jsonify({"error": f"resolution must be one of: {', '.join(traffic_history.resolutions)}"}), 400
+    intersection_id = request.args.get('intersectionId')
+    if intersection_id is not None and intersection_id not in intersection_registry:
+        return jsonify({"error": "Invalid intersection ID"}), 400
+    
+    try:
+        until = datetime.fromisoformat(request.args['until']).timestamp() if request.args.get('until') else time.time()
+        if request.args.get('since'):
+            since = datetime.fromisoformat(request.args['since']).timestamp()
+        else:
+            seconds = history_config["rollups"][resolution][0] if resolution != "raw" else 1
+            since = until - seconds * history_config["default_points"]
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO timestamps"}), 400
+    
+    intersection_ids = [intersection_id] if intersection_id is not None else intersection_registry.ids()
+    return jsonify({
+        "resolution": resolution,
+        "since": since,
+        "until": until,
+        "intersections": {i: traffic_history.query(i, resolution, since, until) for i in intersection_ids}
+    })
+
 @app.route('/api/traffic/signal', methods=['POST'])
 def update_signal():
     """
@@ -811,7 +1626,7 @@ def update_signal():
     intersection_id = data.get('intersectionId')
     status = data.get('status')
     
-    if not intersection_id or not status or status not in ["red", "yellow", "green"]:
+    if intersection_id not in intersection_registry or status not in ["red", "yellow", "green"]:
         return jsonify({"success": False, "error": "Invalid request parameters"}), 400
     
     with data_lock:
@@ -819,7 +1634,7 @@ def update_signal():
         if auto_control[intersection_id]["enabled"]:
             return jsonify({"success": False, "error": "Cannot change signal manually while auto mode is enabled"}), 400
             
-        traffic_signals[intersection_id] = status
+        set_traffic_signal(intersection_id, status)
     
     print(f"Changing traffic signal at {intersection_id} to {status}")
     return jsonify({"success": True})
@@ -833,12 +1648,13 @@ def toggle_auto_control():
     intersection_id = data.get('intersectionId')
     enabled = data.get('enabled')
     
-    if not intersection_id or enabled is None:
+    if intersection_id not in intersection_registry or enabled is None:
         return jsonify({"success": False, "error": "Invalid request parameters"}), 400
     
     with data_lock:
-        auto_control[intersection_id]["enabled"] = enabled
-        auto_control[intersection_id]["last_change_time"] = time.time()
+        enable_auto_control(intersection_id, enabled, time.time())
+        traffic_events.publish("autoMode", intersection_id, enabled=enabled)
+        update_signal_board(intersection_id)
     
     print(f"{'Enabling' if enabled else 'Disabling'} auto control for {intersection_id}")
     return jsonify({"success": True})
@@ -851,7 +1667,7 @@ def check_violations():
     data = request.json
     intersection_id = data.get('intersectionId')
     
-    if not intersection_id:
+    if intersection_id not in intersection_registry:
         return jsonify({"success": False, "error": "Invalid intersection ID"}), 400
     
     violations = check_for_violations(intersection_id)
@@ -864,22 +1680,42 @@ def check_violations():
 @app.route('/api/traffic/violations', methods=['GET'])
 def get_violations():
     """
-    Get all recorded traffic violations
+    Get recorded traffic violations, newest first.
+    Filters: location, type, plate, since, until (ISO timestamps).
+    Paging: limit (max 200) and cursor; the cursor for the next page is
+    returned in the X-Next-Cursor header. fields selects which fields to return.
     """
-    if db is not None:
+    limit = request.args.get('limit', violation_query_config["default_limit"], type=int)
+    if limit < 1 or limit > violation_query_config["max_limit"]:
+        return jsonify({"error": f"limit must be between 1 and {violation_query_config['max_limit']}"}), 400
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in VIOLATION_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(VIOLATION_FIELDS)}"}), 400
+    
+    filters = {name: request.args.get(name) for name in ("location", "type", "plate", "since", "until")}
+    
+    if violation_store is not None:
         try:
-            # Get violations from MongoDB
-            cursor = violations_collection.find().sort("timestamp", -1).limit(50)
-            violations = []
-            
-            for doc in cursor:
-                doc["id"] = str(doc.pop("_id"))  # Convert ObjectId to string
-                violations.append(doc)
-                
-            return jsonify(violations)
+            docs, next_cursor = violation_store.query(filters, request.args.get('cursor'), limit, fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             print(f"Error retrieving violations: {e}")
             return jsonify([])
+        
+        violations = []
+        for doc in docs:
+            doc["id"] = str(doc.pop("_id"))  # Convert ObjectId to string
+            violations.append(doc)
+        
+        response = jsonify(violations)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
     else:
         # Return simulated violations if no database
         return jsonify([
@@ -895,27 +1731,79 @@ def get_violations():
             for i in range(1, 6)
         ])
 
-@app.route('/api/video_feed/<intersection_id>')
-def video_feed(intersection_id):
+@app.route('/api/evidence/<digest>', methods=['GET'])
+def get_evidence(digest):
     """
-    Video streaming route for the camera feed with quality parameter
+    Serve a violation evidence snapshot. Snapshots are content-addressed, so
+    the digest doubles as a strong ETag and responses are cacheable forever.
     """
-    if intersection_id not in ["int-001", "int-002"]:
-        return "Invalid intersection ID", 400
+    if evidence_store is None:
+        return jsonify({"error": "Evidence not found"}), 404
+    path = evidence_store.path_for(digest)
+    if path is None:
+        return jsonify({"error": "Invalid evidence ID"}), 400
+    if not evidence_store.contains(digest) or not os.path.exists(path):
+        return jsonify({"error": "Evidence not found (it may have been evicted)"}), 404
+    
+    response = send_file(path, mimetype='image/jpeg', etag=digest, conditional=True,
+                         max_age=evidence_config["cache_max_age"])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def resolve_stream_settings(args):
+    """
+    Work out (fps, max_width, quality) for a stream from its query parameters.
+    Use ?profile=thumbnail|operator|evidence to select a stream profile;
+    without one, quality is derived from the requested fps for this stream only.
+    Raises ValueError for an unknown profile.
+    """
+    profile_name = args.get('profile')
+    if profile_name is not None:
+        profile = stream_profiles.get(profile_name)
+        if profile is None:
+            raise ValueError(f"Invalid stream profile. Choose one of: {', '.join(stream_profiles)}")
+        
+        # An explicit fps may lower, but not raise, the profile's rate
+        fps = min(args.get('fps', profile["fps"], type=float), profile["fps"])
+        return fps, profile["max_width"], profile["quality"]
         
     # Get requested FPS from query parameter
-    fps = request.args.get('fps', 1, type=float)
-    # Update frame quality based on FPS (higher FPS = lower quality to maintain performance)
+    fps = args.get('fps', 1, type=float)
+    # Pick frame quality based on FPS (higher FPS = lower quality to maintain performance)
     if fps <= 0.5:
-        frame_processing["frame_quality"] = 75  # Higher quality for low FPS
+        quality = 75  # Higher quality for low FPS
     elif fps <= 1:
-        frame_processing["frame_quality"] = 70  # Medium quality
+        quality = 70  # Medium quality
     else:
-        frame_processing["frame_quality"] = 65  # Lower quality for high FPS
+        quality = 65  # Lower quality for high FPS
+    
+    return fps, frame_processing["max_width"], quality
+
+@app.route('/api/video_feed/<intersection_id>')
+def video_feed(intersection_id):
+    """
+    Video streaming route for the camera feed with quality parameter
+    """
+    if intersection_id not in frame_broadcasters:
+        return "Invalid intersection ID", 400
     
-    return Response(generate_frames(intersection_id, fps),
+    try:
+        fps, max_width, quality = resolve_stream_settings(request.args)
+    except ValueError as e:
+        return str(e), 400
+    
+    return Response(generate_frames(intersection_id, fps, max_width, quality),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/api/metrics')
+def get_metrics():
+    """
+    Per-stage latency histograms and pipeline counters in the Prometheus text format
+    """
+    collect_pipeline_metrics()
+    return Response(pipeline_metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/stream_status')
 def stream_status():
     """
@@ -925,10 +1813,76 @@ def stream_status():
         "stream_fps": frame_processing["stream_fps"],
         "process_skip_frames": frame_processing["skip_frames"],
         "frame_quality": frame_processing["frame_quality"],
-        "last_processed": time.time() - frame_processing["last_full_process_time"]
+        "stream_profiles": stream_profiles,
+        "server_threads": threading.active_count(),
+        "last_processed": {
+            intersection_id: time.time() - processed_at if processed_at else None
+            for intersection_id, processed_at in last_detection_times.items()
+        },
+        "inference": {model_name: engine.get_stats() for model_name, engine in list(inference_engines.items())},
+        "violation_writer": violation_writer.get_stats() if violation_writer is not None else None,
+        "violation_store": violation_store.get_stats() if violation_store is not None else None,
+        "evidence": {
+            "encoder": evidence_encoder.get_stats(),
+            "store": evidence_store.get_stats()
+        } if evidence_store is not None else None,
+        "scheduler": detection_scheduler.get_stats(),
+        "detection_workers": [
+            {"pid": worker["process"].pid, "alive": worker["process"].is_alive(), "intersections": worker["intersections"]}
+            for worker in detection_workers
+        ],
+        "signals": {
+            "timer": signal_timer.get_stats(),
+            "next_change_in": {
+                intersection_id: due - time.time() if due is not None else None
+                for intersection_id, due in ((i, signal_timer.deadline(i)) for i in intersection_registry.ids())
+            }
+        },
+        "simulation": traffic_simulator.get_stats() if traffic_simulator is not None else None,
+        "history": traffic_history.get_stats(),
+        "replay": {intersection_id: source.get_stats() for intersection_id, source in list(replay_sources.items())},
+        "motion": get_camera_stats("motion", motion_gates),
+        "adaptive": {
+            "config": adaptive_config,
+            "intersections": get_camera_stats("adaptive", adaptive_controllers)
+        },
+        "tracking": {intersection_id: tracker.get_stats() for intersection_id, tracker in vehicle_trackers.items()},
+        "streams": {intersection_id: broadcaster.get_stats() for intersection_id, broadcaster in frame_broadcasters.items()},
+        "pipeline": {
+            intersection_id: {
+                "buffers": {name: buffer.get_stats() for name, buffer in stages["buffers"].items()},
+                "stages": {name: stage.get_stats() for name, stage in stages["stages"].items()}
+            }
+            for intersection_id, stages in list(pipeline_stats.items())
+        }
     })
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Smart Traffic Management System backend")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask",
+                        help="flask: threaded Flask server; asgi: asyncio server for many stream clients")
+    parser.add_argument("--async-workers", type=int, default=8,
+                        help="Worker threads for non-streaming routes in asgi mode")
+    parser.add_argument("--detection-workers", type=int, default=0,
+                        help="Run detection in this many worker processes (0: threads in the server process)")
+    parser.add_argument("--port", type=int, default=5000, help="HTTP port")
+    parser.add_argument("--replay", nargs="+", metavar="PATH",
+                        help="Replay video files or image directories instead of the cameras "
+                             "(assigned to intersections round-robin)")
+    parser.add_argument("--replay-pace", choices=["realtime", "fast"], default=replay_config["pace"],
+                        help="realtime: at the clip's frame rate; fast: as fast as the pipeline takes frames")
+    parser.add_argument("--replay-once", action="store_true", help="Stop each camera at the end of its clip")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Feed synthetic detections to every intersection instead of running cameras")
+    args = parser.parse_args()
+    
+    if args.replay:
+        replay_config["pace"] = args.replay_pace
+        replay_config["loop"] = not args.replay_once
+        for index, intersection in enumerate(intersection_registry):
+            intersection.camera = f"replay:{args.replay[index % len(args.replay)]}"
+            print(f"Replaying {args.replay[index % len(args.replay)]} for {intersection.id}")
+    
     # Create directory for YOLO files if it doesn't exist
     yolo_dir = os.path.join(os.path.dirname(__file__), 'yolo')
     if not os.path.exists(yolo_dir):
@@ -939,31 +1893,37 @@ if __name__ == '__main__':
         print("2. yolov4.weights: https://github.com/AlexeyAB/darknet/releases/download/darknet_yolo_v3_optimal/yolov4.weights")
         print("3. coco.names: https://raw.githubusercontent.com/AlexeyAB/darknet/master/data/coco.names")
     
-    # Start signal coordination thread
-    coord_thread = threading.Thread(
-        target=coordinate_traffic_signals,
-        daemon=True
-    )
-    coord_thread.start()
-    print("Started signal coordination thread")
+    # Worker processes are forked before this process starts any threads
+    # (the violation writer, evidence encoder and MongoDB client start in
+    # init_services), so they inherit no locks held by them
+    use_workers = args.detection_workers > 0 and not args.simulate
+    if use_workers:
+        start_detection_workers(args.detection_workers)
     
-    # Start video processing for each intersection in background threads
-    thread1 = threading.Thread(
-        target=detect_vehicles, 
-        args=(0, "int-001"),  # 0 is the index for laptop camera
-        daemon=True
-    )
-    thread1.start()
-    print(f"Started detection thread for int-001 with laptop camera (index 0)")
+    init_services()
     
-    thread2 = threading.Thread(
-        target=detect_vehicles, 
-        args=(1, "int-002"),  # 1 is the index for external webcam
-        daemon=True
-    )
-    thread2.start()
-    print(f"Started detection thread for int-002 with external webcam (index 1)")
+    # Start video processing for every configured intersection
+    if args.simulate:
+        start_simulation()
+    elif not use_workers:
+        start_detection()
+    
+    # Start the signal phase timer (auto mode phases are scheduled as they start)
+    with data_lock:
+        for intersection_id in intersection_registry.ids():
+            schedule_phase_end(intersection_id)
+    signal_timer.start(advance_signal_phase)
+    
+    if args.server == "asgi":
+        # Streams are served on the event loop; JSON routes reuse the Flask views
+        asgi_app = AsyncTrafficServer(app, frame_broadcasters, resolve_stream_settings,
+                                      open_traffic_event_session, max_workers=args.async_workers,
+                                      metrics=pipeline_metrics)
+        print(f"Starting async server on http://0.0.0.0:{args.port}")
+        if run_async_server(asgi_app, host='0.0.0.0', port=args.port):
+            raise SystemExit(0)
+        print("Falling back to Flask server")
     
     # Start the Flask app
-    print("Starting Flask server on http://0.0.0.0:5000")
-    app.run(debug=False, threaded=True, host='0.0.0.0', port=5000)
+    print(f"Starting Flask server on http://0.0.0.0:{args.port}")
+    app.run(debug=False, threaded=True, host='0.0.0.0', port=args.port)
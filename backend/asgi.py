@@ -0,0 +1,261 @@
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+from events import parse_resume_token
+
+
+class AsyncTrafficServer:
+    """
+    ASGI front end for the traffic backend. MJPEG streams are served natively
+    on the event loop, so a connected viewer costs a coroutine rather than an
+    OS thread. Every other route is dispatched to the Flask app on a small
+    bounded thread pool, so the URLs and JSON responses stay identical.
+    With metrics (a PipelineMetrics), the time to send each stream frame is
+    observed as "stream_send".
+    """
+    def __init__(self, wsgi_app, frame_broadcasters, resolve_stream_settings, open_event_session=None, max_workers=8,
+                 metrics=None):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+        self.frame_broadcasters = frame_broadcasters
+        self.resolve_stream_settings = resolve_stream_settings
+        self.open_event_session = open_event_session
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asgi-worker")
+        self.stream_prefix = "/api/video_feed/"
+        self.events_path = "/api/traffic/events"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"].startswith(self.stream_prefix):
+                await self._stream(scope, receive, send)
+            elif scope["path"] == self.events_path and self.open_event_session is not None:
+                await self._events(scope, receive, send)
+            else:
+                await self._call_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _send_text(self, send, status, text):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                        (b"access-control-allow-origin", b"*")]
+        })
+        await send({"type": "http.response.body", "body": text.encode()})
+
+    async def _stream(self, scope, receive, send):
+        """
+        Async equivalent of generate_frames for /api/video_feed/<intersection_id>
+        """
+        intersection_id = scope["path"][len(self.stream_prefix):].strip("/")
+        broadcaster = self.frame_broadcasters.get(intersection_id)
+        if broadcaster is None:
+            await self._send_text(send, 400, "Invalid intersection ID")
+            return
+
+        args = MultiDict(parse_qsl(scope.get("query_string", b"").decode()))
+        try:
+            fps, max_width, quality = self.resolve_stream_settings(args)
+        except ValueError as e:
+            await self._send_text(send, 400, str(e))
+            return
+
+        interval = 1.0 / max(0.5, fps)
+        loop = asyncio.get_running_loop()
+
+        # Watch for the client going away while we are waiting on frames
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"multipart/x-mixed-replace; boundary=frame"),
+                        (b"access-control-allow-origin", b"*"),
+                        (b"cache-control", b"no-cache")]
+        })
+
+        broadcaster.add_viewer()
+        last_seq = 0
+        try:
+            while not disconnected.is_set():
+                frame_start = time.time()
+
+                seq = await broadcaster.wait_for_seq_async(last_seq, timeout=1.0)
+                if seq is None:
+                    continue
+
+                # JPEG encoding (at most once per tier) happens off the event loop
+                seq, jpeg = await loop.run_in_executor(
+                    self.executor, broadcaster.get_jpeg, last_seq, max_width, quality, 0)
+                if jpeg is None:
+                    continue
+                last_seq = seq
+
+                send_start = time.time()
+                await send({
+                    "type": "http.response.body",
+                    "body": b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n',
+                    "more_body": True
+                })
+                if self.metrics is not None:
+                    self.metrics.observe("stream_send", time.time() - send_start, intersection_id)
+
+                remaining = interval - (time.time() - frame_start)
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(disconnected.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        except OSError:
+            pass  # Client connection dropped mid-send
+        finally:
+            broadcaster.remove_viewer()
+            watcher.cancel()
+
+    async def _events(self, scope, receive, send):
+        """
+        Async equivalent of the /api/traffic/events Server-Sent Events route
+        """
+        headers = dict(scope.get("headers", []))
+        args = MultiDict(parse_qsl(scope.get("query_string", b"").decode()))
+        resume_token = parse_resume_token(
+            headers.get(b"last-event-id", b"").decode("latin-1") or args.get("lastEventId"))
+
+        # The snapshot takes the data lock, so build it off the event loop
+        loop = asyncio.get_running_loop()
+        session = self.open_event_session(resume_token)
+        opening = await loop.run_in_executor(self.executor, session.start)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"access-control-allow-origin", b"*"),
+                        (b"cache-control", b"no-cache")]
+        })
+
+        receive_task = asyncio.ensure_future(receive())
+        try:
+            await send({"type": "http.response.body", "body": opening.encode(), "more_body": True})
+            while True:
+                next_task = asyncio.ensure_future(session.next_messages_async())
+                done, _ = await asyncio.wait({next_task, receive_task}, return_when=asyncio.FIRST_COMPLETED)
+                if receive_task in done:
+                    if receive_task.result()["type"] == "http.disconnect":
+                        next_task.cancel()
+                        return
+                    receive_task = asyncio.ensure_future(receive())
+                message = await next_task
+                await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+        except OSError:
+            pass  # Client connection dropped mid-send
+        finally:
+            receive_task.cancel()
+
+    async def _call_wsgi(self, scope, receive, send):
+        """
+        Run a regular (non-streaming) Flask route on the worker pool
+        """
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        environ = self._build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, response_body = await loop.run_in_executor(self.executor, self._run_wsgi, environ)
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": response_body})
+
+    def _run_wsgi(self, environ):
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start["status"] = int(status.split(" ", 1)[0])
+            response_start["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                         for name, value in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            response_body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response_start["status"], response_start["headers"], response_body
+
+    def _build_environ(self, scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif name == "CONTENT_LENGTH":
+                continue
+            else:
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def run_async_server(asgi_app, host="0.0.0.0", port=5000):
+    """
+    Serve the ASGI app with uvicorn. Returns False if uvicorn is not installed.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        print("Warning: uvicorn is not installed (pip install uvicorn); cannot start async server")
+        return False
+
+    uvicorn.run(asgi_app, host=host, port=port, log_level="warning")
+    return True
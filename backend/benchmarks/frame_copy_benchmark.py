@@ -0,0 +1,161 @@
+
+"""
+Benchmark for full-frame copies on the render path.
+
+Drives a FrameBroadcaster with synthetic camera frames and concurrent stream
+viewers, the way the render stage does, and reports how many frame bytes are
+copied and how many frame buffers are allocated per rendered frame for:
+
+  original        copies made by the first single-loop pipeline: the raw
+                  frame, the frame to draw on, the processed frame, and one
+                  more per viewer for every streamed frame
+  copy_per_frame  drawing on a fresh copy of every captured frame
+  owned_buffers   drawing in place on frames only the render stage holds,
+                  and into a recycled back buffer for frames shared with
+                  inference
+
+Camera decoding is simulated outside the timed section and is not counted.
+
+    python benchmarks/frame_copy_benchmark.py --frames 300 --viewers 4 --output copies.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_load_test import percentiles
+from streaming import FrameBroadcaster
+
+MODES = ("original", "copy_per_frame", "owned_buffers")
+
+
+def draw_overlays(frame, index):
+    """
+    Stand-in for the render stage's overlays: a few boxes and labels
+    """
+    for i in range(8):
+        x, y = 60 + i * 200, 200 + (index * 7 + i * 40) % 600
+        cv2.rectangle(frame, (x, y), (x + 150, y + 100), (0, 255, 0), 2)
+        cv2.putText(frame, f"car {i}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    cv2.putText(frame, "Signal: GREEN", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+
+class CopyCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.allocations = 0
+
+    def copy(self, frame):
+        with self.lock:
+            self.bytes += frame.nbytes
+            self.allocations += 1
+        return frame.copy()
+
+
+def viewer(broadcaster, mode, counter, stop, max_width, quality):
+    seq = 0
+    while not stop.is_set():
+        if mode == "original":
+            # Each client took its own copy of the processed frame before encoding
+            seq, frame = broadcaster.wait_for_frame(seq, timeout=0.5)
+            if frame is not None:
+                counter.copy(frame)
+            continue
+        seq, _ = broadcaster.get_jpeg(seq, max_width, quality, timeout=0.5)
+
+
+def run_mode(mode, sources, frames, viewers, skip_frames, fps, max_width, quality):
+    broadcaster = FrameBroadcaster(mode)
+    counter = CopyCounter()
+    stop = threading.Event()
+    threads = [threading.Thread(target=viewer, args=(broadcaster, mode, counter, stop, max_width, quality), daemon=True)
+               for _ in range(viewers)]
+    for thread in threads:
+        thread.start()
+
+    render_ms = []
+    shared_frames = 0
+    for index in range(1, frames + 1):
+        frame = sources[index % len(sources)].copy()  # A fresh decoded frame from the camera
+        shared = index % skip_frames == 0
+        shared_frames += shared
+
+        start = time.perf_counter()
+        if mode == "original":
+            counter.copy(frame)  # latest_frames
+            process_frame = counter.copy(frame)
+            draw_overlays(process_frame, index)
+            published = counter.copy(process_frame)  # processed_frames
+        elif mode == "copy_per_frame":
+            published = counter.copy(frame)
+            draw_overlays(published, index)
+        else:
+            published = broadcaster.back_buffer(frame) if shared else frame
+            draw_overlays(published, index)
+        broadcaster.publish(published)
+        render_ms.append((time.perf_counter() - start) * 1000)
+
+        time.sleep(max(0.0, 1.0 / fps - (time.perf_counter() - start)))
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    stats = broadcaster.get_stats()
+    copied = counter.bytes + stats["bytes_copied"]
+    allocations = counter.allocations + stats["buffer_allocations"]
+    return {
+        "frames": frames,
+        "shared_with_inference": shared_frames,
+        "bytes_copied": copied,
+        "bytes_copied_per_frame": copied / frames,
+        "frame_copies_per_frame": copied / frames / sources[0].nbytes,
+        "buffer_allocations": allocations,
+        "jpeg_encodes": stats["jpeg_encodes"],
+        "render_ms": percentiles(render_ms)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame copy benchmark for the render path")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to render per mode")
+    parser.add_argument("--viewers", type=int, default=4, help="Concurrent stream viewers")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--skip-frames", type=int, default=5, help="Every Nth frame also goes to inference")
+    parser.add_argument("--fps", type=float, default=30, help="Render rate")
+    parser.add_argument("--max-width", type=int, default=640, help="Stream tier width")
+    parser.add_argument("--quality", type=int, default=70, help="Stream tier JPEG quality")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    sources = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(4)]
+    report = {
+        "frame_bytes": sources[0].nbytes,
+        "resolution": f"{args.width}x{args.height}",
+        "viewers": args.viewers,
+        "skip_frames": args.skip_frames,
+        "modes": {}
+    }
+    for mode in MODES:
+        report["modes"][mode] = run_mode(mode, sources, args.frames, args.viewers, args.skip_frames,
+                                         args.fps, args.max_width, args.quality)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+
+"""
+CPU benchmark for the detection models in models.json.
+
+Runs every selected model over the same recorded clips (video files or
+directories of images), one frame at a time on the CPU, and reports per
+model and clip: throughput, latency percentiles, vehicles found per frame
+and how closely the per-frame vehicle counts agree with a reference model
+(the default model unless --reference is given). Models whose files or
+runtime are missing are reported as skipped.
+
+    python benchmarks/model_benchmark.py --clips clips/day.mp4 clips/night --output models.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import decode_detections
+from models import load_model_registry
+from stream_load_test import percentiles
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def read_clip(path, max_frames):
+    """
+    Frames of a video file, or of the images in a directory in name order
+    """
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS) and len(frames) < max_frames:
+                frame = cv2.imread(os.path.join(path, name))
+                if frame is not None:
+                    frames.append(frame)
+    else:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {path}")
+    return frames
+
+
+def run_model(model, frames, input_size, confidence, nms, vehicle_classes, warmup):
+    """
+    Detect vehicles in every frame; returns (per-frame counts, latencies in ms, seconds)
+    """
+    class_ids = [i for i, name in enumerate(model.classes) if name in vehicle_classes]
+    for frame in frames[:warmup]:
+        model.forward([frame], input_size)
+
+    counts, latencies = [], []
+    start = time.perf_counter()
+    for frame in frames:
+        frame_start = time.perf_counter()
+        rows = model.forward([frame], input_size)[0]
+        height, width = frame.shape[:2]
+        counts.append(len(decode_detections([rows], width, height, confidence, nms, class_ids)))
+        latencies.append((time.perf_counter() - frame_start) * 1000)
+    return counts, latencies, time.perf_counter() - start
+
+
+def count_agreement(counts, reference):
+    """
+    How closely per-frame vehicle counts match the reference model's
+    """
+    differences = [abs(a - b) for a, b in zip(counts, reference)]
+    return {
+        "mean_abs_difference": sum(differences) / len(differences),
+        "exact_match_rate": sum(1 for d in differences if d == 0) / len(differences),
+        "within_one_rate": sum(1 for d in differences if d <= 1) / len(differences),
+        "total_ratio": sum(counts) / sum(reference) if sum(reference) else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection model CPU benchmark")
+    parser.add_argument("--clips", nargs="+", required=True, help="Video files or image directories")
+    parser.add_argument("--models", nargs="*", default=None, help="Model names (default: all configured)")
+    parser.add_argument("--reference", default=None, help="Model the vehicle counts are compared with")
+    parser.add_argument("--models-config", default=os.path.join(BACKEND_DIR, "models.json"))
+    parser.add_argument("--model-dir", default=os.path.join(BACKEND_DIR, "yolo"))
+    parser.add_argument("--input-size", type=int, default=416, help="Input size for models without a fixed one")
+    parser.add_argument("--max-frames", type=int, default=200, help="Frames read from each clip")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed frames before each run")
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--nms", type=float, default=0.4)
+    parser.add_argument("--vehicle-classes", nargs="+", default=["car", "truck", "bus", "motorcycle", "bicycle"])
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    registry = load_model_registry(args.models_config, args.model_dir)
+    names = args.models or registry.names()
+    reference = args.reference or registry.default
+    if reference not in names:
+        names = [reference] + names
+    clips = {os.path.basename(os.path.normpath(path)): read_clip(path, args.max_frames) for path in args.clips}
+
+    report = {
+        "input_size": args.input_size,
+        "reference": reference,
+        "cpu_count": os.cpu_count(),
+        "clips": {name: len(frames) for name, frames in clips.items()},
+        "models": {}
+    }
+    counts_by_model = {}
+    for name in names:
+        try:
+            model = registry.load(name, prefer_opencl=False)
+        except Exception as e:
+            report["models"][name] = {"skipped": str(e)}
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+
+        result = {"model": model.describe(), "input_size": model.input_size_for(args.input_size), "clips": {}}
+        counts_by_model[name] = {}
+        all_latencies, total_frames, total_seconds = [], 0, 0.0
+        for clip_name, frames in clips.items():
+            counts, latencies, seconds = run_model(model, frames, args.input_size, args.confidence, args.nms,
+                                                   args.vehicle_classes, args.warmup)
+            counts_by_model[name][clip_name] = counts
+            result["clips"][clip_name] = {
+                "fps": len(frames) / seconds,
+                "latency_ms": percentiles(latencies),
+                "mean_vehicles": sum(counts) / len(counts)
+            }
+            all_latencies.extend(latencies)
+            total_frames += len(frames)
+            total_seconds += seconds
+        result["fps"] = total_frames / total_seconds
+        result["latency_ms"] = percentiles(all_latencies)
+        report["models"][name] = result
+        print(f"{name}: {result['fps']:.1f} fps, p50 {result['latency_ms']['p50']:.1f} ms", file=sys.stderr)
+
+    # Agreement is only meaningful against a model that actually ran
+    if reference in counts_by_model:
+        for name, clip_counts in counts_by_model.items():
+            for clip_name, counts in clip_counts.items():
+                report["models"][name]["clips"][clip_name]["count_agreement"] = count_agreement(
+                    counts, counts_by_model[reference][clip_name])
+    else:
+        report["reference"] = None
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
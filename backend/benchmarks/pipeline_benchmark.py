@@ -0,0 +1,252 @@
+
+"""
+End-to-end pipeline benchmark on recorded clips.
+
+For each clip, starts the backend with every camera replaced by the clip
+(app.py --replay <clip> --replay-once), waits until the clip has been played
+through the capture, inference and render stages, and records from
+/api/stream_status and the process itself:
+
+  throughput   frames read, inference passes and rendered frames per second
+  latency      per-stage latency percentiles (capture, inference, render)
+  memory       peak and final resident set size of the backend process
+  detections   vehicles detected in total and per inference pass
+  drops        frames meant for inference that were overwritten before it took
+               them (none with the default --pace fast unless inference stalled)
+
+The report is JSON with the git commit it was made on, so runs of two
+versions can be diffed; --baseline adds the relative change of the main
+metrics against an earlier report.
+
+    python benchmarks/pipeline_benchmark.py --clips clips/day.mp4 clips/night --output pipeline.json
+    python benchmarks/pipeline_benchmark.py --clips clips/day.mp4 --baseline pipeline.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fetch_status(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/stream_status", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def read_memory(pid):
+    """
+    (current, peak) resident set size in MB from /proc, or (None, None) off Linux
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def replay_done(status):
+    """
+    Every clip has been read to the end and no frame is waiting for inference
+    """
+    replay = status.get("replay") or {}
+    if not replay or not all(source["finished"] for source in replay.values()):
+        return False
+    return all(stages["buffers"]["inference"]["depth"] == 0 for stages in status["pipeline"].values())
+
+
+def run_clip(args, clip, intersections_path):
+    port = free_port()
+    command = [sys.executable, args.app, "--replay", clip, "--replay-once", "--replay-pace", args.pace,
+               "--port", str(port)] + args.app_args
+    env = dict(os.environ, INTERSECTIONS_CONFIG=intersections_path)
+    log = open(os.path.join(tempfile.gettempdir(), f"pipeline_benchmark_{port}.log"), "w")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    start = time.time()
+    status, max_rss = None, 0.0
+    try:
+        while time.time() - start < args.timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Backend exited with code {process.returncode}; see {log.name}")
+            time.sleep(args.poll_interval)
+            rss, _ = read_memory(process.pid)
+            max_rss = max(max_rss, rss or 0.0)
+            try:
+                status = fetch_status(port)
+            except OSError:
+                continue  # Still starting up
+            if replay_done(status):
+                break
+        else:
+            raise TimeoutError(f"Replay of {clip} did not finish within {args.timeout}s; see {log.name}")
+
+        # Let the last inference and render passes complete before the final snapshot
+        time.sleep(args.settle)
+        status = fetch_status(port)
+        fetched_at = time.time()
+        rss, peak_rss = read_memory(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+    return summarize(status, fetched_at, rss, peak_rss or max_rss or None)
+
+
+def summarize(status, fetched_at, rss, peak_rss):
+    replay = list(status["replay"].values())
+    stages = {}
+    last_run = 0.0
+    for intersection_stages in status["pipeline"].values():
+        for name, stage in intersection_stages["stages"].items():
+            if stage["last_run_age"] is not None:
+                last_run = max(last_run, fetched_at - stage["last_run_age"])
+            totals = stages.setdefault(name, {"iterations": 0, "errors": 0, "items": 0, "latency_ms": []})
+            totals["iterations"] += stage["iterations"]
+            totals["errors"] += stage["errors"]
+            totals["items"] += stage["items"]
+            totals["latency_ms"].append(stage["latency_ms"])
+
+    # From the first frame read to the last pass of any stage (the backend runs on this machine's clock)
+    seconds = last_run - min(source["started_at"] for source in replay if source["started_at"])
+    result = {
+        "cameras": len(replay),
+        "seconds": seconds,
+        "frames_read": sum(source["frames_read"] for source in replay),
+        "inference_drops": sum(stages["buffers"]["inference"]["drops"] for stages in status["pipeline"].values()),
+        "throughput_fps": {
+            "capture": sum(source["frames_read"] for source in replay) / seconds,
+            "inference": stages["inference"]["iterations"] / seconds,
+            "render": stages["render"]["iterations"] / seconds
+        },
+        "stages": {},
+        "memory_mb": {"rss": rss, "peak_rss": peak_rss},
+        "detections": {
+            "vehicles": stages["inference"]["items"],
+            "per_inference": stages["inference"]["items"] / stages["inference"]["iterations"]
+            if stages["inference"]["iterations"] else None
+        },
+        "inference_engines": status.get("inference"),
+        "adaptive": {intersection_id: {key: value for key, value in stats.items() if key != "recent_decisions"}
+                     for intersection_id, stats in status["adaptive"]["intersections"].items()},
+        "motion": status.get("motion")
+    }
+    for name, totals in stages.items():
+        # Worst camera's percentile when several cameras replay the clip
+        result["stages"][name] = {
+            "iterations": totals["iterations"],
+            "errors": totals["errors"],
+            "latency_ms": {
+                key: max((latency[key] for latency in totals["latency_ms"] if latency[key] is not None), default=None)
+                for key in ("p50", "p95", "p99")
+            }
+        }
+    return result
+
+
+def relative_change(new, old):
+    if new is None or not old:
+        return None
+    return (new - old) / old
+
+
+def compare(report, baseline):
+    """
+    Relative change of the main metrics for every clip in both reports
+    """
+    deltas = {}
+    for clip, result in report["clips"].items():
+        previous = baseline.get("clips", {}).get(clip)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+        deltas[clip] = {
+            "throughput_fps": {stage: relative_change(value, previous["throughput_fps"].get(stage))
+                               for stage, value in result["throughput_fps"].items()},
+            "latency_p95_ms": {stage: relative_change(stats["latency_ms"]["p95"],
+                                                      previous["stages"].get(stage, {}).get("latency_ms", {}).get("p95"))
+                               for stage, stats in result["stages"].items()},
+            "peak_rss_mb": relative_change(result["memory_mb"]["peak_rss"], previous["memory_mb"]["peak_rss"]),
+            "vehicles": relative_change(result["detections"]["vehicles"], previous["detections"]["vehicles"])
+        }
+    return {"commit": baseline.get("commit"), "clips": deltas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on recorded clips")
+    parser.add_argument("--clips", nargs="+", required=True, help="Video files or image directories")
+    parser.add_argument("--cameras", type=int, default=1, help="Cameras replaying each clip at the same time")
+    parser.add_argument("--pace", choices=["realtime", "fast"], default="fast")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed per clip")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait after the clip ends")
+    parser.add_argument("--app", default=os.path.join(BACKEND_DIR, "app.py"), help="Backend entry script")
+    parser.add_argument("--app-args", nargs=argparse.REMAINDER, default=[],
+                        help="Further backend arguments (must come last)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "pace": args.pace,
+        "cameras": args.cameras,
+        "app_args": args.app_args,
+        "clips": {}
+    }
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"intersections": [
+            {"id": f"bench-{index + 1:03d}", "name": f"Benchmark camera {index + 1}", "camera": 0}
+            for index in range(args.cameras)
+        ]}, f)
+        intersections_path = f.name
+    try:
+        for clip in args.clips:
+            name = os.path.basename(os.path.normpath(clip))
+            print(f"Replaying {clip}...", file=sys.stderr)
+            try:
+                report["clips"][name] = run_clip(args, os.path.abspath(clip), intersections_path)
+            except Exception as e:
+                report["clips"][name] = {"error": str(e)}
+                print(f"Failed on {clip}: {e}", file=sys.stderr)
+    finally:
+        os.remove(intersections_path)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["baseline"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+
+"""
+Scale test for automatic signal control, without cameras.
+
+Simulates synthetic traffic (vehicle counts, emergency vehicles and
+two-wheeler violations) at hundreds of virtual intersections, faster than
+real time, through the backend's own detection-result and phase-change
+code, and reports:
+
+  throughput    detection results and phase changes handled per wall second,
+                and how much faster than real time the simulation ran
+  latency       wall time per detection result applied and per phase change
+  contention    how often and how long callers waited for the shared state
+                lock, and how long it was held
+
+Dashboard clients polling /api/traffic can be added with --readers. With
+several --intersections values every size runs in its own process, so the
+report shows where the signal logic stops scaling.
+
+    python benchmarks/signal_simulation.py --intersections 50 200 800 --duration 3600 --output signals.json
+    python benchmarks/signal_simulation.py --intersections 300 --write-config sim.json
+    INTERSECTIONS_CONFIG=sim.json python app.py --simulate
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from simulation import InstrumentedLock, TrafficSimulator, make_intersections_config
+from stream_load_test import percentiles
+
+
+def run_simulation(args):
+    """
+    Simulate one corridor or grid in this process and return its report
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(make_intersections_config(args.intersections[0], args.layout), f)
+        os.environ["INTERSECTIONS_CONFIG"] = f.name
+    try:
+        import app
+    finally:
+        os.remove(f.name)
+
+    # Every caller of the shared state lock goes through the instrumented one
+    lock = InstrumentedLock()
+    app.data_lock = lock
+    ids = app.intersection_registry.ids()
+    with lock:
+        for intersection_id in ids:
+            app.enable_auto_control(intersection_id, True, 0.0)
+
+    phase_change_times = []
+    preemptions = [0]
+    preempt_for_emergency = app.preempt_for_emergency
+
+    def counted_preemption(intersection_id, now):
+        preemptions[0] += 1
+        preempt_for_emergency(intersection_id, now)
+    app.preempt_for_emergency = counted_preemption
+
+    def timed_phase_change(intersection_id, due, now):
+        start_time = time.perf_counter()
+        app.advance_signal_phase(intersection_id, due, now)
+        phase_change_times.append(time.perf_counter() - start_time)
+
+    config = dict(app.simulation_config, detection_interval=args.detection_interval)
+    simulator = TrafficSimulator(
+        ids,
+        lambda intersection_id, vehicle_count, has_emergency, vehicles, now: app.apply_detection_results(
+            intersection_id, vehicle_count, has_emergency, vehicles, None, now=now),
+        app.traffic_signals.get, config,
+        fire_due=lambda now: app.signal_timer.fire_due(now, timed_phase_change),
+        seed=args.seed, threads=args.threads)
+
+    # Dashboard clients polling the traffic snapshot
+    stopping = threading.Event()
+    reads = [0]
+
+    def reader():
+        while not stopping.is_set():
+            with lock:
+                app.build_traffic_snapshot()
+            reads[0] += 1
+            time.sleep(args.reader_interval)
+    readers = [threading.Thread(target=reader, daemon=True) for _ in range(args.readers)]
+    for thread in readers:
+        thread.start()
+
+    stats = simulator.run(args.duration)
+    stopping.set()
+    for thread in readers:
+        thread.join()
+
+    stats.update({
+        "layout": args.layout,
+        "phase_changes": len(phase_change_times),
+        "phase_changes_per_second": len(phase_change_times) / stats["wall_seconds"],
+        "phase_change_ms": percentiles([seconds * 1000 for seconds in phase_change_times]),
+        "emergency_preemptions": preemptions[0],
+        "events_published": app.traffic_events.last_id,
+        "snapshot_reads": reads[0],
+        "lock": lock.get_stats()
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Signal control scale test on synthetic traffic")
+    parser.add_argument("--intersections", type=int, nargs="+", default=[300],
+                        help="Virtual intersections (several values run one simulation each)")
+    parser.add_argument("--layout", choices=["corridor", "grid"], default="corridor")
+    parser.add_argument("--duration", type=float, default=3600, help="Simulated seconds")
+    parser.add_argument("--detection-interval", type=float, default=0.5,
+                        help="Simulated seconds between detection results per intersection")
+    parser.add_argument("--threads", type=int, default=4, help="Threads applying detection results")
+    parser.add_argument("--readers", type=int, default=0, help="Threads polling the traffic snapshot")
+    parser.add_argument("--reader-interval", type=float, default=0.01, help="Wall seconds between polls")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--write-config", default=None,
+                        help="Only write the intersections config to this file (for app.py --simulate)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.write_config:
+        with open(args.write_config, "w") as f:
+            json.dump(make_intersections_config(args.intersections[0], args.layout), f, indent=2)
+        print(f"Wrote {args.intersections[0]} intersections to {args.write_config}", file=sys.stderr)
+        return
+
+    if len(args.intersections) == 1:
+        # The backend prints as it works; keep stdout for the report
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            report = run_simulation(args)
+        finally:
+            sys.stdout = stdout
+    else:
+        report = {"runs": []}
+        for count in args.intersections:
+            print(f"Simulating {count} intersections...", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), "--intersections", str(count)]
+            for option in ("layout", "duration", "detection_interval", "threads", "readers", "reader_interval", "seed"):
+                command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+            result = json.loads(subprocess.check_output(command, cwd=BACKEND_DIR))
+            report["runs"].append(result)
+            print(f"{count}: {result['results_per_second']:.0f} results/s, "
+                  f"apply p99 {result['apply_ms']['p99']:.2f} ms, "
+                  f"lock contended {result['lock']['contended_rate']:.1%}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+
+"""
+Load test for the backend HTTP server.
+
+Opens many concurrent MJPEG viewers plus JSON API pollers against a running
+backend and reports API latency percentiles, delivered stream frame rates and
+the server's thread count. Run it once against each server mode and compare:
+
+    python app.py --server flask      # terminal 1
+    python benchmarks/stream_load_test.py --label flask --streams 200 --output flask.json
+
+    python app.py --server asgi       # terminal 1
+    python benchmarks/stream_load_test.py --label asgi --streams 200 --output asgi.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlparse
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Nearest-rank percentiles of a list of numbers
+    """
+    if not values:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        result[f"p{p}"] = ordered[index]
+    result["max"] = ordered[-1]
+    return result
+
+
+async def http_get(host, port, path, timeout=10.0):
+    """
+    Minimal HTTP/1.1 GET returning (status, body)
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    if b"transfer-encoding: chunked" in head.lower():
+        body = decode_chunked(body)
+    return status, body
+
+
+def decode_chunked(body):
+    decoded = b""
+    while body:
+        size_line, _, rest = body.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        decoded += rest[:size]
+        body = rest[size + 2:]
+    return decoded
+
+
+async def stream_client(host, port, path, deadline, results):
+    """
+    Hold one MJPEG stream open until the deadline, counting frames received
+    """
+    start = time.time()
+    frames = 0
+    first_frame = None
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        tail = b""
+        while time.time() < deadline:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), max(0.01, deadline - time.time()))
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data = tail + chunk
+            count = data.count(b"--frame")
+            if count and first_frame is None:
+                first_frame = time.time() - start
+            frames += count
+            tail = data[-8:]
+        writer.close()
+    except OSError as e:
+        results["errors"].append(str(e))
+    duration = max(0.001, time.time() - start)
+    results["stream_fps"].append(frames / duration)
+    results["frames"] += frames
+    if first_frame is not None:
+        results["first_frame_ms"].append(first_frame * 1000)
+
+
+async def api_client(host, port, path, deadline, interval, results):
+    """
+    Poll a JSON route until the deadline, recording each request's latency
+    """
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            status, _ = await http_get(host, port, path)
+            if status != 200:
+                results["errors"].append(f"HTTP {status} from {path}")
+            results["api_latency_ms"].append((time.time() - start) * 1000)
+        except (OSError, asyncio.TimeoutError) as e:
+            results["errors"].append(str(e) or type(e).__name__)
+        await asyncio.sleep(max(0, interval - (time.time() - start)))
+
+
+async def thread_sampler(host, port, deadline, results):
+    """
+    Sample the server's thread count from /api/stream_status once a second
+    """
+    while time.time() < deadline:
+        try:
+            status, body = await http_get(host, port, "/api/stream_status")
+            if status == 200:
+                results["server_threads"].append(json.loads(body)["server_threads"])
+        except (OSError, asyncio.TimeoutError, ValueError, KeyError):
+            pass
+        await asyncio.sleep(1.0)
+
+
+async def run_load_test(args):
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    stream_path = f"/api/video_feed/{args.intersection}?fps={args.fps}"
+    if args.profile:
+        stream_path += f"&profile={args.profile}"
+
+    results = {
+        "stream_fps": [],
+        "first_frame_ms": [],
+        "frames": 0,
+        "api_latency_ms": [],
+        "server_threads": [],
+        "errors": []
+    }
+    deadline = time.time() + args.duration
+
+    tasks = [stream_client(host, port, stream_path, deadline, results) for _ in range(args.streams)]
+    tasks += [api_client(host, port, "/api/traffic", deadline, args.api_interval, results)
+              for _ in range(args.api_clients)]
+    tasks.append(thread_sampler(host, port, deadline, results))
+    await asyncio.gather(*tasks)
+
+    threads = results["server_threads"]
+    return {
+        "label": args.label,
+        "url": args.url,
+        "duration": args.duration,
+        "stream_clients": args.streams,
+        "api_clients": args.api_clients,
+        "frames_received": results["frames"],
+        "stream_fps_per_client": percentiles(results["stream_fps"], (5, 50, 95)),
+        "first_frame_ms": percentiles(results["first_frame_ms"]),
+        "api_requests": len(results["api_latency_ms"]),
+        "api_latency_ms": percentiles(results["api_latency_ms"]),
+        "server_threads": {
+            "max": max(threads) if threads else None,
+            "mean": sum(threads) / len(threads) if threads else None
+        },
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent stream and API load test")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--label", default="server", help="Name for this run in the report")
+    parser.add_argument("--streams", type=int, default=50, help="Concurrent MJPEG viewers")
+    parser.add_argument("--api-clients", type=int, default=20, help="Concurrent /api/traffic pollers")
+    parser.add_argument("--api-interval", type=float, default=0.5, help="Seconds between polls per client")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--intersection", default="int-001")
+    parser.add_argument("--fps", type=float, default=5)
+    parser.add_argument("--profile", default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
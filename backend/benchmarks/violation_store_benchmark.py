@@ -0,0 +1,151 @@
+
+"""
+Benchmark for the violation stores.
+
+Inserts synthetic violations through each store's insert_many in writer-sized
+batches, then times the queries the dashboard makes: the newest page, filtered
+pages, a time-range page and walking deep into the history with cursors.
+MongoDB is included when a server is reachable; it uses a scratch database
+that is dropped afterwards.
+
+    python benchmarks/violation_store_benchmark.py --count 200000 --output stores.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_load_test import percentiles
+from violations import MongoViolationStore, SQLiteViolationStore
+
+LOCATIONS = ["Main Street Intersection", "Park Avenue Intersection", "Central Square", "Harbor Road"]
+TYPES = ["red_light", "speeding", "no_helmet", "excess_passengers"]
+
+
+def make_violations(count, days, seed=42):
+    """
+    count synthetic violations spread evenly over the last `days` days, oldest first
+    """
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=days)
+    step = timedelta(days=days) / count
+    plates = [f"KA{rng.randint(10, 99)}AB{rng.randint(1000, 9999)}" for _ in range(max(1, count // 50))]
+    return [{
+        "_id": ObjectId(),
+        "vehicleNumber": rng.choice(plates),
+        "type": rng.choice(TYPES),
+        "timestamp": (start + step * i).isoformat(),
+        "location": rng.choice(LOCATIONS),
+        "details": "Synthetic violation for benchmarking",
+        "imageUrl": None
+    } for i in range(count)]
+
+
+def time_queries(store, filters, repeats, **kwargs):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        store.query(filters, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def benchmark_store(store, documents, batch_size, repeats, page_size, deep_pages):
+    store.ensure_indexes()
+
+    start = time.perf_counter()
+    for offset in range(0, len(documents), batch_size):
+        store.insert_many([dict(document) for document in documents[offset:offset + batch_size]], ordered=False)
+    insert_seconds = time.perf_counter() - start
+
+    sample = documents[len(documents) // 2]
+    recent = documents[-len(documents) // 10]["timestamp"]
+    queries = {
+        "newest_page": time_queries(store, {}, repeats, limit=page_size),
+        "by_location": time_queries(store, {"location": sample["location"]}, repeats, limit=page_size),
+        "by_plate": time_queries(store, {"plate": sample["vehicleNumber"]}, repeats, limit=page_size),
+        "by_type_since": time_queries(store, {"type": sample["type"], "since": recent}, repeats, limit=page_size),
+        "projected_page": time_queries(store, {}, repeats, limit=page_size, fields=["vehicleNumber", "type"])
+    }
+
+    # Page latency should not grow with depth under keyset pagination
+    page_latencies = []
+    cursor = None
+    for _ in range(deep_pages):
+        page_start = time.perf_counter()
+        _, cursor = store.query({}, cursor=cursor, limit=page_size)
+        page_latencies.append((time.perf_counter() - page_start) * 1000)
+        if cursor is None:
+            break
+    queries["first_10_pages"] = percentiles(page_latencies[:10])
+    queries["last_10_pages"] = percentiles(page_latencies[-10:])
+
+    return {
+        "inserted": len(documents),
+        "insert_seconds": insert_seconds,
+        "inserts_per_second": len(documents) / insert_seconds if insert_seconds else None,
+        "pages_walked": len(page_latencies),
+        "query_ms": queries
+    }
+
+
+def open_mongo(url):
+    try:
+        import pymongo
+        client = pymongo.MongoClient(url, serverSelectionTimeoutMS=2000)
+        client.server_info()
+        return client
+    except Exception as e:
+        print(f"Skipping MongoDB: {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Violation store insert and query benchmark")
+    parser.add_argument("--count", type=int, default=100000, help="Violations to insert")
+    parser.add_argument("--days", type=int, default=60, help="Span of the synthetic timestamps")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents per insert_many")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--deep-pages", type=int, default=200, help="Pages to walk with cursors")
+    parser.add_argument("--repeats", type=int, default=50, help="Runs of each query")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017/")
+    parser.add_argument("--skip-mongo", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    documents = make_violations(args.count, args.days)
+    report = {"count": args.count, "batch_size": args.batch_size, "page_size": args.page_size, "stores": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteViolationStore(os.path.join(directory, "violations.db"), retention_days=args.days + 30)
+        report["stores"]["sqlite"] = benchmark_store(
+            store, documents, args.batch_size, args.repeats, args.page_size, args.deep_pages)
+
+    client = None if args.skip_mongo else open_mongo(args.mongo_url)
+    if client is not None:
+        database_name = "traffic_management_benchmark"
+        client.drop_database(database_name)
+        try:
+            store = MongoViolationStore(client[database_name]["violations"])
+            report["stores"]["mongodb"] = benchmark_store(
+                store, documents, args.batch_size, args.repeats, args.page_size, args.deep_pages)
+        finally:
+            client.drop_database(database_name)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+
+import collections
+import threading
+import time
+
+
+class AdaptiveController:
+    """
+    Closed-loop tuning of one camera's detection load. Every detector pass
+    reports its latency (frame capture to result), the lag before inference
+    started, and how long the pass kept a worker busy. The smoothed values
+    are checked against a latency target and a busy budget (the share of
+    wall time this camera may spend in detection). At most once per cooldown
+    the controller moves the network input size or the frame skip one step:
+
+    - latency over target: smaller input size, else more frame skipping
+    - busy over budget: more frame skipping, else smaller input size
+    - comfortably under both: less skipping first, then a larger input
+      size if the predicted latency still meets the target
+    """
+    def __init__(self, input_sizes, input_size, skip_frames, min_skip_frames, max_skip_frames,
+                 target_latency, busy_budget, tolerance=0.2, smoothing=0.2, cooldown=2.0, history=20):
+        self.input_sizes = sorted(input_sizes)
+        self.size_index = min(range(len(self.input_sizes)), key=lambda i: abs(self.input_sizes[i] - input_size))
+        self.min_skip_frames = min_skip_frames
+        self.max_skip_frames = max_skip_frames
+        self.skip_frames = min(max(skip_frames, min_skip_frames), max_skip_frames)
+        self.target_latency = target_latency
+        self.busy_budget = busy_budget
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.latency = None
+        self.lag = None
+        self.inference_time = None
+        self.interval = None
+        self.last_record = None
+        self.last_change = 0.0
+        self.adjustments = 0
+        self.decisions = collections.deque(maxlen=history)
+
+    @property
+    def input_size(self):
+        return self.input_sizes[self.size_index]
+
+    def _smooth(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def record(self, latency, lag, inference_time, now=None):
+        """
+        Feed the measurements of one detector pass; returns the decision
+        made (a dict), or None if the settings were left alone
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self.latency = self._smooth(self.latency, latency)
+            self.lag = self._smooth(self.lag, lag)
+            self.inference_time = self._smooth(self.inference_time, inference_time)
+            if self.last_record is not None:
+                self.interval = self._smooth(self.interval, now - self.last_record)
+            self.last_record = now
+
+            if self.interval is None or now - self.last_change < self.cooldown:
+                return None
+            return self._decide(now)
+
+    def _busy(self):
+        return min(1.0, self.inference_time / self.interval) if self.interval else 0.0
+
+    def _decide(self, now):
+        """
+        Pick at most one adjustment (caller holds the lock)
+        """
+        high, low = 1 + self.tolerance, 1 - self.tolerance
+        busy = self._busy()
+        larger_size = self.input_sizes[self.size_index + 1] if self.size_index + 1 < len(self.input_sizes) else None
+
+        if self.latency > self.target_latency * high:
+            if self.size_index > 0:
+                return self._apply(now, "latency above target", size_index=self.size_index - 1)
+            if self.skip_frames < self.max_skip_frames:
+                return self._apply(now, "latency above target", skip_frames=self.skip_frames + 1)
+        elif busy > self.busy_budget * high:
+            if self.skip_frames < self.max_skip_frames:
+                return self._apply(now, "busy above budget", skip_frames=self.skip_frames + 1)
+            if self.size_index > 0:
+                return self._apply(now, "busy above budget", size_index=self.size_index - 1)
+        elif self.latency < self.target_latency * low and busy < self.busy_budget * low:
+            # Fewer skipped frames raise the detection rate, and the busy share with it
+            if self.skip_frames > self.min_skip_frames and \
+                    busy * self.skip_frames / (self.skip_frames - 1) < self.busy_budget:
+                return self._apply(now, "headroom", skip_frames=self.skip_frames - 1)
+            # Inference cost grows with the input area
+            if larger_size is not None and \
+                    self.latency * (larger_size / self.input_size) ** 2 < self.target_latency:
+                return self._apply(now, "headroom", size_index=self.size_index + 1)
+        return None
+
+    def _apply(self, now, reason, size_index=None, skip_frames=None):
+        decision = {
+            "time": now,
+            "reason": reason,
+            "input_size": [self.input_size, self.input_size],
+            "skip_frames": [self.skip_frames, self.skip_frames],
+            "latency_ms": self.latency * 1000,
+            "busy": self._busy()
+        }
+        if size_index is not None:
+            self.size_index = size_index
+        if skip_frames is not None:
+            self.skip_frames = skip_frames
+        decision["input_size"][1] = self.input_size
+        decision["skip_frames"][1] = self.skip_frames
+        self.last_change = now
+        self.adjustments += 1
+        self.decisions.append(decision)
+        return decision
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "input_size": self.input_size,
+                "skip_frames": self.skip_frames,
+                "latency_ms": self.latency * 1000 if self.latency is not None else None,
+                "lag_ms": self.lag * 1000 if self.lag is not None else None,
+                "inference_ms": self.inference_time * 1000 if self.inference_time is not None else None,
+                "busy": self._busy() if self.inference_time is not None else None,
+                "adjustments": self.adjustments,
+                "last_reason": self.decisions[-1]["reason"] if self.decisions else "",
+                "recent_decisions": list(self.decisions)
+            }
@@ -0,0 +1,51 @@
+
+import cv2
+import numpy as np
+
+# HSV ranges of the red and blue lights on ambulances and police cars
+EMERGENCY_COLOR_RANGES = {
+    "red": (np.array([0, 120, 70], dtype=np.uint8), np.array([10, 255, 255], dtype=np.uint8)),
+    "blue": (np.array([110, 50, 50], dtype=np.uint8), np.array([130, 255, 255], dtype=np.uint8))
+}
+
+
+class EmergencyColorMap:
+    """
+    Emergency light colours of one frame. The frame is converted to HSV once
+    and each colour mask is turned into a summed-area table, so the share of
+    red or blue pixels in any box takes four lookups, however many vehicles
+    are checked. scale < 1 builds the map from a downscaled frame; boxes are
+    always given in full-frame pixels.
+    """
+    def __init__(self, frame, scale=1.0, color_ranges=EMERGENCY_COLOR_RANGES):
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        self.scale = scale
+        self.height, self.width = frame.shape[:2]
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        self.tables = {
+            # Masks are 0/255; float64 sums stay exact at any frame size
+            color: cv2.integral(cv2.inRange(hsv, lower, upper), sdepth=cv2.CV_64F)
+            for color, (lower, upper) in color_ranges.items()
+        }
+
+    def coverage(self, color, box):
+        """
+        Percentage of the box's pixels that fall in the colour's range
+        """
+        x, y, w, h = box
+        x1 = min(max(int(x * self.scale), 0), self.width)
+        y1 = min(max(int(y * self.scale), 0), self.height)
+        x2 = min(max(int(round((x + w) * self.scale)), 0), self.width)
+        y2 = min(max(int(round((y + h) * self.scale)), 0), self.height)
+        if x2 <= x1 or y2 <= y1:
+            return 0.0
+        table = self.tables[color]
+        total = table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+        return total / 255 / ((x2 - x1) * (y2 - y1)) * 100
+
+    def has_emergency_lights(self, box, min_percent):
+        """
+        True if more than min_percent of the box is any one emergency colour
+        """
+        return any(self.coverage(color, box) > min_percent for color in self.tables)
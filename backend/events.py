@@ -0,0 +1,187 @@
+
+import asyncio
+import collections
+import json
+import threading
+import uuid
+from datetime import datetime
+
+
+class EventBus:
+    """
+    Ordered stream of small traffic state deltas (signal changes, vehicle
+    counts, emergencies, auto-mode toggles). Recent events are kept in a
+    bounded history so a reconnecting client can resume from the last event
+    ID it saw instead of re-fetching everything.
+
+    Event IDs count from 1 in every process, so clients get them as resume
+    tokens "<epoch>:<id>", where the epoch is unique to this bus. A token
+    from another epoch (e.g. from before a restart) is never resumed from.
+    """
+    def __init__(self, history_size=1000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.history = collections.deque(maxlen=history_size)
+        self.last_id = 0
+        self.condition = threading.Condition()
+        self.async_waiters = []  # (event loop, future) pairs from async subscribers
+
+    def publish(self, event_type, intersection_id, **data):
+        """
+        Record a delta event and wake all subscribers. Returns the event ID.
+        """
+        with self.condition:
+            self.last_id += 1
+            event = {
+                "id": self.last_id,
+                "type": event_type,
+                "intersectionId": intersection_id,
+                "timestamp": datetime.now().isoformat()
+            }
+            event.update(data)
+            self.history.append(event)
+            self.condition.notify_all()
+            waiters, self.async_waiters = self.async_waiters, []
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future)
+            except RuntimeError:
+                pass  # The subscriber's event loop has already shut down
+        return event["id"]
+
+    def token(self, event_id):
+        """
+        Resume token for an event ID of this bus
+        """
+        return f"{self.epoch}:{event_id}"
+
+    def events_since(self, last_id):
+        """
+        Return (events newer than last_id, complete). complete is False when
+        some of those events have already fallen out of the history.
+        """
+        with self.condition:
+            return self._events_since(last_id)
+
+    def _events_since(self, last_id):
+        if last_id > self.last_id:
+            return [], False  # Not an ID this bus has issued
+        if last_id == self.last_id:
+            return [], True
+        oldest_id = self.history[0]["id"] if self.history else self.last_id + 1
+        events = [event for event in self.history if event["id"] > last_id]
+        return events, last_id >= oldest_id - 1
+
+    def wait_for_events(self, last_id, timeout=None):
+        """
+        Block until there are events newer than last_id; returns (events, complete)
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id != last_id, timeout)
+            return self._events_since(last_id)
+
+    async def wait_for_events_async(self, last_id, timeout=None):
+        """
+        Async counterpart of wait_for_events for event-loop servers
+        """
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if self.last_id != last_id:
+                return self._events_since(last_id)
+            future = loop.create_future()
+            self.async_waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Not resolved by a publish (timed out or cancelled): stop tracking it
+            with self.condition:
+                if (loop, future) in self.async_waiters:
+                    self.async_waiters.remove((loop, future))
+        return self.events_since(last_id)
+
+
+class EventStreamSession:
+    """
+    One subscriber's view of the bus. Starts with a full snapshot unless the
+    resume token can be served from history, then turns batches of events
+    into SSE text. snapshot() must return (last_event_id, data) atomically.
+    resume_token is an (epoch, event ID) pair from parse_resume_token().
+    """
+    def __init__(self, bus, snapshot, resume_token=None, keepalive_interval=15):
+        self.bus = bus
+        self.snapshot = snapshot
+        self.last_id = None
+        if resume_token is not None and resume_token[0] == bus.epoch:
+            self.last_id = resume_token[1]
+        self.keepalive_interval = keepalive_interval
+
+    def start(self):
+        """
+        Return the opening messages: missed events, or a snapshot
+        """
+        message = "retry: 2000\n\n"
+        if self.last_id is not None:
+            events, complete = self.bus.events_since(self.last_id)
+            if complete:
+                return message + self._format(events)
+        return message + self._send_snapshot()
+
+    def next_messages(self):
+        """
+        Block until there is something to send; returns SSE text (a keepalive
+        comment if nothing happened within the keepalive interval)
+        """
+        return self._deliver(*self.bus.wait_for_events(self.last_id, self.keepalive_interval))
+
+    async def next_messages_async(self):
+        return self._deliver(*await self.bus.wait_for_events_async(self.last_id, self.keepalive_interval))
+
+    def _deliver(self, events, complete):
+        if not complete:
+            return self._send_snapshot()
+        if not events:
+            return ": keepalive\n\n"
+        return self._format(events)
+
+    def _send_snapshot(self):
+        self.last_id, data = self.snapshot()
+        return format_sse("snapshot", data, self.bus.token(self.last_id))
+
+    def _format(self, events):
+        if events:
+            self.last_id = events[-1]["id"]
+        messages = []
+        for event in events:
+            token = self.bus.token(event["id"])
+            messages.append(format_sse(event["type"], dict(event, id=token), token))
+        return "".join(messages)
+
+
+def format_sse(event_type, data, event_id=None):
+    """
+    Encode one Server-Sent Events message
+    """
+    message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    message += f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+    return message
+
+
+def parse_resume_token(value):
+    """
+    Parse a Last-Event-ID header or lastEventId query value ("<epoch>:<id>")
+    into (epoch, event ID); None if absent or invalid
+    """
+    epoch, _, event_id = (value or "").partition(":")
+    try:
+        return (epoch, int(event_id)) if epoch and event_id else None
+    except ValueError:
+        return None
+
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,218 @@
+
+import cv2
+import collections
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class EvidenceStore:
+    """
+    Content-addressed JPEG store on local disk. Files are named by the
+    SHA-256 of their bytes, so identical images are stored once and a file
+    never changes after it is written. Total size is capped; the least
+    recently stored or re-stored images are evicted first.
+    """
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.files = collections.OrderedDict()  # digest -> size, oldest first
+        self.total_bytes = 0
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """
+        Rebuild the index from disk, oldest file first
+        """
+        entries = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                digest, extension = os.path.splitext(name)
+                if extension == ".jpg" and DIGEST_PATTERN.match(digest):
+                    stat = os.stat(os.path.join(directory, name))
+                    entries.append((stat.st_mtime, digest, stat.st_size))
+        for _, digest, size in sorted(entries):
+            self.files[digest] = size
+            self.total_bytes += size
+
+    def path_for(self, digest):
+        """
+        File path for a digest, or None if the digest is malformed
+        """
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        return os.path.join(self.root, digest[:2], f"{digest}.jpg")
+
+    def contains(self, digest):
+        with self.lock:
+            return digest in self.files
+
+    def put(self, data):
+        """
+        Store JPEG bytes and return their digest
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+
+        with self.lock:
+            if digest in self.files:
+                # Already stored: refresh its place in the eviction order
+                self.files.move_to_end(digest)
+                os.utime(path)
+                return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)  # Readers never see a partial file
+
+        with self.lock:
+            if digest not in self.files:
+                self.files[digest] = len(data)
+                self.total_bytes += len(data)
+            self._evict()
+        return digest
+
+    def _evict(self):
+        """
+        Remove the oldest files until the store is under its size limit
+        (caller holds the lock)
+        """
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            digest, size = self.files.popitem(last=False)
+            self.total_bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(self.path_for(digest))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "root": self.root,
+                "files": len(self.files),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted": self.evicted
+            }
+
+
+class EvidenceEncoder:
+    """
+    Background pool that turns a frame and the boxes of its violating
+    vehicles into stored JPEG evidence. The full frame is encoded and stored
+    once per submission and its digest shared by every violation in it; each
+    violation only adds its own vehicle crop. Callers hand over references to
+    frames that are no longer modified; cropping, encoding and disk writes
+    all happen on the pool's threads. When the pool is backed up, new
+    captures are dropped rather than making the caller wait.
+    """
+    def __init__(self, store, workers=2, max_pending=64, frame_quality=85, roi_quality=95, roi_padding=0.15):
+        self.store = store
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.frame_quality = frame_quality
+        self.roi_quality = roi_quality
+        self.roi_padding = roi_padding
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "encoded": 0,
+            "frames_encoded": 0,
+            "dropped": 0,
+            "errors": 0,
+            "encode_time_total": 0.0
+        }
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        print(f"Started evidence encoder ({len(self.threads)} workers)")
+        return self
+
+    def submit(self, frame, captures):
+        """
+        Queue the captures of one frame as (box, callback) pairs; each
+        callback(evidence) runs on a pool thread with a dict of digests
+        ({"vehicle": ..., "frame": ...}), or None if encoding failed.
+        Returns False if the captures were dropped.
+        """
+        try:
+            self.queue.put_nowait((frame, captures))
+        except queue.Full:
+            self._count("dropped", len(captures))
+            return False
+        self._count("submitted", len(captures))
+        return True
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _crop(self, frame, box):
+        """
+        Vehicle region with some surrounding context, clipped to the frame
+        """
+        x, y, w, h = box
+        pad_x, pad_y = int(w * self.roi_padding), int(h * self.roi_padding)
+        x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+        x2, y2 = min(frame.shape[1], x + w + pad_x), min(frame.shape[0], y + h + pad_y)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return frame[y1:y2, x1:x2]
+
+    def _encode(self, image, quality):
+        ret, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ret:
+            raise ValueError("JPEG encoding failed")
+        return self.store.put(buffer.tobytes())
+
+    def _run(self):
+        while True:
+            frame, captures = self.queue.get()
+            start_time = time.time()
+            frame_digest = None
+            try:
+                frame_digest = self._encode(frame, self.frame_quality)
+                self._count("frames_encoded")
+            except Exception as e:
+                self._count("errors")
+                print(f"Error capturing violation evidence: {e}")
+
+            for box, callback in captures:
+                evidence = None
+                if frame_digest is not None:
+                    try:
+                        evidence = {"frame": frame_digest}
+                        roi = self._crop(frame, box) if box is not None else None
+                        if roi is not None:
+                            evidence["vehicle"] = self._encode(roi, self.roi_quality)
+                        self._count("encoded")
+                    except Exception as e:
+                        evidence = None
+                        self._count("errors")
+                        print(f"Error capturing violation evidence: {e}")
+
+                try:
+                    callback(evidence)
+                except Exception as e:
+                    print(f"Error handling violation evidence: {e}")
+            self._count("encode_time_total", time.time() - start_time)
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        encode_time_total = stats.pop("encode_time_total")
+        stats["avg_encode_ms"] = encode_time_total / stats["encoded"] * 1000 if stats["encoded"] else None
+        stats["pending"] = self.queue.qsize()
+        return stats
@@ -0,0 +1,173 @@
+
+import threading
+import time
+
+import numpy as np
+
+from registry import SIGNAL_CODES, SIGNAL_NAMES
+
+# One recorded vehicle count or signal change
+RAW_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("vehicle_count", "<i4"),
+    ("signal", "i1"),
+    ("signal_changed", "?")
+])
+
+# One rollup bucket; bucket is the bucket's start time divided by its length,
+# so a slot still holding an older bucket is told apart by its number
+ROLLUP_DTYPE = np.dtype([
+    ("bucket", "<i8"),
+    ("samples", "<i4"),
+    ("min", "<i4"),
+    ("max", "<i4"),
+    ("sum", "<i8"),
+    ("signal", "i1"),  # Signal at the end of the bucket
+    ("signal_changes", "<i4")
+])
+
+# Default rollups: name -> (bucket seconds, buckets kept)
+ROLLUPS = {
+    "1s": (1, 3600),  # One hour
+    "1m": (60, 1440),  # One day
+    "1h": (3600, 720)  # 30 days
+}
+
+SIGNAL_LABELS = np.array([SIGNAL_NAMES[code] for code in range(len(SIGNAL_NAMES))] + [None], dtype=object)
+
+
+class TrafficHistory:
+    """
+    Vehicle counts and signal changes of every intersection over time, in
+    fixed-size numpy ring buffers: the last raw_capacity records, and for
+    each rollup a ring of buckets with the min, mean and max count and the
+    signal changes in the bucket. All memory is allocated up front, so its
+    size only depends on the number of intersections and the capacities.
+
+    Recording writes one raw slot and adds to the open bucket of each
+    rollup, which is written to its ring slot once per bucket. A range query
+    gathers the ring slots that cover the range in one indexing operation
+    and keeps those whose time (or bucket number) falls inside it.
+    """
+    def __init__(self, initial_signals, raw_capacity=3600, rollups=ROLLUPS):
+        self.ids = list(initial_signals)
+        self.index = {intersection_id: index for index, intersection_id in enumerate(self.ids)}
+        self.lock = threading.Lock()
+        self.raw = np.zeros((len(self.ids), raw_capacity), RAW_DTYPE)
+        self.written = [0] * len(self.ids)  # Records ever written per intersection
+        self.rollups = {}
+        for name, (seconds, capacity) in rollups.items():
+            buckets = np.zeros((len(self.ids), capacity), ROLLUP_DTYPE)
+            buckets["bucket"] = -1
+            self.rollups[name] = (seconds, buckets)
+        # The bucket each rollup is filling, per intersection, as ROLLUP_DTYPE
+        # field lists; it is written to its ring slot when the next bucket
+        # starts or a query needs it
+        self.open_buckets = {name: [[-1, 0, 0, 0, 0, -1, 0] for _ in self.ids] for name in self.rollups}
+        self.last_count = [0] * len(self.ids)
+        self.last_signal = [SIGNAL_CODES.get(initial_signals[intersection_id], -1) for intersection_id in self.ids]
+
+    @property
+    def resolutions(self):
+        return ["raw"] + list(self.rollups)
+
+    def record_count(self, intersection_id, vehicle_count, now=None):
+        """
+        Record a detection result's vehicle count
+        """
+        index = self.index[intersection_id]
+        with self.lock:
+            self.last_count[index] = vehicle_count
+            self._record(index, time.time() if now is None else now, True, False)
+
+    def record_signal(self, intersection_id, status, now=None):
+        """
+        Record a signal change; buckets without a count of their own start
+        from the last count
+        """
+        index = self.index[intersection_id]
+        with self.lock:
+            self.last_signal[index] = SIGNAL_CODES[status]
+            self._record(index, time.time() if now is None else now, False, True)
+
+    def _record(self, index, now, counted, changed):
+        count, signal = self.last_count[index], self.last_signal[index]
+        raw = self.raw[index]
+        raw[self.written[index] % len(raw)] = (now, count, signal, changed)
+        self.written[index] += 1
+
+        for name, (seconds, buckets) in self.rollups.items():
+            bucket = int(now // seconds)
+            current = self.open_buckets[name][index]
+            if current[0] != bucket:
+                self._flush(buckets, index, current)
+                current[:] = [bucket, 1, count, count, count, signal, int(changed)]
+                continue
+            if counted:
+                current[1] += 1
+                current[2] = min(current[2], count)
+                current[3] = max(current[3], count)
+                current[4] += count
+            current[5] = signal
+            current[6] += changed
+
+    @staticmethod
+    def _flush(buckets, index, current):
+        if current[0] >= 0:
+            buckets[index, current[0] % buckets.shape[1]] = tuple(current)
+
+    def query(self, intersection_id, resolution, since, until):
+        """
+        Records ("raw") or rollup buckets of one intersection from since to
+        until (epoch seconds), oldest first, as columns: time (the record's
+        time or the bucket's start), vehicle count or min/mean/max, signal
+        and signal changes. Ranges older than a ring's capacity come back
+        empty. Raises KeyError for an unknown intersection or resolution.
+        """
+        index = self.index[intersection_id]
+        if resolution == "raw":
+            with self.lock:
+                written = self.written[index]
+                capacity = self.raw.shape[1]
+                # Oldest first: the slots after the write position, then the ones before it
+                start = written % capacity if written > capacity else 0
+                records = np.concatenate((self.raw[index, start:written], self.raw[index, :start]))
+            records = records[(records["time"] >= since) & (records["time"] <= until)]
+            return {
+                "time": records["time"].tolist(),
+                "vehicleCount": records["vehicle_count"].tolist(),
+                "signal": SIGNAL_LABELS[records["signal"]].tolist(),
+                "signalChanged": records["signal_changed"].tolist()
+            }
+
+        seconds, buckets = self.rollups[resolution]
+        capacity = buckets.shape[1]
+        last = int(until // seconds)
+        first = max(int(since // seconds), last - capacity + 1)
+        numbers = np.arange(first, last + 1, dtype=np.int64)
+        with self.lock:
+            self._flush(buckets, index, self.open_buckets[resolution][index])
+            rows = buckets[index, numbers % capacity]
+        rows = rows[rows["bucket"] == numbers]
+        return {
+            "time": (rows["bucket"] * seconds).tolist(),
+            "min": rows["min"].tolist(),
+            "mean": np.round(rows["sum"] / rows["samples"], 2).tolist(),
+            "max": rows["max"].tolist(),
+            "samples": rows["samples"].tolist(),
+            "signal": SIGNAL_LABELS[rows["signal"]].tolist(),
+            "signalChanges": rows["signal_changes"].tolist()
+        }
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "intersections": len(self.ids),
+                "records": sum(self.written),
+                "bytes": self.raw.nbytes + sum(buckets.nbytes for _, buckets in self.rollups.values()),
+                "raw_capacity": self.raw.shape[1],
+                "rollups": {
+                    name: {"seconds": seconds, "buckets": buckets.shape[1], "retention_seconds": seconds * buckets.shape[1]}
+                    for name, (seconds, buckets) in self.rollups.items()
+                }
+            }
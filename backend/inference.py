@@ -0,0 +1,249 @@
+
+import cv2
+import numpy as np
+import os
+import queue
+import threading
+import time
+
+
+def load_yolo_model(yolo_dir, config_name='yolov4.cfg', weights_name='yolov4.weights', classes_name='coco.names',
+                    prefer_opencl=True):
+    """
+    Load a Darknet YOLO model and return (net, classes, output_layers)
+    """
+    config_path = os.path.join(yolo_dir, config_name)
+    weights_path = os.path.join(yolo_dir, weights_name)
+    classes_path = os.path.join(yolo_dir, classes_name)
+
+    if not os.path.exists(config_path) or not os.path.exists(weights_path) or not os.path.exists(classes_path):
+        print(f"YOLO files not found at {yolo_dir}. Please download them as mentioned in README.md")
+        raise FileNotFoundError(f"Required YOLO files not found in {yolo_dir}")
+
+    net = cv2.dnn.readNetFromDarknet(config_path, weights_path)
+    with open(classes_path, "r") as f:
+        classes = [line.strip() for line in f.readlines()]
+
+    # Configure the network to use available hardware acceleration
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
+    try:
+        # Try to use OpenCL acceleration if available
+        if prefer_opencl and cv2.ocl.haveOpenCL():
+            cv2.ocl.setUseOpenCL(True)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+            print("Using OpenCL acceleration")
+        else:
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            print("Using CPU for inference")
+    except:
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        print("Fallback to CPU for inference")
+
+    # Get output layer names
+    layer_names = net.getLayerNames()
+    output_layers = [layer_names[i - 1] for i in np.array(net.getUnconnectedOutLayers()).flatten()]
+
+    return net, classes, output_layers
+
+
+def decode_detections(outputs, width, height, confidence_threshold, nms_threshold, class_ids=None):
+    """
+    Decode raw YOLO output layers into (class_id, confidence, (x, y, w, h)) tuples.
+    All rows are processed as one array and overlapping boxes are merged with NMS.
+    """
+    rows = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs], axis=0)
+    scores = rows[:, 5:]
+    detected_classes = np.argmax(scores, axis=1)
+    confidences = scores[np.arange(len(rows)), detected_classes]
+
+    # Drop low-confidence rows (and unwanted classes) before any box maths
+    mask = confidences > confidence_threshold
+    if class_ids is not None:
+        mask &= np.isin(detected_classes, class_ids)
+    if not mask.any():
+        return []
+
+    rows = rows[mask]
+    detected_classes = detected_classes[mask]
+    confidences = confidences[mask]
+
+    # Convert normalized centre/size boxes to pixel top-left/size boxes
+    center_x = (rows[:, 0] * width).astype(int)
+    center_y = (rows[:, 1] * height).astype(int)
+    w = (rows[:, 2] * width).astype(int)
+    h = (rows[:, 3] * height).astype(int)
+    x = (center_x - w / 2).astype(int)
+    y = (center_y - h / 2).astype(int)
+    boxes = np.stack([x, y, w, h], axis=1)
+
+    keep = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), confidence_threshold, nms_threshold)
+    keep = np.array(keep, dtype=int).reshape(-1)
+
+    return [
+        (int(detected_classes[i]), float(confidences[i]), tuple(int(v) for v in boxes[i]))
+        for i in keep
+    ]
+
+
+class InferenceRequest:
+    """
+    A batch of images submitted by one camera, completed by the engine thread
+    """
+    def __init__(self, intersection_id, images, input_size):
+        self.intersection_id = intersection_id
+        self.images = images
+        self.input_size = input_size
+        self.outputs = None
+        self.timings = None  # Seconds spent per stage on the batch this request was part of
+        self.error = None
+        self.done = threading.Event()
+
+    def result(self, timeout=None):
+        """
+        Wait for the forward pass and return one list of output-layer arrays per image
+        """
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Inference for {self.intersection_id} timed out")
+        if self.error is not None:
+            raise self.error
+        return self.outputs
+
+
+class InferenceEngine:
+    """
+    Owns the single copy of one detection model (see models.py). Camera
+    threads submit frames, and a worker thread batches everything that is
+    pending into one forward call.
+    """
+    def __init__(self, model, input_size=416, max_batch_size=8, max_wait=0.005):
+        self.model = model
+        self.classes = model.classes
+        self.input_size = model.input_size_for(input_size)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.stats = {
+            "batches": 0,
+            "images": 0,
+            "last_batch_size": 0,
+            "last_forward_time": 0.0,
+            "per_intersection": {}
+        }
+        self.stats_lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the batching worker thread
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            print(f"Started shared inference engine (max batch {self.max_batch_size})")
+        return self
+
+    def is_alive(self):
+        """
+        False once the worker thread has exited; requests left in its queue are never completed
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, intersection_id, images, input_size=None):
+        """
+        Queue one or more images for inference and return an InferenceRequest
+        """
+        request = InferenceRequest(intersection_id, list(images), self.model.input_size_for(input_size or self.input_size))
+        self.requests.put(request)
+        return request
+
+    def infer(self, intersection_id, images, input_size=None, timeout=None):
+        """
+        Submit images and block until their outputs are ready
+        """
+        return self.submit(intersection_id, images, input_size).result(timeout)
+
+    def _collect_batch(self):
+        """
+        Block for the first request, then gather whatever else arrives within max_wait
+        """
+        batch = [self.requests.get()]
+        image_count = len(batch[0].images)
+        deadline = time.time() + self.max_wait
+
+        while image_count < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            image_count += len(request.images)
+
+        return batch
+
+    def _forward(self, requests, input_size):
+        """
+        Run one forward pass over every image in the given requests and route
+        each image's outputs back to the request it came from
+        """
+        images = [image for request in requests for image in request.images]
+
+        start_time = time.time()
+        timings = {}
+        rows = self.model.forward(images, input_size, timings)
+        forward_time = time.time() - start_time
+
+        batch_size = len(images)
+        index = 0
+        for request in requests:
+            request.outputs = [[rows[index + i]] for i in range(len(request.images))]
+            request.timings = timings
+            index += len(request.images)
+
+        with self.stats_lock:
+            self.stats["batches"] += 1
+            self.stats["images"] += batch_size
+            self.stats["last_batch_size"] = batch_size
+            self.stats["last_forward_time"] = forward_time
+            for request in requests:
+                per_intersection = self.stats["per_intersection"].setdefault(request.intersection_id, 0)
+                self.stats["per_intersection"][request.intersection_id] = per_intersection + len(request.images)
+
+    def _run(self):
+        """
+        Worker loop: batch pending requests by input size and complete them
+        """
+        while True:
+            batch = self._collect_batch()
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.input_size, []).append(request)
+
+            for input_size, requests in groups.items():
+                try:
+                    self._forward(requests, input_size)
+                except Exception as e:
+                    print(f"Error in shared inference engine: {e}")
+                    for request in requests:
+                        request.error = e
+                finally:
+                    for request in requests:
+                        request.done.set()
+
+    def get_stats(self):
+        """
+        Return a snapshot of batching statistics
+        """
+        with self.stats_lock:
+            return {
+                "model": self.model.name,
+                "batches": self.stats["batches"],
+                "images": self.stats["images"],
+                "average_batch_size": self.stats["images"] / self.stats["batches"] if self.stats["batches"] else 0,
+                "last_batch_size": self.stats["last_batch_size"],
+                "last_forward_time": self.stats["last_forward_time"],
+                "per_intersection": dict(self.stats["per_intersection"])
+            }
@@ -0,0 +1,176 @@
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Instrumented stages, in pipeline order
+PIPELINE_STAGES = (
+    "capture",  # Reading a frame from the camera
+    "blob",  # Building the network input blob
+    "forward",  # Network forward pass
+    "decode",  # Turning network outputs into boxes
+    "tracking",  # Assigning track IDs
+    "draw",  # Drawing overlays
+    "jpeg_encode",  # Encoding a stream frame
+    "db_write",  # Writing a batch of violations
+    "stream_send"  # Sending one frame to one stream client
+)
+
+# Counters and gauges exported next to the stage histograms: name -> (type, help)
+METRIC_DESCRIPTIONS = {
+    "traffic_frames_dropped_total": ("counter", "Frames overwritten in a pipeline buffer before they were used"),
+    "traffic_camera_reconnects_total": ("counter", "Times a camera was reopened after a failed read"),
+    "traffic_stream_viewers": ("gauge", "Clients currently watching the video stream"),
+    "traffic_last_detection_age_seconds": ("gauge", "Seconds since the last detection result"),
+    "traffic_inference_batches_total": ("counter", "Forward passes run by the shared inference engine"),
+    "traffic_inference_images_total": ("counter", "Frames passed through the shared inference engine")
+}
+
+STAGE_METRIC = "traffic_stage_duration_seconds"
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. counts[i] holds observations up to
+    buckets[i] (and above buckets[i - 1]); the last count is for values
+    above every bucket.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value):
+    if value is None or value != value:
+        return "NaN"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class PipelineMetrics:
+    """
+    Per-stage latency histograms, plus counters and gauges, labelled by
+    intersection, rendered in the Prometheus text exposition format.
+    Observing a value is a bucket lookup under one lock. Counters kept
+    elsewhere (e.g. buffer drop counts) are mirrored in with set() when
+    the metrics are rendered, rather than counted twice.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {}  # (stage, intersection_id) -> Histogram
+        self.values = {}  # (name, sorted label items) -> value
+
+    def observe(self, stage, seconds, intersection_id=None):
+        with self.lock:
+            histogram = self.histograms.get((stage, intersection_id))
+            if histogram is None:
+                histogram = self.histograms[(stage, intersection_id)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, intersection_id=None):
+        """
+        Observe the time spent in a with block
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.time() - start_time, intersection_id)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def get(self, name, **labels):
+        with self.lock:
+            return self.values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def export_histograms(self, intersection_id, stages):
+        """
+        One intersection's histograms as flat {"<stage>_buckets", "<stage>_sum"}
+        values, for copying to another process
+        """
+        values = {}
+        with self.lock:
+            for stage in stages:
+                histogram = self.histograms.get((stage, intersection_id))
+                if histogram is not None:
+                    values[f"{stage}_buckets"] = list(histogram.counts)
+                    values[f"{stage}_sum"] = histogram.sum
+        return values
+
+    def load_histograms(self, intersection_id, stages, values):
+        """
+        Replace one intersection's histograms with values from export_histograms()
+        """
+        with self.lock:
+            for stage in stages:
+                counts = values.get(f"{stage}_buckets")
+                if counts is None or not sum(counts):
+                    continue
+                histogram = self.histograms.get((stage, intersection_id))
+                if histogram is None:
+                    histogram = self.histograms[(stage, intersection_id)] = Histogram(self.buckets)
+                histogram.counts = [int(count) for count in counts]
+                histogram.sum = float(values[f"{stage}_sum"])
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4)
+        """
+        with self.lock:
+            histograms = sorted(((stage, intersection_id or "", histogram.counts[:], histogram.sum)
+                                 for (stage, intersection_id), histogram in self.histograms.items()),
+                                key=lambda item: (item[1], PIPELINE_STAGES.index(item[0])
+                                                  if item[0] in PIPELINE_STAGES else len(PIPELINE_STAGES)))
+            values = sorted(self.values.items())
+
+        lines = [f"# HELP {STAGE_METRIC} Time spent in each pipeline stage",
+                 f"# TYPE {STAGE_METRIC} histogram"]
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for stage, intersection_id, counts, total in histograms:
+            labels = {"intersection": intersection_id, "stage": stage} if intersection_id else {"stage": stage}
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{STAGE_METRIC}_bucket{format_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{STAGE_METRIC}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{STAGE_METRIC}_count{format_labels(labels)} {cumulative}")
+
+        current = None
+        for (name, labels), value in values:
+            if name != current:
+                kind, description = METRIC_DESCRIPTIONS.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                current = name
+            lines.append(f"{name}{format_labels(dict(labels))} {format_value(value)}")
+        return "\n".join(lines) + "\n"
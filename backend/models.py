@@ -0,0 +1,248 @@
+
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from inference import load_yolo_model
+
+# Raw output layouts the backends can map onto Darknet-style rows
+OUTPUT_LAYOUTS = ("darknet", "yolov5", "yolov8")
+
+
+def to_detection_rows(outputs, layout, input_size):
+    """
+    Convert one image's raw output arrays to Darknet-style rows: centre x,
+    centre y, width and height as fractions of the image, objectness, then
+    one confidence per class (already including objectness)
+    """
+    if layout == "darknet":
+        return np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs], axis=0)
+
+    if layout == "yolov5":
+        # (rows, 5 + classes) in input pixels; class scores exclude objectness
+        raw = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs], axis=0)
+        rows = np.empty_like(raw)
+        rows[:, :4] = raw[:, :4] / input_size
+        rows[:, 4] = raw[:, 4]
+        rows[:, 5:] = raw[:, 5:] * raw[:, 4:5]
+        return rows
+
+    if layout == "yolov8":
+        # (4 + classes, rows) in input pixels; no objectness
+        raw = outputs[0].reshape(outputs[0].shape[-2], -1).T
+        rows = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.float32)
+        rows[:, :4] = raw[:, :4] / input_size
+        rows[:, 4] = 1.0
+        rows[:, 5:] = raw[:, 4:]
+        return rows
+
+    raise ValueError(f"Unknown output layout: {layout}")
+
+
+def load_class_names(path):
+    with open(path, "r") as f:
+        return [line.strip() for line in f.readlines()]
+
+
+class DetectionModel:
+    """
+    Common interface of the detector backends. forward() takes BGR images
+    and returns one array of Darknet-style rows per image (see
+    to_detection_rows), which decode_detections turns into boxes. Backends
+    only differ in how they load and run the network; preprocessing and
+    output decoding are shared.
+    """
+    def __init__(self, name, spec, model_dir):
+        self.name = name
+        self.format = spec["format"]
+        self.layout = spec.get("layout", "darknet")
+        if self.layout not in OUTPUT_LAYOUTS:
+            raise ValueError(f"Unknown output layout for model {name}: {self.layout}")
+        self.fixed_input_size = spec.get("input_size")  # Models exported with a static input shape
+        self.batch_size = spec.get("batch_size")  # Largest batch the network accepts (None: any)
+        self.weights_path = os.path.join(model_dir, spec["weights"])
+        self.classes = None
+
+    def input_size_for(self, input_size):
+        """
+        The input size actually used when input_size is requested
+        """
+        return self.fixed_input_size or input_size
+
+    def preprocess(self, images, input_size):
+        return cv2.dnn.blobFromImages(images, 1/255.0, (input_size, input_size), swapRB=True, crop=False)
+
+    def run(self, blob):
+        """
+        Run the network on an NCHW blob and return its raw output arrays,
+        each with the batch as the first dimension
+        """
+        raise NotImplementedError
+
+    def forward(self, images, input_size, timings=None):
+        """
+        Detect on images at input_size. With a timings dict, adds the seconds
+        spent building blobs ("blob"), running the network ("forward") and
+        converting outputs to rows ("decode")
+        """
+        input_size = self.input_size_for(input_size)
+        batch_size = self.batch_size or len(images)
+        rows = []
+        elapsed = {"blob": 0.0, "forward": 0.0, "decode": 0.0}
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            start_time = time.time()
+            blob = self.preprocess(chunk, input_size)
+            blob_time = time.time()
+            outputs = self.run(blob)
+            forward_time = time.time()
+            for index in range(len(chunk)):
+                rows.append(to_detection_rows([output[index] for output in outputs], self.layout, input_size))
+            elapsed["blob"] += blob_time - start_time
+            elapsed["forward"] += forward_time - blob_time
+            elapsed["decode"] += time.time() - forward_time
+        if timings is not None:
+            for stage, seconds in elapsed.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        return rows
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "format": self.format,
+            "layout": self.layout,
+            "weights": os.path.basename(self.weights_path),
+            "input_size": self.fixed_input_size
+        }
+
+
+def set_opencv_target(net, prefer_opencl):
+    """
+    Run an OpenCV DNN network on OpenCL when available and wanted, else on the CPU
+    """
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_DEFAULT)
+    if prefer_opencl and cv2.ocl.haveOpenCL():
+        cv2.ocl.setUseOpenCL(True)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+    else:
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+
+class DarknetModel(DetectionModel):
+    """
+    Darknet cfg/weights pair (yolov4, yolov4-tiny) run by OpenCV DNN
+    """
+    def __init__(self, name, spec, model_dir, prefer_opencl=True):
+        super().__init__(name, spec, model_dir)
+        self.net, self.classes, self.output_layers = load_yolo_model(
+            model_dir, spec["config"], spec["weights"], spec.get("classes", "coco.names"), prefer_opencl)
+
+    def run(self, blob):
+        self.net.setInput(blob)
+        outputs = self.net.forward(self.output_layers)
+        # Batched outputs come back as (N, rows, values); a single image as (rows, values)
+        return [output.reshape(blob.shape[0], -1, output.shape[-1]) for output in outputs]
+
+
+class OpenCVOnnxModel(DetectionModel):
+    """
+    ONNX export (e.g. YOLOv5/YOLOv8, including int8 QDQ models) run by OpenCV DNN
+    """
+    def __init__(self, name, spec, model_dir, prefer_opencl=True):
+        super().__init__(name, spec, model_dir)
+        if not os.path.exists(self.weights_path):
+            raise FileNotFoundError(f"Model file not found: {self.weights_path}")
+        self.net = cv2.dnn.readNetFromONNX(self.weights_path)
+        set_opencv_target(self.net, prefer_opencl)
+        self.classes = load_class_names(os.path.join(model_dir, spec.get("classes", "coco.names")))
+
+    def run(self, blob):
+        self.net.setInput(blob)
+        return [self.net.forward()]
+
+
+class OnnxRuntimeModel(DetectionModel):
+    """
+    ONNX export run by onnxruntime on the CPU; the usual way to run
+    dynamically quantized (int8) models. Requires `pip install onnxruntime`.
+    """
+    def __init__(self, name, spec, model_dir, prefer_opencl=True):
+        super().__init__(name, spec, model_dir)
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError(f"Model {name} needs onnxruntime (pip install onnxruntime)")
+        if not os.path.exists(self.weights_path):
+            raise FileNotFoundError(f"Model file not found: {self.weights_path}")
+        self.session = onnxruntime.InferenceSession(self.weights_path, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # Static dimensions in the exported graph override the spec
+        batch, _, height, _ = model_input.shape
+        if isinstance(batch, int):
+            self.batch_size = batch
+        if isinstance(height, int):
+            self.fixed_input_size = height
+        self.classes = load_class_names(os.path.join(model_dir, spec.get("classes", "coco.names")))
+
+    def run(self, blob):
+        return self.session.run(None, {self.input_name: blob})
+
+
+MODEL_BACKENDS = {
+    "darknet": DarknetModel,
+    "onnx": OpenCVOnnxModel,
+    "onnxruntime": OnnxRuntimeModel
+}
+
+
+class ModelRegistry:
+    """
+    Detector models available to cameras, by name, with the default one.
+    Models are described here and only loaded on request.
+    """
+    def __init__(self, specs, default, model_dir):
+        for name, spec in specs.items():
+            if spec.get("format", "darknet") not in MODEL_BACKENDS:
+                raise ValueError(f"Unknown format for model {name}: {spec.get('format')}")
+            if "weights" not in spec or (spec.get("format", "darknet") == "darknet" and "config" not in spec):
+                raise ValueError(f"Model {name} is missing its model files")
+        if default not in specs:
+            raise ValueError(f"Default model {default} is not configured")
+        self.specs = {name: dict(spec, format=spec.get("format", "darknet")) for name, spec in specs.items()}
+        self.default = default
+        self.model_dir = model_dir
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def names(self):
+        return list(self.specs)
+
+    def load(self, name=None, prefer_opencl=True):
+        """
+        Load a model (the default one if name is None) and return a DetectionModel
+        """
+        name = name or self.default
+        spec = self.specs[name]
+        return MODEL_BACKENDS[spec["format"]](name, spec, self.model_dir, prefer_opencl)
+
+
+def load_model_registry(path, model_dir=None):
+    """
+    Load model descriptions from a JSON config file of the form
+    {"default": name, "models": {name: {"format", "weights", ...}}}.
+    Model files are looked up in model_dir (default: next to the config).
+    Raises ValueError for an invalid config.
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+    models = config.get("models", {})
+    if not models:
+        raise ValueError(f"No models configured in {path}")
+    return ModelRegistry(models, config.get("default", next(iter(models))),
+                         model_dir or os.path.join(os.path.dirname(os.path.abspath(path)), "yolo"))
@@ -0,0 +1,99 @@
+
+import collections
+import threading
+import time
+
+import cv2
+
+
+class MotionGate:
+    """
+    Decides which camera frames need a full detector pass. Each frame is
+    reduced to a small blurred grayscale thumbnail and compared with the
+    thumbnail of the last frame sent to the detector; the share of pixels
+    that changed is the motion level. While the scene changes, every Nth
+    frame is sent; while it matches the last detected frame, the previous
+    detections stay valid and only an occasional refresh frame is sent.
+    """
+    def __init__(self, width=160, pixel_threshold=25, min_motion=0.005, max_static_interval=5.0, rate_window=10.0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_motion = min_motion  # Share of changed pixels that counts as motion
+        self.max_static_interval = max_static_interval
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.reference = None  # Thumbnail of the last frame sent to the detector
+        self.last_sent = 0.0
+        self.moving_frames = 0
+        self.motion_level = 0.0
+        self.static = False
+        self.frames = 0
+        self.frames_sent = 0
+        self.static_refreshes = 0
+        self.inferences = 0
+        self.inference_times = collections.deque()
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, height * self.width // width))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame, skip_frames=1, now=None):
+        """
+        Measure the motion in a frame and decide whether to send it to the
+        detector. Returns (send, static); static means the scene has not
+        changed since the last frame sent, so existing tracks still hold.
+        """
+        now = time.time() if now is None else now
+        thumbnail = self._thumbnail(frame)
+        with self.lock:
+            self.frames += 1
+            if self.reference is None or self.reference.shape != thumbnail.shape:
+                motion = 1.0
+            else:
+                _, changed = cv2.threshold(cv2.absdiff(thumbnail, self.reference), self.pixel_threshold, 255,
+                                           cv2.THRESH_BINARY)
+                motion = cv2.countNonZero(changed) / changed.size
+            self.motion_level = motion
+            self.static = motion < self.min_motion
+
+            if self.reference is None:
+                send = True  # Nothing detected yet
+            elif self.static:
+                send = now - self.last_sent >= self.max_static_interval
+                self.static_refreshes += send
+            else:
+                self.moving_frames += 1
+                send = self.moving_frames % max(1, skip_frames) == 0
+
+            if send:
+                self.reference = thumbnail
+                self.last_sent = now
+                self.frames_sent += 1
+            return send, self.static
+
+    def record_inference(self, now=None):
+        """
+        Count a completed detector pass for the inference rate
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self.inferences += 1
+            self.inference_times.append(now)
+            while self.inference_times and self.inference_times[0] < now - self.rate_window:
+                self.inference_times.popleft()
+
+    def get_stats(self):
+        now = time.time()
+        with self.lock:
+            recent = sum(1 for timestamp in self.inference_times if timestamp >= now - self.rate_window)
+            return {
+                "motion_level": self.motion_level,
+                "static": self.static,
+                "frames": self.frames,
+                "frames_sent": self.frames_sent,
+                "static_refreshes": self.static_refreshes,
+                "inferences": self.inferences,
+                "inference_rate": recent / self.rate_window
+            }
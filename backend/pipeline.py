@@ -0,0 +1,107 @@
+
+import collections
+import threading
+import time
+
+
+class LatestFrameBuffer:
+    """
+    Bounded single-consumer buffer between two pipeline stages. When the
+    producer outruns the consumer the oldest item is overwritten, and a read
+    always returns the newest item, so the consumer never works on stale data.
+    """
+    def __init__(self, name, capacity=1):
+        self.name = name
+        self.capacity = capacity
+        self.items = collections.deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.puts = 0
+        self.gets = 0
+        self.drops = 0
+
+    def put(self, item, timeout=0):
+        """
+        Publish an item, overwriting the oldest one if the buffer is full.
+        With a timeout, first wait up to that long for the consumer to make
+        room, for producers that must not outrun it.
+        """
+        with self.condition:
+            if timeout and len(self.items) == self.capacity:
+                self.condition.wait_for(lambda: len(self.items) < self.capacity, timeout)
+            if len(self.items) == self.capacity:
+                self.drops += 1
+            self.items.append(item)
+            self.puts += 1
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Wait for an item and return the newest one; anything older is dropped.
+        Returns None if nothing arrived within the timeout.
+        """
+        with self.condition:
+            if not self.items and not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            item = self.items.pop()
+            self.drops += len(self.items)
+            self.items.clear()
+            self.gets += 1
+            self.condition.notify_all()  # Room for a waiting producer
+            return item
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "depth": len(self.items),
+                "capacity": self.capacity,
+                "puts": self.puts,
+                "gets": self.gets,
+                "drops": self.drops
+            }
+
+
+class StageStats:
+    """
+    Iteration counters and timing for one pipeline stage. Latency percentiles
+    cover the most recent `window` iterations.
+    """
+    def __init__(self, name, window=1000):
+        self.name = name
+        self.lock = threading.Lock()
+        self.iterations = 0
+        self.errors = 0
+        self.items = 0
+        self.last_duration = 0.0
+        self.last_run = 0.0
+        self.durations = collections.deque(maxlen=window)
+
+    def record(self, duration, items=0):
+        """
+        Record one iteration; items counts what it produced (e.g. vehicles detected)
+        """
+        with self.lock:
+            self.iterations += 1
+            self.items += items
+            self.last_duration = duration
+            self.last_run = time.time()
+            self.durations.append(duration)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def get_stats(self):
+        with self.lock:
+            durations = sorted(self.durations)
+            return {
+                "iterations": self.iterations,
+                "errors": self.errors,
+                "items": self.items,
+                "latency_ms": {
+                    f"p{p}": durations[min(len(durations) - 1, int(p / 100.0 * len(durations)))] * 1000
+                    if durations else None
+                    for p in (50, 95, 99)
+                },
+                "last_duration": self.last_duration,
+                "last_run_age": time.time() - self.last_run if self.last_run else None
+            }
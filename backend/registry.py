@@ -0,0 +1,113 @@
+
+import json
+
+# Signal states and the codes they are stored as in numpy arrays (the shared
+# signal board, the history rings)
+SIGNAL_CODES = {"red": 0, "yellow": 1, "green": 2}
+SIGNAL_NAMES = {code: name for name, code in SIGNAL_CODES.items()}
+
+
+class Intersection:
+    """
+    One configured intersection: its camera source, the detection model for
+    the camera, the neighbouring intersections whose signals are
+    coordinated with it, and its own automatic phase durations
+    """
+    __slots__ = ("id", "name", "camera", "initial_signal", "neighbors", "model", "phase_plan")
+
+    def __init__(self, intersection_id, name, camera, initial_signal="red", neighbors=(), model=None, phase_plan=None):
+        self.id = intersection_id
+        self.name = name
+        self.camera = camera  # Device index, or a stream URL / video file path
+        self.initial_signal = initial_signal
+        self.neighbors = list(neighbors)
+        self.model = model  # Name in the model registry, None for the default model
+        self.phase_plan = dict(phase_plan or {})  # Signal -> seconds, overriding the default cycle times
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "camera": self.camera,
+            "initialSignal": self.initial_signal,
+            "neighbors": self.neighbors,
+            "model": self.model,
+            "phasePlan": self.phase_plan
+        }
+
+
+class IntersectionRegistry:
+    """
+    The set of intersections this backend manages, in configuration order.
+    Neighbour relations are made symmetric: if A lists B, B neighbours A.
+    """
+    def __init__(self, intersections):
+        self.intersections = {}
+        for intersection in intersections:
+            if intersection.id in self.intersections:
+                raise ValueError(f"Duplicate intersection ID: {intersection.id}")
+            if intersection.initial_signal not in SIGNAL_CODES:
+                raise ValueError(f"Invalid initial signal for {intersection.id}: {intersection.initial_signal}")
+            for signal, seconds in intersection.phase_plan.items():
+                if signal not in SIGNAL_CODES or not isinstance(seconds, (int, float)) or seconds <= 0:
+                    raise ValueError(f"Invalid phase plan for {intersection.id}: {signal}={seconds}")
+            self.intersections[intersection.id] = intersection
+
+        for intersection in self.intersections.values():
+            for neighbor_id in list(intersection.neighbors):
+                neighbor = self.intersections.get(neighbor_id)
+                if neighbor is None or neighbor_id == intersection.id:
+                    raise ValueError(f"Invalid neighbor {neighbor_id} for intersection {intersection.id}")
+                if intersection.id not in neighbor.neighbors:
+                    neighbor.neighbors.append(intersection.id)
+
+    def __contains__(self, intersection_id):
+        return intersection_id in self.intersections
+
+    def __iter__(self):
+        return iter(self.intersections.values())
+
+    def __len__(self):
+        return len(self.intersections)
+
+    def ids(self):
+        return list(self.intersections)
+
+    def get(self, intersection_id):
+        return self.intersections.get(intersection_id)
+
+    def name(self, intersection_id):
+        intersection = self.intersections.get(intersection_id)
+        return intersection.name if intersection is not None else intersection_id
+
+    def neighbors(self, intersection_id):
+        return self.intersections[intersection_id].neighbors
+
+
+def load_intersection_registry(path):
+    """
+    Load intersections from a JSON config file of the form
+    {"intersections": [{"id", "name", "camera", "initialSignal", "neighbors", "model", "phasePlan"}, ...]}
+    Raises ValueError for an invalid config.
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+
+    intersections = []
+    for entry in config.get("intersections", []):
+        try:
+            intersections.append(Intersection(
+                entry["id"],
+                entry.get("name", entry["id"]),
+                entry["camera"],
+                entry.get("initialSignal", "red"),
+                entry.get("neighbors", []),
+                entry.get("model"),
+                entry.get("phasePlan")
+            ))
+        except KeyError as e:
+            raise ValueError(f"Intersection config entry is missing {e}: {entry}")
+
+    if not intersections:
+        raise ValueError(f"No intersections configured in {path}")
+    return IntersectionRegistry(intersections)
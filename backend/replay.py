@@ -0,0 +1,114 @@
+
+import os
+import threading
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ReplaySource:
+    """
+    Recorded video file or directory of images that stands in for a camera.
+    It has the subset of the cv2.VideoCapture interface the pipeline uses, so
+    recorded clips run through exactly the same capture, inference and
+    render stages as a live feed. With pace "realtime" frames are released
+    at the clip's frame rate; with "fast" they are read without delay and
+    the capture stage waits for inference to take each frame it sends. At
+    the end of the clip it starts over, or with loop=False reports the end
+    and sets finished.
+    """
+    def __init__(self, path, pace="realtime", loop=True, image_fps=15.0):
+        if pace not in ("realtime", "fast"):
+            raise ValueError(f"Unknown replay pace: {pace}")
+        self.path = path
+        self.pace = pace
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.images = None
+        self.capture = None
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.fps = image_fps
+        else:
+            self.capture = cv2.VideoCapture(path)
+            self.fps = self.capture.get(cv2.CAP_PROP_FPS) or image_fps
+        self.position = 0
+        self.frames_read = 0
+        self.loops = 0
+        self.finished = False
+        self.started_at = None
+        self.finished_at = None
+
+    def isOpened(self):
+        if self.images is not None:
+            return bool(self.images)
+        return self.capture.isOpened()
+
+    def set(self, prop, value):
+        return False  # Camera properties do not apply to recordings
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return self.capture.get(prop) if self.capture is not None else 0.0
+
+    def _read_next(self):
+        if self.images is not None:
+            if self.position >= len(self.images):
+                return False, None
+            frame = cv2.imread(self.images[self.position])
+            self.position += 1
+            return frame is not None, frame
+        return self.capture.read()
+
+    def _rewind(self):
+        self.position = 0
+        if self.capture is not None:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def read(self):
+        with self.lock:
+            if self.finished:
+                return False, None
+            ret, frame = self._read_next()
+            if not ret and self.loop:
+                self._rewind()
+                self.loops += 1
+                ret, frame = self._read_next()
+            if not ret:
+                self.finished = True
+                self.finished_at = time.time()
+                return False, None
+
+            now = time.time()
+            if self.started_at is None:
+                self.started_at = now
+            delay = 0.0
+            if self.pace == "realtime":
+                # Release frame N at N / fps on the clip's own clock, so slow reads do not drift
+                delay = self.started_at + self.frames_read / self.fps - now
+            self.frames_read += 1
+        if delay > 0:
+            time.sleep(delay)
+        return True, frame
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+
+    def get_stats(self):
+        with self.lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+            return {
+                "path": self.path,
+                "pace": self.pace,
+                "source_fps": self.fps,
+                "frames_read": self.frames_read,
+                "started_at": self.started_at,
+                "read_fps": self.frames_read / elapsed if elapsed else None,
+                "loops": self.loops,
+                "finished": self.finished
+            }
@@ -0,0 +1,137 @@
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+
+class FairScheduler:
+    """
+    Runs many small recurring tasks (one per camera stage) on a fixed pool of
+    worker threads. A task runs one step at a time; the step returns how long
+    to wait before it runs again (0 to requeue immediately), or None to sleep
+    until notify() says new work has arrived. Ready tasks are served
+    round-robin, so every camera gets one slice per round no matter how many
+    cameras there are or how busy the others are.
+    """
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = max(1, workers)
+        self.condition = threading.Condition()
+        self.tasks = {}
+        self.ready = collections.deque()
+        self.timers = []  # heap of (due time, tiebreak, name)
+        self.timer_order = itertools.count()
+        self.threads = []
+
+    def add_task(self, name, step):
+        """
+        Register a task; it first runs when notified
+        """
+        with self.condition:
+            self.tasks[name] = {
+                "step": step,
+                "state": "idle",  # idle | ready | running | sleeping
+                "pending": False,  # Notified while running or sleeping
+                "ready_since": None,
+                "runs": 0,
+                "errors": 0,
+                "busy_time_total": 0.0,
+                "wait_time_total": 0.0
+            }
+
+    def notify(self, name):
+        """
+        Tell a task it has new work; cheap enough to call for every frame
+        """
+        with self.condition:
+            task = self.tasks.get(name)
+            if task is None:
+                return
+            if task["state"] == "idle":
+                self._make_ready(name, task)
+                self.condition.notify()
+            else:
+                task["pending"] = True
+
+    def _make_ready(self, name, task):
+        task["state"] = "ready"
+        task["pending"] = False
+        task["ready_since"] = time.time()
+        self.ready.append(name)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        print(f"Started {self.name} scheduler with {self.workers} workers")
+        return self
+
+    def _next_task(self):
+        """
+        Wait for the next ready task (caller holds the condition)
+        """
+        while True:
+            now = time.time()
+            while self.timers and self.timers[0][0] <= now:
+                _, _, name = heapq.heappop(self.timers)
+                self._make_ready(name, self.tasks[name])
+            if self.ready:
+                return self.ready.popleft()
+            self.condition.wait(self.timers[0][0] - now if self.timers else None)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                name = self._next_task()
+                task = self.tasks[name]
+                task["state"] = "running"
+                task["pending"] = False
+                start_time = time.time()
+                task["wait_time_total"] += start_time - task["ready_since"]
+
+            failed = False
+            try:
+                delay = task["step"]()
+            except Exception as e:
+                print(f"Error in {self.name} task {name}: {e}")
+                failed = True
+                delay = 0.1  # Back off before retrying
+
+            with self.condition:
+                task["runs"] += 1
+                task["errors"] += failed
+                task["busy_time_total"] += time.time() - start_time
+                if delay is None:
+                    if task["pending"]:
+                        self._make_ready(name, task)
+                    else:
+                        task["state"] = "idle"
+                elif delay <= 0:
+                    self._make_ready(name, task)
+                else:
+                    task["state"] = "sleeping"
+                    heapq.heappush(self.timers, (time.time() + delay, next(self.timer_order), name))
+                # Wake a worker to pick up the task or recompute its timer wait
+                self.condition.notify()
+
+    def get_stats(self):
+        with self.condition:
+            tasks = {}
+            for name, task in self.tasks.items():
+                runs = task["runs"]
+                tasks[name] = {
+                    "state": task["state"],
+                    "runs": runs,
+                    "errors": task["errors"],
+                    "avg_busy_ms": task["busy_time_total"] / runs * 1000 if runs else None,
+                    "avg_wait_ms": task["wait_time_total"] / runs * 1000 if runs else None
+                }
+            return {
+                "workers": self.workers,
+                "ready": len(self.ready),
+                "sleeping": len(self.timers),
+                "tasks": tasks
+            }
@@ -0,0 +1,326 @@
+
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from metrics import LATENCY_BUCKETS
+from registry import SIGNAL_CODES, SIGNAL_NAMES
+
+# One tracked vehicle in a shared detection state block
+VEHICLE_DTYPE = np.dtype([
+    ("id", "S16"),
+    ("type", "S16"),
+    ("box", "<i4", (4,)),
+    ("license_plate", "S12"),
+    ("is_emergency", "?"),
+    ("helmet_violation", "?"),
+    ("passenger_violation", "?"),
+    ("person_count", "<i2")
+])
+
+STATE_HEADER_DTYPE = np.dtype([
+    ("seq", "<u8"),  # Odd while the writer is updating the block
+    ("frame_seq", "<i8"),  # Raw frame ring sequence the detections were made on
+    ("timestamp", "<f8"),
+    ("vehicle_count", "<i4"),
+    ("vehicles", "<i4"),
+    ("has_emergency", "?")
+])
+
+# Per-intersection motion gate statistics published by detection workers
+MOTION_STATS_DTYPE = np.dtype([
+    ("motion_level", "<f8"),
+    ("static", "?"),
+    ("frames", "<i8"),
+    ("frames_sent", "<i8"),
+    ("static_refreshes", "<i8"),
+    ("inferences", "<i8"),
+    ("inference_rate", "<f8")
+])
+
+# Per-intersection adaptive controller settings and measurements
+ADAPTIVE_STATS_DTYPE = np.dtype([
+    ("input_size", "<i4"),
+    ("skip_frames", "<i4"),
+    ("latency_ms", "<f8"),
+    ("lag_ms", "<f8"),
+    ("inference_ms", "<f8"),
+    ("busy", "<f8"),
+    ("adjustments", "<i8"),
+    ("last_reason", "S32")
+])
+
+# Stages instrumented in the detection workers, and their per-intersection
+# latency histograms and counters
+WORKER_METRIC_STAGES = ("capture", "blob", "forward", "decode", "tracking", "draw")
+PIPELINE_METRICS_DTYPE = np.dtype(
+    [(f"{stage}_buckets", "<i8", (len(LATENCY_BUCKETS) + 1,)) for stage in WORKER_METRIC_STAGES] +
+    [(f"{stage}_sum", "<f8") for stage in WORKER_METRIC_STAGES] +
+    [("reconnects", "<i8"), ("render_dropped", "<i8"), ("inference_dropped", "<i8")]
+)
+
+
+class SharedFrameRing:
+    """
+    Single-writer ring of frames in shared memory. The writer fills the next
+    slot and then publishes its sequence number; readers get a read-only
+    numpy view of the newest slot, so frames cross the process boundary
+    without pickling and are never copied on the reading side. A view stays
+    valid until the writer wraps around the ring, which is_current() checks.
+    """
+    HEADER_FIELDS = 3  # Per slot: seq, height, width
+
+    def __init__(self, name, slots, max_shape, create=False):
+        self.name = name
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        header_bytes = 8 * (1 + slots * self.HEADER_FIELDS)
+        size = header_bytes + slots * self.slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.header = np.ndarray((1 + slots * self.HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self.header[:] = 0
+        self.writing = None
+
+    def _slot_header(self, slot):
+        start = 1 + slot * self.HEADER_FIELDS
+        return self.header[start:start + self.HEADER_FIELDS]
+
+    @property
+    def seq(self):
+        return int(self.header[0])
+
+    def begin_write(self, height, width):
+        """
+        Return a writable view of the next slot for a frame of the given size;
+        publish it with commit()
+        """
+        if height * width * self.max_shape[2] > self.slot_bytes:
+            raise ValueError(f"Frame {width}x{height} is larger than the ring's {self.max_shape[1]}x{self.max_shape[0]}")
+        seq = self.seq + 1
+        slot = seq % self.slots
+        slot_header = self._slot_header(slot)
+        slot_header[0] = -1  # Readers treat the slot as invalid until commit
+        slot_header[1:] = (height, width)
+        self.writing = seq
+        return self.data[slot, :height * width * self.max_shape[2]].reshape(height, width, self.max_shape[2])
+
+    def commit(self):
+        seq = self.writing
+        self._slot_header(seq % self.slots)[0] = seq
+        self.header[0] = seq
+        self.writing = None
+        return seq
+
+    def fit(self, frame):
+        """
+        Downscale a frame that is larger than the ring's slots
+        """
+        height, width = frame.shape[:2]
+        if height <= self.max_shape[0] and width <= self.max_shape[1]:
+            return frame
+        scale = min(self.max_shape[0] / height, self.max_shape[1] / width)
+        return cv2.resize(frame, (int(width * scale), int(height * scale)))
+
+    def write(self, frame):
+        """
+        Copy a frame into the ring and publish it; returns its sequence number
+        """
+        frame = self.fit(frame)
+        np.copyto(self.begin_write(*frame.shape[:2]), frame)
+        return self.commit()
+
+    def read(self, seq=None):
+        """
+        Return (seq, read-only view) of the newest frame, or of a specific
+        seq if it is still in the ring; (seq, None) if unavailable
+        """
+        seq = self.seq if seq is None else seq
+        if seq <= 0:
+            return seq, None
+        slot_header = self._slot_header(seq % self.slots)
+        if slot_header[0] != seq:
+            return seq, None
+        height, width = int(slot_header[1]), int(slot_header[2])
+        view = self.data[seq % self.slots, :height * width * self.max_shape[2]].reshape(height, width, self.max_shape[2])
+        view.flags.writeable = False
+        return seq, view
+
+    def is_current(self, seq):
+        """
+        True while the slot holding seq has not been reused by the writer
+        """
+        return self._slot_header(seq % self.slots)[0] == seq
+
+    def copy(self, seq):
+        """
+        Private copy of a frame, or None if it has already been overwritten
+        """
+        seq, view = self.read(seq)
+        if view is None:
+            return None
+        frame = view.copy()
+        return frame if self.is_current(seq) else None
+
+    def close(self, unlink=False):
+        self.header = self.data = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedDetectionState:
+    """
+    Latest detection results for one intersection in shared memory, guarded
+    by a sequence lock: the writer makes seq odd while updating, and readers
+    retry if seq changed under them.
+    """
+    def __init__(self, name, max_vehicles=128, create=False):
+        self.name = name
+        self.max_vehicles = max_vehicles
+        size = STATE_HEADER_DTYPE.itemsize + max_vehicles * VEHICLE_DTYPE.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.header = np.ndarray((1,), dtype=STATE_HEADER_DTYPE, buffer=self.shm.buf)
+        self.vehicles = np.ndarray((max_vehicles,), dtype=VEHICLE_DTYPE, buffer=self.shm.buf,
+                                   offset=STATE_HEADER_DTYPE.itemsize)
+        if create:
+            self.header[0] = np.zeros((), dtype=STATE_HEADER_DTYPE)
+
+    @property
+    def seq(self):
+        return int(self.header["seq"][0])
+
+    def write(self, vehicle_count, has_emergency, vehicles, frame_seq):
+        """
+        Publish detection results (vehicle dicts as built by process_detections)
+        """
+        count = min(len(vehicles), self.max_vehicles)
+        header = self.header[0]
+        header["seq"] += 1
+        for index, vehicle in enumerate(vehicles[:count]):
+            self.vehicles[index] = (
+                vehicle["id"].encode(),
+                vehicle["type"].encode(),
+                vehicle["box"],
+                (vehicle["license_plate"] or "").encode(),
+                vehicle["is_emergency"],
+                vehicle["helmet_violation"],
+                vehicle["passenger_violation"],
+                vehicle["person_count"]
+            )
+        header["frame_seq"] = frame_seq
+        header["timestamp"] = time.time()
+        header["vehicle_count"] = vehicle_count
+        header["vehicles"] = count
+        header["has_emergency"] = has_emergency
+        header["seq"] += 1
+
+    def read(self, retries=10):
+        """
+        Return (seq, vehicle_count, has_emergency, vehicles, frame_seq), or
+        None if the writer kept updating the block during every attempt
+        """
+        for _ in range(retries):
+            seq = self.seq
+            if seq % 2:
+                time.sleep(0)
+                continue
+            header = self.header[0].copy()
+            records = self.vehicles[:header["vehicles"]].copy()
+            if self.seq != seq:
+                continue
+
+            vehicles = []
+            for record in records:
+                x, y, w, h = (int(value) for value in record["box"])
+                vehicles.append({
+                    "id": record["id"].decode(),
+                    "type": record["type"].decode(),
+                    "position": (x + w // 2, y + h // 2),
+                    "size": (w, h),
+                    "box": (x, y, w, h),
+                    "is_emergency": bool(record["is_emergency"]),
+                    "license_plate": record["license_plate"].decode() or None,
+                    "helmet_violation": bool(record["helmet_violation"]),
+                    "passenger_violation": bool(record["passenger_violation"]),
+                    "person_count": int(record["person_count"])
+                })
+            return (seq, int(header["vehicle_count"]), bool(header["has_emergency"]),
+                    vehicles, int(header["frame_seq"]))
+        return None
+
+    def close(self, unlink=False):
+        self.header = self.vehicles = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedSignalBoard:
+    """
+    Signal status and auto-mode flag for every intersection, written by the
+    web process and read by detection workers for their overlays
+    """
+    def __init__(self, name, intersection_ids, create=False):
+        self.name = name
+        self.index = {intersection_id: i for i, intersection_id in enumerate(intersection_ids)}
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=2 * len(intersection_ids) if create else 0)
+        self.board = np.ndarray((len(intersection_ids), 2), dtype=np.int8, buffer=self.shm.buf)
+
+    def set(self, intersection_id, status, auto_enabled):
+        self.board[self.index[intersection_id]] = (SIGNAL_CODES[status], auto_enabled)
+
+    def get(self, intersection_id):
+        code, auto_enabled = self.board[self.index[intersection_id]]
+        return SIGNAL_NAMES.get(int(code), "unknown"), bool(auto_enabled)
+
+    def close(self, unlink=False):
+        self.board = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedStatsBoard:
+    """
+    One row of statistics per intersection (fields given by a numpy
+    structured dtype), written by the worker that runs the intersection and
+    read by the web process. Each field has a single writer; rows are for
+    diagnostics and are not read atomically as a whole. Values that are not
+    fields of the dtype are ignored, and None is stored as NaN.
+    """
+    def __init__(self, name, intersection_ids, dtype, create=False):
+        self.name = name
+        self.index = {intersection_id: i for i, intersection_id in enumerate(intersection_ids)}
+        size = dtype.itemsize * len(intersection_ids)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.rows = np.ndarray((len(intersection_ids),), dtype=dtype, buffer=self.shm.buf)
+        if create:
+            self.rows[:] = np.zeros((), dtype=dtype)
+
+    def update(self, intersection_id, values):
+        row = self.rows[self.index[intersection_id]]
+        for field in self.rows.dtype.names:
+            if field in values:
+                row[field] = np.nan if values[field] is None else values[field]
+
+    def get(self, intersection_id):
+        row = self.rows[self.index[intersection_id]].item()
+        stats = {}
+        for field, value in zip(self.rows.dtype.names, row):
+            if isinstance(value, bytes):
+                value = value.decode()
+            elif isinstance(value, float) and value != value:
+                value = None  # NaN
+            stats[field] = value
+        return stats
+
+    def close(self, unlink=False):
+        self.rows = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
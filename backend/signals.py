@@ -0,0 +1,157 @@
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+# Automatic signal cycle: the phase that follows each phase
+NEXT_PHASE = {"red": "green", "green": "yellow", "yellow": "red"}
+
+
+def traffic_level(plan, vehicle_count):
+    """
+    "low", "medium" or "high" for a vehicle count under a phase plan's thresholds
+    """
+    thresholds = plan["vehicle_thresholds"]
+    if vehicle_count <= thresholds["low"]:
+        return "low"
+    if vehicle_count <= thresholds["medium"]:
+        return "medium"
+    return "high"
+
+
+def phase_duration(plan, signal, vehicle_count):
+    """
+    Seconds a phase lasts under a phase plan (cycle_times, vehicle_thresholds
+    and cycle_adjustments) at the given vehicle count
+    """
+    return plan["cycle_times"][signal] * plan["cycle_adjustments"][traffic_level(plan, vehicle_count)]
+
+
+class PhaseTimer:
+    """
+    Timer heap on a dedicated thread that fires signal phase transitions at
+    their due time, independent of camera frame rates. Each key (an
+    intersection) has at most one deadline: scheduling again moves it and
+    cancel() drops it; superseded heap entries are skipped when they surface.
+    The callback runs on the timer thread, outside the timer's lock, as
+    callback(key, due, now).
+    """
+    def __init__(self, name, history=1000):
+        self.name = name
+        self.condition = threading.Condition()
+        self.heap = []  # (due time, tiebreak, key)
+        self.deadlines = {}  # key -> (due time, tiebreak) of its live entry
+        self.scheduled_at = {}  # key -> when its deadline was set
+        self.order = itertools.count()
+        self.callback = None
+        self.thread = None
+        self.fired = 0
+        self.errors = 0
+        # Seconds from due (or, for a deadline set in the past, from scheduling) to firing
+        self.lateness = collections.deque(maxlen=history)
+
+    def schedule(self, key, due):
+        """
+        Set (or move) the deadline of key
+        """
+        with self.condition:
+            entry = (due, next(self.order))
+            self.deadlines[key] = entry
+            self.scheduled_at[key] = time.time()
+            heapq.heappush(self.heap, entry + (key,))
+            if self.heap[0][1] == entry[1]:
+                self.condition.notify()  # New earliest deadline
+
+    def cancel(self, key):
+        with self.condition:
+            self.deadlines.pop(key, None)
+            self.scheduled_at.pop(key, None)
+
+    def deadline(self, key):
+        """
+        Due time of key, or None if nothing is scheduled
+        """
+        with self.condition:
+            entry = self.deadlines.get(key)
+            return entry[0] if entry is not None else None
+
+    def start(self, callback):
+        if self.thread is None:
+            self.callback = callback
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+            print(f"Started {self.name} timer thread")
+        return self
+
+    def _next_due(self):
+        """
+        Wait for the earliest live deadline to come due and remove it;
+        returns (key, due, scheduled_at) (caller holds the condition)
+        """
+        while True:
+            while self.heap:
+                due, order, key = self.heap[0]
+                if self.deadlines.get(key) == (due, order):
+                    break
+                heapq.heappop(self.heap)  # Moved or cancelled
+            if not self.heap:
+                self.condition.wait()
+                continue
+            remaining = self.heap[0][0] - time.time()
+            if remaining > 0:
+                self.condition.wait(remaining)
+                continue
+            due, _, key = heapq.heappop(self.heap)
+            del self.deadlines[key]
+            return key, due, self.scheduled_at.pop(key)
+
+    def fire_due(self, now, callback=None):
+        """
+        Fire every deadline up to now on the calling thread, in due order,
+        passing each its due time as the current time. For simulations on a
+        virtual clock, instead of start().
+        """
+        callback = callback or self.callback
+        while True:
+            with self.condition:
+                while self.heap and self.deadlines.get(self.heap[0][2]) != self.heap[0][:2]:
+                    heapq.heappop(self.heap)  # Moved or cancelled
+                if not self.heap or self.heap[0][0] > now:
+                    return
+                due, _, key = heapq.heappop(self.heap)
+                del self.deadlines[key]
+                del self.scheduled_at[key]
+            callback(key, due, due)
+            with self.condition:
+                self.fired += 1
+
+    def _run(self):
+        while True:
+            with self.condition:
+                key, due, scheduled_at = self._next_due()
+            now = time.time()
+            try:
+                self.callback(key, due, now)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in {self.name} timer for {key}: {e}")
+            with self.condition:
+                self.fired += 1
+                self.lateness.append(now - max(due, scheduled_at))
+
+    def get_stats(self):
+        with self.condition:
+            lateness = sorted(self.lateness)
+            return {
+                "scheduled": len(self.deadlines),
+                "fired": self.fired,
+                "errors": self.errors,
+                "lateness_ms": {
+                    f"p{p}": lateness[min(len(lateness) - 1, int(p / 100.0 * len(lateness)))] * 1000
+                    if lateness else None
+                    for p in (50, 99)
+                },
+                "max_lateness_ms": lateness[-1] * 1000 if lateness else None
+            }
@@ -0,0 +1,286 @@
+
+import collections
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_intersections_config(count, layout="corridor", columns=None):
+    """
+    Intersections config for count virtual intersections: a corridor (each
+    one neighbours the next) or a grid (neighbours left, right, up and down).
+    Cameras are placeholders; simulated intersections do not open them.
+    """
+    columns = columns or max(1, int(math.sqrt(count)))
+    intersections = []
+    for index in range(count):
+        neighbors = []
+        row, column = divmod(index, columns) if layout == "grid" else (0, index)
+        if layout == "grid":
+            if column > 0:
+                neighbors.append(index - 1)
+            if row > 0:
+                neighbors.append(index - columns)
+        elif index > 0:
+            neighbors.append(index - 1)
+        intersections.append({
+            "id": f"sim-{index + 1:04d}",
+            "name": f"Simulated intersection {index + 1}",
+            "camera": f"sim:{index + 1}",
+            "initialSignal": "green" if (row + column) % 2 == 0 else "red",  # No two neighbours green
+            "neighbors": [f"sim-{neighbor + 1:04d}" for neighbor in neighbors]
+        })
+    return {"intersections": intersections}
+
+
+class InstrumentedLock:
+    """
+    Drop-in for threading.Lock that measures contention: how often an
+    acquire had to wait, how long it waited, and how long the lock was held.
+    Measurements are recorded while the lock is held, so they need no lock
+    of their own.
+    """
+    def __init__(self, history=100000):
+        self.lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.hold_total = 0.0
+        self.waits = collections.deque(maxlen=history)  # Seconds, contended acquires only
+        self.holds = collections.deque(maxlen=history)
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            wait = None
+        else:
+            start_time = time.perf_counter()
+            if not self.lock.acquire(blocking, timeout):
+                return False
+            wait = time.perf_counter() - start_time
+        self.acquisitions += 1
+        if wait is not None:
+            self.contended += 1
+            self.wait_total += wait
+            self.waits.append(wait)
+        self.acquired_at = time.perf_counter()
+        return True
+
+    def release(self):
+        hold = time.perf_counter() - self.acquired_at
+        self.hold_total += hold
+        self.holds.append(hold)
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def get_stats(self):
+        with self.lock:
+            waits, holds = sorted(self.waits), sorted(self.holds)
+            return {
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "contended_rate": self.contended / self.acquisitions if self.acquisitions else 0.0,
+                "wait_total_s": self.wait_total,
+                "hold_total_s": self.hold_total,
+                "wait_ms": _percentiles_ms(waits),
+                "hold_ms": _percentiles_ms(holds)
+            }
+
+
+def _percentiles_ms(ordered):
+    """
+    Percentiles in milliseconds of sorted durations in seconds
+    """
+    result = {
+        f"p{p}": ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))] * 1000 if ordered else None
+        for p in (50, 95, 99)
+    }
+    result["max"] = ordered[-1] * 1000 if ordered else None
+    return result
+
+
+class VirtualIntersection:
+    """
+    Synthetic traffic at one intersection: vehicles arrive at a demand that
+    varies in waves, queue while the signal is not green and drain while it
+    is. Emergency vehicles and two-wheelers (some riding without a helmet or
+    with too many passengers) show up at random.
+    """
+    def __init__(self, intersection_id, rng, config):
+        self.id = intersection_id
+        self.rng = rng
+        self.config = config
+        self.demand = rng.uniform(*config["arrival_rate"])  # Vehicles per second
+        self.phase = rng.uniform(0, 2 * math.pi)
+        self.queue = rng.randint(0, 10)
+        self.emergency_until = None
+        self.emergency_vehicle = None
+        self.vehicles = []
+        self.next_vehicle = 0
+
+    def _poisson(self, mean):
+        # Knuth's method is fine for the small per-tick means used here
+        limit, count, product = math.exp(-mean), 0, self.rng.random()
+        while product > limit:
+            count += 1
+            product *= self.rng.random()
+        return count
+
+    def _new_vehicle(self):
+        config = self.config
+        self.next_vehicle += 1
+        two_wheeler = self.rng.random() < config["two_wheeler_share"]
+        person_count = 0
+        helmet_violation = passenger_violation = False
+        if two_wheeler:
+            person_count = 3 if self.rng.random() < config["passenger_violation_rate"] else self.rng.randint(1, 2)
+            passenger_violation = person_count > 2
+            helmet_violation = self.rng.random() < config["helmet_violation_rate"]
+        x, y = self.rng.randint(0, 560), self.rng.randint(0, 400)
+        return {
+            "id": f"{self.id}-{self.next_vehicle}",
+            "type": self.rng.choice(("motorcycle", "bicycle")) if two_wheeler else
+            self.rng.choice(("car", "car", "car", "truck", "bus")),
+            "position": (x + 40, y + 40),
+            "size": (80, 80),
+            "box": (x, y, 80, 80),
+            "is_emergency": False,
+            "license_plate": None,
+            "helmet_violation": helmet_violation,
+            "passenger_violation": passenger_violation,
+            "person_count": person_count
+        }
+
+    def step(self, now, dt, signal):
+        """
+        Advance the traffic by dt seconds under the given signal and return
+        the detection result (vehicle_count, has_emergency, vehicles)
+        """
+        config = self.config
+        wave = 1 + config["wave_amplitude"] * math.sin(2 * math.pi * now / config["wave_period"] + self.phase)
+        arrivals = self._poisson(self.demand * wave * dt)
+        departures = self._poisson(config["discharge_rate"] * dt) if signal == "green" else 0
+        self.queue = max(0, self.queue + arrivals - departures)
+
+        # Keep the vehicle list in step with the queue, oldest leaving first
+        while len(self.vehicles) < self.queue:
+            self.vehicles.append(self._new_vehicle())
+        del self.vehicles[:len(self.vehicles) - self.queue]
+
+        if self.emergency_until is not None and now >= self.emergency_until:
+            self.emergency_until = self.emergency_vehicle = None
+        elif self.emergency_until is None and self.rng.random() < config["emergency_rate"] * dt / 3600:
+            self.emergency_until = now + self.rng.uniform(*config["emergency_duration"])
+            self.emergency_vehicle = dict(self._new_vehicle(), type="car", is_emergency=True, helmet_violation=False,
+                                          passenger_violation=False, person_count=0)
+        has_emergency = self.emergency_until is not None
+
+        vehicles = list(self.vehicles)
+        if has_emergency:
+            vehicles.append(self.emergency_vehicle)
+        return len(vehicles), has_emergency, vehicles
+
+
+class TrafficSimulator:
+    """
+    Feeds synthetic detection results for many virtual intersections through
+    the same entry point as the camera pipeline, apply(intersection_id,
+    vehicle_count, has_emergency, vehicles, now), once per detection
+    interval of simulated time. Results are applied from a pool of threads,
+    like the detection workers they stand in for.
+
+    By default the simulation runs as fast as possible on a virtual clock
+    starting at 0, and fire_due(now) is called after every tick to run the
+    phase changes that have come due. With realtime it is paced by the wall
+    clock and the phase timer runs on its own thread.
+    """
+    def __init__(self, intersection_ids, apply, get_signal, config, fire_due=None, seed=42, threads=4):
+        rng = random.Random(seed)
+        self.intersections = [VirtualIntersection(intersection_id, random.Random(rng.random()), config)
+                              for intersection_id in intersection_ids]
+        self.apply = apply
+        self.get_signal = get_signal
+        self.config = config
+        self.fire_due = fire_due
+        self.threads = max(1, threads)
+        self.shards = [self.intersections[index::self.threads] for index in range(self.threads)]
+        self.stats_lock = threading.Lock()
+        self.results = 0
+        self.emergencies = 0
+        self.two_wheeler_violations = 0
+        self.apply_times = collections.deque(maxlen=200000)  # Wall seconds per apply() call
+        self.sim_time = 0.0
+        self.wall_time = 0.0
+        self.stopping = threading.Event()
+
+    def _run_shard(self, shard, now, dt):
+        apply_times = []
+        emergencies = violations = 0
+        for intersection in shard:
+            vehicle_count, has_emergency, vehicles = intersection.step(now, dt, self.get_signal(intersection.id))
+            start_time = time.perf_counter()
+            self.apply(intersection.id, vehicle_count, has_emergency, vehicles, now)
+            apply_times.append(time.perf_counter() - start_time)
+            emergencies += has_emergency
+            violations += sum(1 for vehicle in vehicles if vehicle["helmet_violation"] or vehicle["passenger_violation"])
+        with self.stats_lock:
+            self.results += len(apply_times)
+            self.apply_times.extend(apply_times)
+            self.emergencies += emergencies
+            self.two_wheeler_violations += violations
+
+    def run(self, duration, realtime=False):
+        """
+        Simulate duration seconds of traffic (None: until stop() is called)
+        """
+        dt = self.config["detection_interval"]
+        start_wall = time.perf_counter()
+        start_clock = time.time()
+        tick = 0
+        with ThreadPoolExecutor(self.threads, thread_name_prefix="simulation") as pool:
+            while not self.stopping.is_set() and (duration is None or tick * dt < duration):
+                if realtime:
+                    delay = start_clock + tick * dt - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    now = time.time()
+                else:
+                    now = tick * dt
+                list(pool.map(lambda shard: self._run_shard(shard, now, dt), self.shards))
+                if not realtime and self.fire_due is not None:
+                    self.fire_due(now)
+                tick += 1
+                self.sim_time = tick * dt
+                self.wall_time = time.perf_counter() - start_wall
+        self.wall_time = time.perf_counter() - start_wall
+        return self.get_stats()
+
+    def stop(self):
+        self.stopping.set()
+
+    def get_stats(self):
+        with self.stats_lock:
+            apply_times = sorted(self.apply_times)
+            return {
+                "intersections": len(self.intersections),
+                "threads": self.threads,
+                "sim_seconds": self.sim_time,
+                "wall_seconds": self.wall_time,
+                "speedup": self.sim_time / self.wall_time if self.wall_time else None,
+                "results": self.results,
+                "results_per_second": self.results / self.wall_time if self.wall_time else None,
+                "emergency_results": self.emergencies,
+                "two_wheeler_violations": self.two_wheeler_violations,
+                "apply_ms": _percentiles_ms(apply_times)
+            }
@@ -0,0 +1,235 @@
+
+import asyncio
+import cv2
+import numpy as np
+import threading
+import time
+
+
+class FrameBroadcaster:
+    """
+    Fan-out point for one camera's annotated stream. Each published frame is
+    JPEG-encoded at most once per (max_width, quality) tier, and every viewer
+    of that tier receives the same bytes.
+
+    It also acts as a double-buffered frame store: a producer that cannot
+    draw on its source frame takes a back buffer, draws into it and
+    publishes it, which swaps it to the front by reference. Published frames
+    are read-only. A replaced front buffer is recycled as the next back
+    buffer once no viewer is still encoding from it.
+
+    A frame may also be a view into memory its producer reuses (a shared
+    memory ring slot); publish it with an is_current check, and an encode
+    that finds the frame overwritten once it is done is dropped instead of
+    sent.
+
+    With metrics (a PipelineMetrics), JPEG encode times are observed under
+    the broadcaster's name.
+    """
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_check = None  # is_current() of the front frame, if it can be overwritten
+        self.seq = 0
+        self.encoded = {}  # tier -> (seq, jpeg bytes)
+        self.tier_locks = {}
+        self.tier_locks_lock = threading.Lock()
+        self.encodes = 0
+        self.viewers = 0
+        self.async_waiters = []  # (event loop, future) pairs from async viewers
+        self.owned = {}  # id -> back buffer handed out by back_buffer()
+        self.spare = []  # Back buffers ready for reuse
+        self.leases = {}  # id -> number of viewers encoding from that buffer
+        self.buffer_allocations = 0
+        self.bytes_copied = 0
+        self.torn_frames = 0
+        self.encode_failures = 0
+
+    def back_buffer(self, source):
+        """
+        Return a writable copy of source in a recycled back buffer, for
+        producers whose source frame is shared with another stage. In steady
+        state this reuses the previous front buffer and allocates nothing.
+        """
+        with self.condition:
+            buffer = None
+            for index, spare in enumerate(self.spare):
+                if spare.shape == source.shape and spare.dtype == source.dtype:
+                    buffer = self.spare.pop(index)
+                    break
+            if buffer is None:
+                buffer = np.empty_like(source)
+                self.owned[id(buffer)] = buffer
+                self.buffer_allocations += 1
+            self.bytes_copied += source.nbytes
+        np.copyto(buffer, source)
+        return buffer
+
+    def _recycle(self, buffer):
+        """
+        Return a back buffer to the spare list if nobody can still see it
+        (caller holds the condition)
+        """
+        if buffer is None or buffer is self.frame or id(buffer) not in self.owned or self.leases.get(id(buffer)):
+            return
+        self.leases.pop(id(buffer), None)
+        if len(self.spare) < 2:
+            buffer.flags.writeable = True
+            self.spare.append(buffer)
+        else:
+            del self.owned[id(buffer)]  # e.g. left over from a resolution change
+
+    def publish(self, frame, is_current=None):
+        """
+        Publish a new frame and wake every waiting viewer. The frame becomes
+        read-only; the producer gives up ownership of it. For a frame the
+        producer may overwrite later, is_current() tells whether it still
+        holds the published image.
+        """
+        frame.flags.writeable = False
+        with self.condition:
+            previous = self.frame
+            self.frame = frame
+            self.frame_check = is_current
+            self._recycle(previous)
+            self.seq += 1
+            self.condition.notify_all()
+            seq = self.seq
+            waiters, self.async_waiters = self.async_waiters, []
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future, seq)
+            except RuntimeError:
+                pass  # The viewer's event loop has already shut down
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """
+        Wait until a frame newer than after_seq is available and return
+        (seq, frame), or (after_seq, None) on timeout. A back buffer may be
+        reused once it is replaced; use get_jpeg() to read it safely.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > after_seq and self.frame is not None, timeout):
+                return after_seq, None
+            return self.seq, self.frame
+
+    async def wait_for_seq_async(self, after_seq=0, timeout=None):
+        """
+        Async counterpart of wait_for_frame for event-loop servers. Returns the
+        newest sequence number, or None on timeout, without holding a thread.
+        """
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if self.seq > after_seq and self.frame is not None:
+                return self.seq
+            future = loop.create_future()
+            self.async_waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            # Not resolved by a publish (timed out or cancelled): stop tracking it
+            with self.condition:
+                if (loop, future) in self.async_waiters:
+                    self.async_waiters.remove((loop, future))
+
+    def get_jpeg(self, after_seq=0, max_width=640, quality=70, timeout=None):
+        """
+        Wait for a frame newer than after_seq and return (seq, jpeg bytes)
+        for the requested tier, encoding it only if no viewer has yet. A
+        frame that fails to encode or is overwritten while it was encoded is
+        dropped, and the next one is waited for within the same timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            with self.condition:
+                if not self.condition.wait_for(lambda: self.seq > after_seq and self.frame is not None, remaining):
+                    return after_seq, None
+                seq, frame, is_current = self.seq, self.frame, self.frame_check
+                # Hold a lease so the buffer is not recycled while we encode it
+                self.leases[id(frame)] = self.leases.get(id(frame), 0) + 1
+            try:
+                result = self._encode(seq, frame, max_width, quality, is_current)
+            finally:
+                with self.condition:
+                    self.leases[id(frame)] -= 1
+                    if not self.leases[id(frame)]:
+                        del self.leases[id(frame)]
+                        self._recycle(frame)
+            if result is not None:
+                return result
+            after_seq = seq  # Dropped frame: wait for its replacement
+
+    def _tier_lock(self, tier):
+        with self.tier_locks_lock:
+            return self.tier_locks.setdefault(tier, threading.Lock())
+
+    def _encode(self, seq, frame, max_width, quality, is_current=None):
+        """
+        Return (seq, jpeg bytes) of the frame for a tier, or None if it could
+        not be encoded or is_current shows it was overwritten before the
+        encode ended
+        """
+        tier = (max_width, quality)
+        with self._tier_lock(tier):
+            cached = self.encoded.get(tier)
+            if cached is not None and cached[0] >= seq:
+                return cached
+
+            start_time = time.time()
+            # Resize for streaming if needed
+            if max_width < frame.shape[1]:
+                scale = max_width / frame.shape[1]
+                frame = cv2.resize(frame, (max_width, int(frame.shape[0] * scale)))
+
+            # Encode the frame as JPEG with quality setting
+            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+            ret, buffer = cv2.imencode('.jpg', frame, encode_param)
+            if not ret:
+                with self.condition:
+                    self.encode_failures += 1
+                return None
+            # Re-check after encoding, like a seqlock reader: the producer
+            # may have reused the frame's memory while it was being read
+            if is_current is not None and not is_current():
+                with self.condition:
+                    self.torn_frames += 1
+                return None
+
+            cached = (seq, buffer.tobytes())
+            self.encoded[tier] = cached
+            self.encodes += 1
+            if self.metrics is not None:
+                self.metrics.observe("jpeg_encode", time.time() - start_time, self.name)
+            return cached
+
+    def add_viewer(self):
+        with self.condition:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self.condition:
+            self.viewers -= 1
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "frames_published": self.seq,
+                "jpeg_encodes": self.encodes,
+                "viewers": self.viewers,
+                "buffer_allocations": self.buffer_allocations,
+                "bytes_copied": self.bytes_copied,
+                "torn_frames": self.torn_frames,
+                "encode_failures": self.encode_failures,
+                "tiers": [f"{width}px@q{quality}" for width, quality in self.encoded]
+            }
+
+
+def _resolve_future(future, value):
+    if not future.done():
+        future.set_result(value)
@@ -0,0 +1,6 @@
+
+import os
+import sys
+
+# Backend modules import each other as siblings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
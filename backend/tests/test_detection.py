@@ -0,0 +1,47 @@
+
+import threading
+
+import pytest
+
+
+class CountingLock:
+    """
+    data_lock stand-in that counts how often it is taken
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquired = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = pytest.importorskip("app")
+    monkeypatch.setattr(app, "data_lock", CountingLock())
+    monkeypatch.setitem(app.detected_vehicles, "int-001", [])
+    monkeypatch.setitem(app.detection_frames, "int-001", None)
+    monkeypatch.setitem(app.traffic_data, "int-001", dict(app.traffic_data["int-001"]))
+    return app
+
+
+def test_detection_results_are_applied_in_one_critical_section(app):
+    vehicles = [{"id": "v1"}]
+    assert app.apply_detection_results("int-001", 1, False, vehicles, None, now=1000.0)
+    assert app.data_lock.acquired == 1
+    assert app.detected_vehicles["int-001"] is vehicles
+    assert app.traffic_data["int-001"]["vehicleCount"] == 1
+
+
+def test_stale_replacement_leaves_state_untouched(app):
+    current = app.detected_vehicles["int-001"]
+    count = app.traffic_data["int-001"]["vehicleCount"]
+    assert not app.apply_detection_results("int-001", 5, False, [{"id": "v2"}], None, replaces=[], now=1000.0)
+    assert app.detected_vehicles["int-001"] is current
+    assert app.traffic_data["int-001"]["vehicleCount"] == count
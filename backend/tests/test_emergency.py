@@ -0,0 +1,35 @@
+
+import cv2
+import numpy as np
+
+from emergency import EMERGENCY_COLOR_RANGES, EmergencyColorMap
+
+
+def direct_coverage(frame, color, box):
+    x, y, w, h = box
+    hsv = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2HSV)
+    lower, upper = EMERGENCY_COLOR_RANGES[color]
+    return np.count_nonzero(cv2.inRange(hsv, lower, upper)) / (w * h) * 100
+
+
+def test_full_scale_map_matches_direct_count():
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    color_map = EmergencyColorMap(frame)
+    for box in [(0, 0, 160, 120), (10, 20, 30, 15), (150, 110, 10, 10), (37, 5, 1, 1)]:
+        for color in EMERGENCY_COLOR_RANGES:
+            assert abs(color_map.coverage(color, box) - direct_coverage(frame, color, box)) < 1e-9
+
+
+def test_small_light_is_found_at_full_scale():
+    frame = np.zeros((480, 640, 3), np.uint8)
+    frame[200:203, 300:303] = (0, 0, 255)  # A 3x3 red light in an 8x8 box
+    assert EmergencyColorMap(frame).has_emergency_lights((298, 198, 8, 8), 5)
+
+
+def test_boxes_outside_the_frame_are_clipped():
+    frame = np.zeros((50, 50, 3), np.uint8)
+    frame[:, :] = (255, 0, 0)  # Blue everywhere
+    color_map = EmergencyColorMap(frame)
+    assert color_map.coverage("blue", (40, 40, 30, 30)) == 100.0
+    assert color_map.coverage("blue", (60, 60, 10, 10)) == 0.0
@@ -0,0 +1,98 @@
+
+import asyncio
+import json
+
+from events import EventBus, EventStreamSession, parse_resume_token
+
+
+def make_session(bus, token=None, state=None):
+    snapshot = lambda: (bus.last_id, state or {"signals": "all"})
+    return EventStreamSession(bus, snapshot, parse_resume_token(token), keepalive_interval=0.01)
+
+
+def sse_messages(text):
+    """
+    (event type, id, data) of each message in SSE text
+    """
+    messages = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            messages.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return messages
+
+
+def test_parse_resume_token():
+    assert parse_resume_token("abc:12") == ("abc", 12)
+    assert parse_resume_token(None) is None
+    assert parse_resume_token("") is None
+    assert parse_resume_token("12") is None  # Bare counters from older servers
+    assert parse_resume_token("abc:") is None
+    assert parse_resume_token("abc:x") is None
+
+
+def test_new_session_starts_with_snapshot_token():
+    bus = EventBus()
+    bus.publish("signal", "int-001", status="green")
+    [(event_type, event_id, data)] = sse_messages(make_session(bus).start())
+    assert event_type == "snapshot"
+    assert event_id == f"{bus.epoch}:1"
+
+
+def test_resume_from_same_epoch_sends_missed_events_only():
+    bus = EventBus()
+    first = bus.publish("signal", "int-001", status="green")
+    bus.publish("vehicleCount", "int-001", vehicleCount=4)
+    bus.publish("signal", "int-002", status="red")
+    messages = sse_messages(make_session(bus, bus.token(first)).start())
+    assert [message[0] for message in messages] == ["vehicleCount", "signal"]
+    assert [message[1] for message in messages] == [f"{bus.epoch}:2", f"{bus.epoch}:3"]
+    assert messages[0][2]["id"] == f"{bus.epoch}:2"
+
+
+def test_token_from_before_restart_gets_snapshot():
+    old_bus = EventBus()
+    for _ in range(3):
+        old_bus.publish("signal", "int-001", status="green")
+    token = old_bus.token(2)
+
+    # The restarted process has issued more events than the token's ID
+    bus = EventBus()
+    for _ in range(5):
+        bus.publish("signal", "int-001", status="red")
+    messages = sse_messages(make_session(bus, token).start())
+    assert [message[0] for message in messages] == ["snapshot"]
+    assert messages[0][1] == f"{bus.epoch}:5"
+
+    # ... or fewer
+    bus = EventBus()
+    messages = sse_messages(make_session(bus, old_bus.token(3)).start())
+    assert [message[0] for message in messages] == ["snapshot"]
+
+
+def test_token_older_than_history_gets_snapshot():
+    bus = EventBus(history_size=2)
+    for _ in range(5):
+        bus.publish("signal", "int-001", status="green")
+    messages = sse_messages(make_session(bus, bus.token(1)).start())
+    assert [message[0] for message in messages] == ["snapshot"]
+
+
+def test_next_messages_continues_from_last_sent_event():
+    bus = EventBus()
+    session = make_session(bus)
+    session.start()
+    assert session.next_messages() == ": keepalive\n\n"
+    bus.publish("emergency", "int-002", hasEmergencyVehicle=True)
+    [(event_type, event_id, data)] = sse_messages(session.next_messages())
+    assert (event_type, event_id, data["hasEmergencyVehicle"]) == ("emergency", f"{bus.epoch}:1", True)
+
+
+def test_timed_out_async_waiters_are_dropped():
+    bus = EventBus()
+
+    async def keepalives():
+        for _ in range(5):
+            assert await bus.wait_for_events_async(0, timeout=0.01) == ([], True)
+    asyncio.run(keepalives())
+    assert bus.async_waiters == []
@@ -0,0 +1,37 @@
+
+import threading
+
+import numpy as np
+
+import evidence
+from evidence import EvidenceEncoder, EvidenceStore
+
+
+def test_frame_is_encoded_once_for_all_its_violations(tmp_path, monkeypatch):
+    shapes = []
+    imencode = evidence.cv2.imencode
+
+    def counting_imencode(extension, image, params):
+        shapes.append(image.shape[:2])
+        return imencode(extension, image, params)
+    monkeypatch.setattr(evidence.cv2, "imencode", counting_imencode)
+
+    encoder = EvidenceEncoder(EvidenceStore(str(tmp_path)), workers=1).start()
+    frame = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    results = []
+    done = threading.Event()
+
+    def callback(evidence):
+        results.append(evidence)
+        if len(results) == 3:
+            done.set()
+    boxes = [(10, 10, 20, 20), (60, 40, 30, 30), (100, 70, 40, 30)]
+    assert encoder.submit(frame, [(box, callback) for box in boxes])
+    assert done.wait(5)
+
+    assert shapes.count((120, 160)) == 1
+    assert len(shapes) == 4
+    assert len({result["frame"] for result in results}) == 1
+    assert len({result["vehicle"] for result in results}) == 3
+    stats = encoder.get_stats()
+    assert (stats["submitted"], stats["encoded"], stats["frames_encoded"]) == (3, 3, 1)
@@ -0,0 +1,43 @@
+
+from history import TrafficHistory
+
+ROLLUPS = {"10s": (10, 3)}
+
+
+def make_history(raw_capacity=4):
+    return TrafficHistory({"a": "red"}, raw_capacity, ROLLUPS)
+
+
+def test_raw_ring_keeps_the_newest_records_oldest_first():
+    history = make_history()
+    for second in range(6):
+        history.record_count("a", second, now=100.0 + second)
+    records = history.query("a", "raw", 0, 1000)
+    assert records["time"] == [102.0, 103.0, 104.0, 105.0]
+    assert records["vehicleCount"] == [2, 3, 4, 5]
+    assert history.query("a", "raw", 103, 104)["time"] == [103.0, 104.0]
+
+
+def test_rollup_buckets_split_at_boundaries():
+    history = make_history()
+    history.record_count("a", 4, now=109.0)
+    history.record_count("a", 2, now=109.999)
+    history.record_signal("a", "green", now=110.0)
+    history.record_count("a", 6, now=115.0)
+    buckets = history.query("a", "10s", 100, 119)
+    assert buckets["time"] == [100, 110]
+    assert buckets["min"] == [2, 2]
+    assert buckets["max"] == [4, 6]
+    assert buckets["mean"] == [3.0, 4.0]
+    assert buckets["signal"] == ["red", "green"]
+    assert buckets["signalChanges"] == [0, 1]
+
+
+def test_rollup_query_ranges_skip_overwritten_and_empty_buckets():
+    history = make_history()
+    for now in (100.0, 110.0, 130.0, 140.0):
+        history.record_count("a", 1, now=now)
+    # Three buckets kept: 100 and 110 were overwritten by 130 and 140
+    assert history.query("a", "10s", 100, 149)["time"] == [130, 140]
+    assert history.query("a", "10s", 0, 125)["time"] == []
+    assert history.query("a", "10s", 135, 145)["time"] == [130, 140]
@@ -0,0 +1,66 @@
+
+import threading
+
+import numpy as np
+import pytest
+
+from inference import InferenceEngine
+
+
+class FakeModel:
+    """
+    Stand-in detection model: one empty output row per image, optionally
+    held until released
+    """
+    name = "fake"
+    classes = ["car"]
+    fixed_input_size = False
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    def input_size_for(self, input_size):
+        return input_size
+
+    def forward(self, images, input_size, timings=None):
+        self.release.wait()
+        if timings is not None:
+            timings.update(blob=0.0, forward=0.0, decode=0.0)
+        return [np.zeros((0, 6), np.float32) for _ in images]
+
+
+def test_infer_returns_one_output_per_image():
+    engine = InferenceEngine(FakeModel()).start()
+    outputs = engine.infer("int-001", [np.zeros((8, 8, 3), np.uint8)] * 3, timeout=1)
+    assert len(outputs) == 3
+
+
+def test_result_times_out_when_engine_hangs():
+    model = FakeModel()
+    model.release.clear()
+    engine = InferenceEngine(model).start()
+    try:
+        with pytest.raises(TimeoutError):
+            engine.infer("int-001", [np.zeros((8, 8, 3), np.uint8)], timeout=0.05)
+    finally:
+        model.release.set()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_engine_is_replaced_on_the_same_model():
+    app = pytest.importorskip("app")
+    model = FakeModel()
+    engine = InferenceEngine(model)
+    engine._collect_batch = lambda: 1 / 0  # The worker thread dies on its first batch
+    engine.start().thread.join(1)
+    assert not engine.is_alive()
+
+    app.inference_engines["fake"] = engine
+    try:
+        replacement = app.get_inference_engine("fake")
+        assert replacement is not engine and replacement.is_alive()
+        assert replacement.model is model
+        assert len(replacement.infer("int-001", [np.zeros((8, 8, 3), np.uint8)], timeout=1)) == 1
+    finally:
+        del app.inference_engines["fake"]
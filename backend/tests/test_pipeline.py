@@ -0,0 +1,38 @@
+
+import threading
+import time
+
+from pipeline import LatestFrameBuffer
+
+
+def test_put_overwrites_oldest_without_timeout():
+    buffer = LatestFrameBuffer("test")
+    buffer.put(1)
+    buffer.put(2)
+    assert buffer.get(0) == 2
+    assert buffer.get_stats()["drops"] == 1
+
+
+def test_put_with_timeout_waits_for_consumer():
+    buffer = LatestFrameBuffer("test")
+    buffer.put(1)
+    taken = []
+
+    def consume():
+        time.sleep(0.05)
+        taken.append(buffer.get(1))
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    buffer.put(2, timeout=1)
+    consumer.join()
+    assert taken == [1]
+    assert buffer.get(0) == 2
+    assert buffer.get_stats()["drops"] == 0
+
+
+def test_put_with_timeout_overwrites_when_consumer_stalls():
+    buffer = LatestFrameBuffer("test")
+    buffer.put(1)
+    buffer.put(2, timeout=0.01)
+    assert buffer.get(0) == 2
+    assert buffer.get_stats()["drops"] == 1
@@ -0,0 +1,22 @@
+
+import cv2
+import numpy as np
+import pytest
+
+
+def test_opening_a_replay_keeps_its_first_frame(tmp_path, monkeypatch):
+    app = pytest.importorskip("app")
+    for index in range(3):
+        cv2.imwrite(str(tmp_path / f"{index}.png"), np.full((8, 8, 3), index * 100, np.uint8))
+    monkeypatch.setitem(app.replay_config, "pace", "fast")
+    monkeypatch.setitem(app.replay_config, "loop", False)
+    monkeypatch.setitem(app.replay_sources, "int-001", None)
+
+    cap = app.open_camera(f"replay:{tmp_path}", "int-001")
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(int(frame[0, 0, 0]))
+    assert frames == [0, 100, 200]
@@ -0,0 +1,51 @@
+
+import uuid
+from functools import partial
+
+import numpy as np
+
+from shm_transport import SharedFrameRing
+from streaming import FrameBroadcaster
+
+
+def make_ring(slots=2):
+    return SharedFrameRing(f"test_{uuid.uuid4().hex[:8]}", slots, (8, 8, 3), create=True)
+
+
+def frame(value):
+    return np.full((8, 8, 3), value, np.uint8)
+
+
+def test_reads_of_a_reused_slot_are_rejected():
+    ring = make_ring()
+    try:
+        seq = ring.write(frame(10))
+        assert ring.copy(seq)[0, 0, 0] == 10
+        ring.write(frame(20))
+        ring.write(frame(30))  # Wraps around into seq's slot
+        assert not ring.is_current(seq)
+        assert ring.read(seq)[1] is None
+        assert ring.copy(seq) is None
+    finally:
+        ring.close(unlink=True)
+
+
+def test_frame_overwritten_during_encode_is_dropped():
+    ring = make_ring()
+    broadcaster = FrameBroadcaster("test")
+    try:
+        seq, view = ring.read(ring.write(frame(10)))
+        broadcaster.publish(view, partial(ring.is_current, seq))
+        ring.write(frame(20))
+        ring.write(frame(30))  # The published view now shows another frame
+
+        assert broadcaster.get_jpeg(0, timeout=0.05)[1] is None
+        assert broadcaster.get_stats()["torn_frames"] == 1
+        assert broadcaster.encoded == {}
+
+        seq, view = ring.read()
+        broadcaster.publish(view, partial(ring.is_current, seq))
+        published, jpeg = broadcaster.get_jpeg(0, timeout=0.05)
+        assert published == 2 and jpeg is not None
+    finally:
+        ring.close(unlink=True)
@@ -0,0 +1,78 @@
+
+import pytest
+
+from signals import PhaseTimer
+
+
+def test_fire_due_fires_in_due_order():
+    timer = PhaseTimer("test")
+    timer.schedule("b", 20.0)
+    timer.schedule("a", 10.0)
+    timer.schedule("c", 30.0)
+    fired = []
+    timer.fire_due(25.0, lambda key, due, now: fired.append((key, due, now)))
+    assert fired == [("a", 10.0, 10.0), ("b", 20.0, 20.0)]
+    assert timer.deadline("c") == 30.0
+
+
+def test_reschedule_and_cancel_drop_old_deadlines():
+    timer = PhaseTimer("test")
+    timer.schedule("a", 10.0)
+    timer.schedule("a", 15.0)
+    timer.schedule("b", 12.0)
+    timer.cancel("b")
+    fired = []
+    timer.fire_due(100.0, lambda key, due, now: fired.append((key, due)))
+    assert fired == [("a", 15.0)]
+    assert timer.deadline("a") is None
+    assert timer.get_stats()["fired"] == 1
+
+
+@pytest.fixture
+def app_state():
+    app = pytest.importorskip("app")
+    ids = app.intersection_registry.ids()
+    with app.data_lock:
+        for intersection_id in ids:
+            app.auto_control[intersection_id]["enabled"] = False
+            app.signal_timer.cancel(intersection_id)
+            app.traffic_data[intersection_id]["vehicleCount"] = 0
+            app.traffic_signals[intersection_id] = app.intersection_registry.get(intersection_id).initial_signal
+        for intersection_id in ids:
+            app.enable_auto_control(intersection_id, True, 1000.0)
+    yield app
+    with app.data_lock:
+        for intersection_id in ids:
+            app.enable_auto_control(intersection_id, False, 0.0)
+
+
+def test_superseded_deadline_does_not_advance_phase(app_state):
+    app = app_state
+    intersection_id = "int-001"
+    assert app.traffic_signals[intersection_id] == "red"
+
+    def preempt_then_advance(key, due, now):
+        # An emergency preempts the signal after the timer popped the
+        # deadline but before the callback got data_lock
+        if key == intersection_id:
+            with app.data_lock:
+                app.preempt_for_emergency(intersection_id, due - 1.0)
+        app.advance_signal_phase(key, due, now)
+
+    due = app.signal_timer.deadline(intersection_id)
+    app.signal_timer.fire_due(due, preempt_then_advance)
+    assert app.traffic_signals[intersection_id] == "green"
+    assert app.signal_timer.deadline(intersection_id) is not None
+
+
+def test_late_firing_starts_next_phase_at_due(app_state):
+    app = app_state
+    intersection_id = "int-002"
+    due = app.signal_timer.deadline(intersection_id)
+    app.advance_signal_phase(intersection_id, due, due + 3.0)
+    assert app.traffic_signals[intersection_id] == "yellow"
+    assert app.auto_control[intersection_id]["last_change_time"] == due
+
+    # A second call with the same deadline is stale
+    app.advance_signal_phase(intersection_id, due, due + 3.0)
+    assert app.traffic_signals[intersection_id] == "yellow"
@@ -0,0 +1,44 @@
+
+import asyncio
+
+import numpy as np
+
+import streaming
+from streaming import FrameBroadcaster
+
+
+def test_timed_out_async_waiters_are_dropped():
+    broadcaster = FrameBroadcaster("test")
+
+    async def wait_repeatedly():
+        for _ in range(5):
+            assert await broadcaster.wait_for_seq_async(0, timeout=0.01) is None
+    asyncio.run(wait_repeatedly())
+    assert broadcaster.async_waiters == []
+
+
+def test_async_waiter_is_woken_by_publish():
+    broadcaster = FrameBroadcaster("test")
+
+    async def wait_for_publish():
+        waiter = asyncio.ensure_future(broadcaster.wait_for_seq_async(0, timeout=5))
+        await asyncio.sleep(0.01)
+        broadcaster.publish(np.zeros((4, 4, 3), np.uint8))
+        return await waiter
+    assert asyncio.run(wait_for_publish()) == 1
+    assert broadcaster.async_waiters == []
+
+
+def test_failed_encode_waits_for_the_next_frame(monkeypatch):
+    broadcaster = FrameBroadcaster("test")
+    calls = []
+
+    def failing_imencode(*args):
+        calls.append(args)
+        return False, None
+    monkeypatch.setattr(streaming.cv2, "imencode", failing_imencode)
+    broadcaster.publish(np.zeros((4, 4, 3), np.uint8))
+
+    assert broadcaster.get_jpeg(0, timeout=0.05) == (1, None)
+    assert len(calls) == 1  # Not re-encoded until another frame is published
+    assert broadcaster.get_stats()["encode_failures"] == 1
@@ -0,0 +1,137 @@
+
+import json
+import threading
+import time
+
+from bson import ObjectId
+
+from violations import ViolationWriter
+
+
+class FakeCollection:
+    """
+    insert_many target that fails after a number of calls or while
+    unavailable, and can hold calls until released
+    """
+    def __init__(self, fail_after=None):
+        self.documents = []
+        self.calls = 0
+        self.fail_after = fail_after
+        self.available = True
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+
+    def insert_many(self, documents, ordered=True):
+        self.entered.set()
+        self.release.wait()
+        self.calls += 1
+        if not self.available or self.fail_after is not None and self.calls > self.fail_after:
+            raise ConnectionError("database unavailable")
+        self.documents.extend(documents)
+
+
+def make_writer(collection, tmp_path, **options):
+    return ViolationWriter(collection, str(tmp_path / "spill.jsonl"),
+                           **dict({"batch_size": 2, "max_retries": 0, "retry_backoff": 0}, **options))
+
+
+def spilled_plates(writer):
+    with open(writer.spill_path) as f:
+        return [json.loads(line)["vehicleNumber"] for line in f]
+
+
+def spill(writer, *plates):
+    docs = [{"_id": ObjectId(), "vehicleNumber": plate} for plate in plates]
+    writer._spill(docs)
+    return docs
+
+
+def test_replay_inserts_spilled_documents_and_removes_file(tmp_path):
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path)
+    spilled = spill(writer, "A", "B", "C")
+    writer._replay_spill()
+    assert [doc["vehicleNumber"] for doc in collection.documents] == ["A", "B", "C"]
+    assert [doc["_id"] for doc in collection.documents] == [doc["_id"] for doc in spilled]
+    assert writer.get_stats()["replayed"] == 3
+    assert writer.get_stats()["spill_file"] is None
+
+
+def test_failed_replay_keeps_remainder_ahead_of_new_spills(tmp_path):
+    collection = FakeCollection(fail_after=1)
+    writer = make_writer(collection, tmp_path)
+    spill(writer, "A", "B", "C", "D", "E")
+
+    # Hold the first batch so a new spill lands while the replay runs
+    collection.release.clear()
+    replay = threading.Thread(target=writer._replay_spill)
+    replay.start()
+    assert collection.entered.wait(1)
+    spiller = threading.Thread(target=spill, args=(writer, "F"))
+    spiller.start()
+    spiller.join(0.5)
+    collection.release.set()
+    replay.join(1)
+    spiller.join(1)
+
+    assert [doc["vehicleNumber"] for doc in collection.documents] == ["A", "B"]
+    assert spilled_plates(writer) == ["C", "D", "E", "F"]
+    assert writer.get_stats()["replayed"] == 2
+
+
+def test_submit_does_not_wait_for_replay(tmp_path):
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path, max_queue_size=1)
+    spill(writer, "A")
+    collection.release.clear()
+    replay = threading.Thread(target=writer._replay_spill)
+    replay.start()
+    assert collection.entered.wait(1)
+
+    # The queue is full, so the second one spills while the replay is still writing
+    submitter = threading.Thread(target=lambda: [writer.submit({"vehicleNumber": plate}) for plate in "BC"])
+    submitter.start()
+    submitter.join(0.5)
+    blocked = submitter.is_alive()
+    collection.release.set()
+    replay.join(1)
+    submitter.join(1)
+
+    assert not blocked
+    assert spilled_plates(writer) == ["C"]
+    assert [doc["vehicleNumber"] for doc in collection.documents] == ["A"]
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_spill_from_earlier_run_is_replayed_at_start(tmp_path):
+    spill(make_writer(FakeCollection(), tmp_path), "A", "B")
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path).start()
+    try:
+        assert wait_until(lambda: len(collection.documents) == 2)
+        assert writer.get_stats()["spill_file"] is None
+    finally:
+        writer.close()
+
+
+def test_spill_is_replayed_when_database_recovers_without_new_traffic(tmp_path):
+    collection = FakeCollection()
+    collection.available = False
+    writer = make_writer(collection, tmp_path, flush_interval=0.01, max_replay_delay=0.05).start()
+    try:
+        writer.submit({"vehicleNumber": "A"})
+        assert wait_until(lambda: writer.get_stats()["spilled"] == 1)
+        assert wait_until(lambda: collection.calls >= 3)  # Idle replays keep trying
+        collection.available = True
+        assert wait_until(lambda: [doc["vehicleNumber"] for doc in collection.documents] == ["A"])
+        assert writer.get_stats()["replayed"] == 1
+        assert writer.get_stats()["spill_file"] is None
+    finally:
+        writer.close()
@@ -0,0 +1,170 @@
+
+import itertools
+import threading
+import time
+
+
+class TrackIdAllocator:
+    """
+    Thread-safe source of vehicle IDs shared by all intersections
+    """
+    def __init__(self, start=1, prefix="v-"):
+        self.prefix = prefix
+        self.counter = itertools.count(start)
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            return f"{self.prefix}{next(self.counter)}"
+
+
+class Track:
+    """
+    A vehicle being followed across frames
+    """
+    __slots__ = ("track_id", "box", "center", "velocity", "first_seen", "last_seen", "hits")
+
+    def __init__(self, track_id, box, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.center = box_center(box)
+        self.velocity = (0.0, 0.0)  # Pixels per second
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+
+    def update(self, box, timestamp):
+        center = box_center(box)
+        dt = timestamp - self.last_seen
+        if dt > 0:
+            self.velocity = ((center[0] - self.center[0]) / dt, (center[1] - self.center[1]) / dt)
+        self.box = box
+        self.center = center
+        self.last_seen = timestamp
+        self.hits += 1
+
+
+def box_center(box):
+    x, y, w, h = box
+    return (x + w // 2, y + h // 2)
+
+
+def box_iou(a, b):
+    """
+    Intersection over union of two (x, y, w, h) boxes
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class VehicleTracker:
+    """
+    Multi-object tracker for one camera. Live tracks are bucketed in a uniform
+    grid so each detection is only compared against nearby tracks, matches are
+    assigned greedily by IoU (falling back to centre distance), and tracks that
+    have not been seen for max_age seconds are evicted.
+    """
+    def __init__(self, id_allocator, iou_threshold=0.3, max_distance=50, max_age=2.0, cell_size=64):
+        self.id_allocator = id_allocator
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.cell_size = cell_size
+        self.tracks = {}
+        self.grid = {}
+        self.evicted = 0
+
+    def _cells(self, box, margin=0):
+        x, y, w, h = box
+        size = self.cell_size
+        for cx in range((x - margin) // size, (x + w + margin) // size + 1):
+            for cy in range((y - margin) // size, (y + h + margin) // size + 1):
+                yield (cx, cy)
+
+    def _rebuild_grid(self):
+        self.grid = {}
+        for track in self.tracks.values():
+            for cell in self._cells(track.box):
+                self.grid.setdefault(cell, []).append(track)
+
+    def _candidates(self, box):
+        seen = {}
+        for cell in self._cells(box, self.max_distance):
+            for track in self.grid.get(cell, ()):
+                seen[track.track_id] = track
+        return seen.values()
+
+    def update(self, boxes, timestamp=None):
+        """
+        Match detected (x, y, w, h) boxes to live tracks and return the
+        vehicle ID for each box, in the same order
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        # Age out tracks that have not been seen recently
+        expired = [track_id for track_id, track in self.tracks.items()
+                   if timestamp - track.last_seen > self.max_age]
+        if expired:
+            for track_id in expired:
+                del self.tracks[track_id]
+            self.evicted += len(expired)
+            self._rebuild_grid()
+
+        # Score every nearby (detection, track) pair
+        pairs = []
+        for index, box in enumerate(boxes):
+            center = box_center(box)
+            for track in self._candidates(box):
+                iou = box_iou(box, track.box)
+                distance = ((center[0] - track.center[0]) ** 2 + (center[1] - track.center[1]) ** 2) ** 0.5
+                if iou >= self.iou_threshold or distance < self.max_distance:
+                    pairs.append((-iou, distance, index, track))
+
+        # Greedy assignment: best IoU first, closest centre breaks ties
+        pairs.sort(key=lambda pair: (pair[0], pair[1]))
+        assigned = [None] * len(boxes)
+        matched_tracks = set()
+        for _, _, index, track in pairs:
+            if assigned[index] is not None or track.track_id in matched_tracks:
+                continue
+            track.update(boxes[index], timestamp)
+            assigned[index] = track.track_id
+            matched_tracks.add(track.track_id)
+
+        # Unmatched detections start new tracks
+        for index, box in enumerate(boxes):
+            if assigned[index] is None:
+                track = Track(self.id_allocator.next_id(), box, timestamp)
+                self.tracks[track.track_id] = track
+                assigned[index] = track.track_id
+
+        self._rebuild_grid()
+        return assigned
+
+    def carry_forward(self, timestamp=None):
+        """
+        The scene has not changed since the tracks were last updated: keep
+        every live track alive at its last position, now at rest, so it is
+        not aged out while detection is paused
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        for track in self.tracks.values():
+            track.last_seen = max(track.last_seen, timestamp)
+            track.velocity = (0.0, 0.0)
+
+    def get_track(self, track_id):
+        return self.tracks.get(track_id)
+
+    def get_stats(self):
+        return {
+            "live_tracks": len(self.tracks),
+            "evicted_tracks": self.evicted
+        }
@@ -0,0 +1,525 @@
+
+import base64
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+
+# Fields a client may request in violation query results
+VIOLATION_FIELDS = ["vehicleNumber", "type", "timestamp", "location", "details", "imageUrl", "evidence"]
+
+# Query parameter -> document field for exact-match filters
+VIOLATION_FILTERS = {
+    "location": "location",
+    "type": "type",
+    "plate": "vehicleNumber"
+}
+
+# Newest first; _id breaks ties between violations with the same timestamp
+VIOLATION_SORT = [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+
+def encode_cursor(timestamp, document_id):
+    """
+    Opaque keyset cursor pointing just past the given (timestamp, _id)
+    """
+    raw = json.dumps([timestamp, str(document_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor; raises ValueError for a malformed cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, document_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(timestamp), str(document_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+class MongoViolationStore:
+    """
+    Violation storage backed by a MongoDB collection, queried with keyset
+    pagination over indexes so the cost of a page does not grow with the
+    size of the collection
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        """
+        Create the indexes used by query(); safe to call on every startup
+        """
+        self.collection.create_index(VIOLATION_SORT, name="timestamp_id")
+        for field in VIOLATION_FILTERS.values():
+            self.collection.create_index([(field, pymongo.ASCENDING)] + VIOLATION_SORT, name=f"{field}_timestamp_id")
+
+    def insert_many(self, documents, ordered=False):
+        return self.collection.insert_many(documents, ordered=ordered)
+
+    def get_stats(self):
+        return {"backend": "mongodb", "collection": self.collection.full_name}
+
+    def query(self, filters=None, cursor=None, limit=50, fields=None):
+        """
+        Return (documents, next_cursor) for one page of violations, newest first.
+        filters may contain location, type, plate, since and until (ISO timestamps).
+        """
+        filters = filters or {}
+        conditions = []
+        for name, field in VIOLATION_FILTERS.items():
+            if filters.get(name):
+                conditions.append({field: filters[name]})
+
+        time_range = {}
+        if filters.get("since"):
+            time_range["$gte"] = filters["since"]
+        if filters.get("until"):
+            time_range["$lte"] = filters["until"]
+        if time_range:
+            conditions.append({"timestamp": time_range})
+
+        if cursor:
+            timestamp, document_id = decode_cursor(cursor)
+            try:
+                document_id = ObjectId(document_id)
+            except InvalidId as e:
+                raise ValueError(f"Invalid cursor: {e}")
+            conditions.append({"timestamp": {"$lte": timestamp}})
+            conditions.append({"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": document_id}}
+            ]})
+
+        query = {"$and": conditions} if conditions else {}
+
+        # The cursor needs the timestamp even if the client did not ask for it
+        projection = {field: 1 for field in (fields or VIOLATION_FIELDS)}
+        projection["timestamp"] = 1
+
+        # Fetch one extra row to find out whether there is a next page
+        documents = list(self.collection.find(query, projection).sort(VIOLATION_SORT).limit(limit + 1))
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(documents[-1]["timestamp"], documents[-1]["_id"])
+        return documents, next_cursor
+
+
+class SQLiteViolationStore:
+    """
+    Embedded violation storage for deployments without MongoDB, with the same
+    insert_many/query interface as MongoViolationStore. Data lives in one
+    SQLite database in WAL mode, partitioned into a table per month so each
+    partition keeps small indexes and old months can be dropped whole during
+    compaction instead of deleting row by row.
+    """
+    def __init__(self, path, retention_days=90, compaction_interval=3600):
+        self.path = path
+        self.retention_days = retention_days
+        self.compaction_interval = compaction_interval
+        self.write_lock = threading.Lock()
+        self.local = threading.local()  # One read connection per thread
+        self.partitions = frozenset()
+        self.last_compaction = None
+        self.next_compaction = time.time() + compaction_interval
+
+        self.writer = self._connect()
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self.writer.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+        rows = self.writer.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'violations_%'").fetchall()
+        self.partitions = frozenset(name for (name,) in rows)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _reader(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self._connect()
+        return connection
+
+    @staticmethod
+    def _partition_name(timestamp):
+        # ISO timestamps start with YYYY-MM
+        return f"violations_{timestamp[:4]}{timestamp[5:7]}"
+
+    def _create_partition(self, name):
+        self.writer.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                location TEXT,
+                type TEXT,
+                vehicleNumber TEXT,
+                document TEXT NOT NULL
+            )""")
+        self.writer.execute(f"CREATE INDEX IF NOT EXISTS {name}_timestamp_id ON {name} (timestamp DESC, id DESC)")
+        for field in VIOLATION_FILTERS.values():
+            self.writer.execute(
+                f"CREATE INDEX IF NOT EXISTS {name}_{field}_timestamp_id ON {name} ({field}, timestamp DESC, id DESC)")
+        self.partitions = self.partitions | {name}  # Replaced, not mutated, so readers can iterate safely
+
+    def ensure_indexes(self):
+        """
+        Indexes are created with each monthly partition; nothing to do up front
+        """
+
+    def insert_many(self, documents, ordered=False):
+        """
+        Write a batch in a single transaction. Documents whose _id is already
+        stored are ignored, so retried batches are idempotent.
+        """
+        rows = {}
+        for document in documents:
+            record = {key: value for key, value in document.items() if key != "_id"}
+            row = (str(document["_id"]), record["timestamp"], record.get("location"),
+                   record.get("type"), record.get("vehicleNumber"), json.dumps(record))
+            rows.setdefault(self._partition_name(record["timestamp"]), []).append(row)
+
+        with self.write_lock:
+            self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                for name, partition_rows in rows.items():
+                    if name not in self.partitions:
+                        self._create_partition(name)
+                    self.writer.executemany(
+                        f"INSERT OR IGNORE INTO {name} (id, timestamp, location, type, vehicleNumber, document) "
+                        f"VALUES (?, ?, ?, ?, ?, ?)", partition_rows)
+                self.writer.execute("COMMIT")
+            except Exception:
+                self.writer.execute("ROLLBACK")
+                raise
+
+        if time.time() >= self.next_compaction:
+            self.compact()
+
+    def query(self, filters=None, cursor=None, limit=50, fields=None):
+        """
+        Return (documents, next_cursor) for one page of violations, newest
+        first, with the same filters and cursors as MongoViolationStore.query
+        """
+        filters = filters or {}
+        conditions = []
+        params = []
+        for name, field in VIOLATION_FILTERS.items():
+            if filters.get(name):
+                conditions.append(f"{field} = ?")
+                params.append(filters[name])
+        if filters.get("since"):
+            conditions.append("timestamp >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            conditions.append("timestamp <= ?")
+            params.append(filters["until"])
+
+        newest_partition = None
+        if cursor:
+            timestamp, document_id = decode_cursor(cursor)
+            # The leading range keeps this a bounded index scan from the cursor
+            conditions.append("timestamp <= ? AND (timestamp < ? OR id < ?)")
+            params += [timestamp, timestamp, document_id]
+            newest_partition = self._partition_name(timestamp)
+        if filters.get("until"):
+            until_partition = self._partition_name(filters["until"])
+            newest_partition = min(newest_partition or until_partition, until_partition)
+        oldest_partition = self._partition_name(filters["since"]) if filters.get("since") else None
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        connection = self._reader()
+
+        # Walk partitions newest first until the page (plus one row) is full
+        rows = []
+        for name in sorted(self.partitions, reverse=True):
+            if newest_partition and name > newest_partition:
+                continue
+            if oldest_partition and name < oldest_partition:
+                break
+            try:
+                rows += connection.execute(
+                    f"SELECT id, document FROM {name} {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    params + [limit + 1 - len(rows)]).fetchall()
+            except sqlite3.OperationalError:
+                continue  # Partition dropped by compaction since we listed it
+            if len(rows) > limit:
+                break
+
+        documents = []
+        for document_id, data in rows[:limit]:
+            record = json.loads(data)
+            document = {"_id": document_id, "timestamp": record["timestamp"]}
+            for field in (fields or VIOLATION_FIELDS):
+                if field in record:
+                    document[field] = record[field]
+            documents.append(document)
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(documents[-1]["timestamp"], documents[-1]["_id"])
+        return documents, next_cursor
+
+    def compact(self):
+        """
+        Drop partitions past the retention period, trim the oldest remaining
+        partition and checkpoint the WAL back into the database file
+        """
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        cutoff_partition = self._partition_name(cutoff)
+        dropped = 0
+        with self.write_lock:
+            for name in sorted(self.partitions):
+                if name < cutoff_partition:
+                    self.writer.execute(f"DROP TABLE IF EXISTS {name}")
+                    self.partitions = self.partitions - {name}
+                    dropped += 1
+                elif name == cutoff_partition:
+                    self.writer.execute(f"DELETE FROM {name} WHERE timestamp < ?", (cutoff,))
+            self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.last_compaction = datetime.now().isoformat()
+            self.next_compaction = time.time() + self.compaction_interval
+        if dropped:
+            print(f"Violation store compaction dropped {dropped} partition(s) older than {self.retention_days} days")
+
+    def get_stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "partitions": sorted(self.partitions),
+            "retention_days": self.retention_days,
+            "last_compaction": self.last_compaction
+        }
+
+
+class ViolationWriter:
+    """
+    Write-behind persistence for violation records. Callers enqueue documents
+    without touching the database; a background worker drains the queue with
+    insert_many, flushing when a batch fills up or the flush interval passes.
+    Failed batches are retried with exponential backoff and, if the database
+    stays unreachable, appended to a local spill file. The spill file
+    (including one left by an earlier run) is replayed at start, after each
+    successful batch and on idle flush intervals, backing off up to
+    max_replay_delay seconds between failed replays. With metrics (a PipelineMetrics), the time of every
+    successful batch write is observed as "db_write".
+    """
+    def __init__(self, collection, spill_path, max_queue_size=10000, batch_size=100,
+                 flush_interval=1.0, max_retries=3, retry_backoff=0.5, max_replay_delay=60.0, metrics=None):
+        self.collection = collection
+        self.metrics = metrics
+        self.spill_path = spill_path
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_replay_delay = max_replay_delay
+        self.replay_delay = flush_interval
+        self.next_replay = 0.0  # Earliest time of the next idle replay attempt
+        self.spill_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "queued": 0,
+            "written": 0,
+            "batches": 0,
+            "retries": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "last_error": None
+        }
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        """
+        Start the background writer thread
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            print(f"Started violation writer (batch {self.batch_size}, flush every {self.flush_interval}s)")
+        return self
+
+    def submit(self, document):
+        """
+        Queue a violation document for writing; never waits on the database
+        """
+        # A client-side _id makes retries idempotent
+        document.setdefault("_id", ObjectId())
+        try:
+            self.queue.put_nowait(document)
+            self._count("queued")
+        except queue.Full:
+            # Keep the record rather than block the caller
+            self._spill([document])
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _collect_batch(self):
+        """
+        Wait for the first document, then gather more until the batch is full
+        or the flush interval has passed
+        """
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, documents):
+        """
+        insert_many with duplicate-key errors (already written on an earlier
+        attempt) treated as success
+        """
+        try:
+            self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if not errors or any(error.get("code") != 11000 for error in errors):
+                raise
+
+    def _write(self, documents):
+        """
+        Write a batch with retry and backoff; returns True if it was stored
+        """
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                start_time = time.time()
+                self._insert(documents)
+                if self.metrics is not None:
+                    self.metrics.observe("db_write", time.time() - start_time)
+                self._count("written", len(documents))
+                self._count("batches")
+                return True
+            except Exception as e:
+                with self.stats_lock:
+                    self.stats["last_error"] = str(e)
+                if attempt == self.max_retries or self.stopping.is_set():
+                    break
+                self._count("retries")
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _spill(self, documents):
+        """
+        Append documents to the local spill file as JSON lines
+        """
+        with self.spill_lock:
+            with open(self.spill_path, "a") as f:
+                for document in documents:
+                    record = dict(document)
+                    record["_id"] = str(record["_id"])
+                    f.write(json.dumps(record) + "\n")
+        self._count("spilled", len(documents))
+        print(f"Violation database unavailable: spilled {len(documents)} record(s) to {self.spill_path}")
+
+    def _replay_spill(self):
+        """
+        Re-insert spilled documents once the database accepts writes again.
+        The spill file is moved aside under spill_lock and replayed without
+        it, so submit() can keep spilling while the database is retried;
+        documents left over are put back in front of anything spilled since.
+        Returns False if documents are left over.
+        """
+        replay_path = self.spill_path + ".replaying"
+        with self.spill_lock:
+            # A replay file left by an interrupted replay goes first
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return True
+                os.replace(self.spill_path, replay_path)
+
+        with open(replay_path, "r") as f:
+            documents = [json.loads(line) for line in f if line.strip()]
+        for document in documents:
+            document["_id"] = ObjectId(document["_id"])
+
+        for start in range(0, len(documents), self.batch_size):
+            if not self._write(documents[start:start + self.batch_size]):
+                # Keep what is left for the next attempt
+                with self.spill_lock:
+                    spilled_since = []
+                    if os.path.exists(self.spill_path):
+                        with open(self.spill_path, "r") as f:
+                            spilled_since = [line for line in f if line.strip()]
+                    with open(self.spill_path, "w") as f:
+                        for document in documents[start:]:
+                            document["_id"] = str(document["_id"])
+                            f.write(json.dumps(document) + "\n")
+                        f.writelines(spilled_since)
+                    os.remove(replay_path)
+                self._count("replayed", start)
+                return False
+
+        os.remove(replay_path)
+        self._count("replayed", len(documents))
+        print(f"Replayed {len(documents)} spilled violation record(s) into the database")
+        return True
+
+    def _try_replay(self):
+        """
+        Replay the spill file; after a failure, wait twice as long (up to
+        max_replay_delay) before the next idle attempt
+        """
+        if self._replay_spill():
+            self.replay_delay = self.flush_interval
+            self.next_replay = 0.0
+        else:
+            self.next_replay = time.time() + self.replay_delay
+            self.replay_delay = min(self.replay_delay * 2, self.max_replay_delay)
+
+    def _run(self):
+        self._try_replay()  # Records spilled by an earlier run
+        while not self.stopping.is_set() or not self.queue.empty():
+            batch = self._collect_batch()
+            if not batch:
+                # Idle: the database may have recovered without new traffic
+                if not self.stopping.is_set() and time.time() >= self.next_replay:
+                    self._try_replay()
+                continue
+            if self._write(batch):
+                self._try_replay()
+            else:
+                self._spill(batch)
+
+    def close(self, timeout=5.0):
+        """
+        Flush queued documents and stop the writer
+        """
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["pending"] = self.queue.qsize()
+        stats["spill_file"] = next(
+            (path for path in (self.spill_path, self.spill_path + ".replaying") if os.path.exists(path)), None)
+        return stats
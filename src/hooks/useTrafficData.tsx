@@ -1,13 +1,17 @@
 import { useState, useEffect, useCallback } from "react";
 import { 
   fetchTrafficData, 
+  fetchTrafficHistory,
   updateTrafficSignal, 
   getCameraStreamUrl, 
+  getTrafficEventsUrl,
   TrafficData,
+  TrafficEvent,
   checkTrafficViolations,
   fetchViolations,
   ViolationData,
-  toggleAutoMode
+  toggleAutoMode,
+  TrafficHistory
 } from "@/lib/api";
 import { toast } from "sonner";
 
@@ -34,30 +38,61 @@ const intersectionNames = {
   "int-002": "Park Avenue"
 };
 
-// Generate initial history data
-const generateHistoryData = (): HistoryDataPoint[] => {
-  const data = [];
-  const now = new Date();
+// Turn per-intersection history columns into one chart point per minute
+const toHistoryData = (history: TrafficHistory): HistoryDataPoint[] => {
+  const points = new Map<number, HistoryDataPoint>();
   
-  for (let i = 60; i >= 0; i--) {
-    const time = new Date(now);
-    time.setMinutes(now.getMinutes() - i);
+  Object.entries(history.intersections).forEach(([id, series]) => {
+    const intersectionName = intersectionNames[id as keyof typeof intersectionNames];
+    if (!intersectionName) {
+      return;
+    }
     
-    data.push({
-      time: time.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-      "Main Street": Math.floor(Math.random() * 20) + 5,
-      "Park Avenue": Math.floor(Math.random() * 20) + 5,
+    series.time.forEach((time, index) => {
+      if (!points.has(time)) {
+        points.set(time, {
+          time: new Date(time * 1000).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+        });
+      }
+      points.get(time)![intersectionName] = Math.round(series.mean[index]);
     });
-  }
+  });
   
-  return data;
+  return [...points.entries()].sort(([a], [b]) => a - b).map(([, point]) => point);
+};
+
+// Map API data to an intersection object
+const toIntersection = (item: TrafficData): Intersection => ({
+  id: item.intersectionId,
+  name: intersectionNames[item.intersectionId as keyof typeof intersectionNames] || "Unknown Intersection",
+  vehicleCount: item.vehicleCount,
+  status: item.status || "red",
+  emergency: item.hasEmergencyVehicle,
+  lastUpdated: item.timestamp ? new Date(item.timestamp).toLocaleTimeString() : 'N/A',
+  autoMode: item.autoMode || false,
+});
+
+// Apply a single delta event pushed by the backend
+const applyTrafficEvent = (intersections: Intersection[], event: TrafficEvent): Intersection[] => {
+  return intersections.map(intersection => {
+    if (intersection.id !== event.intersectionId) {
+      return intersection;
+    }
+    
+    const updated = { ...intersection, lastUpdated: new Date(event.timestamp).toLocaleTimeString() };
+    if (event.type === "signal" && event.status) updated.status = event.status;
+    if (event.type === "vehicleCount" && event.vehicleCount !== undefined) updated.vehicleCount = event.vehicleCount;
+    if (event.type === "emergency" && event.hasEmergencyVehicle !== undefined) updated.emergency = event.hasEmergencyVehicle;
+    if (event.type === "autoMode" && event.enabled !== undefined) updated.autoMode = event.enabled;
+    return updated;
+  });
 };
 
 export const useTrafficData = () => {
   const [intersections, setIntersections] = useState<Intersection[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
-  const [historyData, setHistoryData] = useState<HistoryDataPoint[]>(generateHistoryData());
+  const [historyData, setHistoryData] = useState<HistoryDataPoint[]>([]);
   const [cameraUrls, setCameraUrls] = useState<Record<string, string>>({});
   const [violations, setViolations] = useState<ViolationData[]>([]);
   const [loadingViolations, setLoadingViolations] = useState(false);
@@ -79,11 +114,10 @@ export const useTrafficData = () => {
     return () => clearInterval(cameraInterval);
   }, []);
 
-  // Fetch traffic data from the backend
+  // Subscribe to pushed traffic updates instead of polling
   useEffect(() => {
-    const fetchData = async () => {
+    const loadSnapshot = async () => {
       try {
-        setLoading(true);
         const data = await fetchTrafficData();
         
         if (!data || data.length === 0) {
@@ -91,37 +125,7 @@ export const useTrafficData = () => {
           return;
         }
         
-        // Map API data to intersection objects
-        const updatedIntersections = data.map(item => ({
-          id: item.intersectionId,
-          name: intersectionNames[item.intersectionId as keyof typeof intersectionNames] || "Unknown Intersection",
-          vehicleCount: item.vehicleCount,
-          status: item.status || "red",
-          emergency: item.hasEmergencyVehicle,
-          lastUpdated: item.timestamp ? new Date(item.timestamp).toLocaleTimeString() : 'N/A',
-          autoMode: item.autoMode || false,
-        }));
-        
-        setIntersections(updatedIntersections);
-        
-        // Update history with new data points
-        setHistoryData(prev => {
-          const newPoint: HistoryDataPoint = {
-            time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
-          };
-          
-          // Add data for each intersection
-          updatedIntersections.forEach(intersection => {
-            const intersectionName = intersectionNames[intersection.id as keyof typeof intersectionNames];
-            if (intersectionName) {
-              newPoint[intersectionName] = intersection.vehicleCount;
-            }
-          });
-          
-          // Keep only the last 60 data points
-          return [...prev.slice(1), newPoint];
-        });
-        
+        setIntersections(data.map(toIntersection));
         setError(null);
       } catch (err) {
         console.error("Failed to fetch traffic data:", err);
@@ -131,10 +135,54 @@ export const useTrafficData = () => {
       }
     };
 
-    fetchData();
+    // Browsers without EventSource fall back to polling
+    if (typeof EventSource === "undefined") {
+      loadSnapshot();
+      const interval = setInterval(loadSnapshot, 3000);
+      return () => clearInterval(interval);
+    }
+
+    // The stream opens with a full snapshot, then sends only changes.
+    // EventSource reconnects on its own and resumes from the last event ID.
+    const source = new EventSource(getTrafficEventsUrl());
+    
+    source.addEventListener("snapshot", (message) => {
+      const data: TrafficData[] = JSON.parse((message as MessageEvent).data);
+      setIntersections(data.map(toIntersection));
+      setLoading(false);
+      setError(null);
+    });
+    
+    ["signal", "vehicleCount", "emergency", "autoMode"].forEach(type => {
+      source.addEventListener(type, (message) => {
+        const event: TrafficEvent = JSON.parse((message as MessageEvent).data);
+        setIntersections(prev => applyTrafficEvent(prev, event));
+      });
+    });
+    
+    source.onopen = () => setError(null);
+    
+    source.onerror = () => {
+      console.error("Traffic event stream disconnected, retrying...");
+      setError("Lost connection to traffic updates. Please ensure the backend server is running.");
+      setLoading(false);
+    };
+
+    return () => source.close();
+  }, []);
+
+  // Load the last hour of per-minute counts recorded by the backend, and
+  // refresh it every 10 seconds (the current minute fills in as it goes)
+  useEffect(() => {
+    const loadHistory = async () => {
+      const history = await fetchTrafficHistory("1m");
+      if (history) {
+        setHistoryData(toHistoryData(history));
+      }
+    };
     
-    // Refresh data every 3 seconds
-    const interval = setInterval(fetchData, 3000);
+    loadHistory();
+    const interval = setInterval(loadHistory, 10000);
     
     return () => clearInterval(interval);
   }, []);
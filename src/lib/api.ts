@@ -18,11 +18,67 @@ export interface ViolationData {
   location: string;
   details?: string;
   imageUrl?: string;
+  // Content-addressed evidence snapshot IDs, served from /api/evidence/<id>
+  evidence?: {
+    frame: string;
+    vehicle?: string;
+  };
+}
+
+export interface ViolationQuery {
+  location?: string;
+  type?: ViolationData["type"];
+  plate?: string;
+  since?: string;
+  until?: string;
+  limit?: number;
+  cursor?: string;
+}
+
+export interface ViolationPage {
+  violations: ViolationData[];
+  nextCursor: string | null;
+}
+
+// Delta event pushed by the backend on /api/traffic/events
+export interface TrafficEvent {
+  id: string;  // Resume token "<epoch>:<sequence>"; the epoch changes when the backend restarts
+  type: "signal" | "vehicleCount" | "emergency" | "autoMode";
+  intersectionId: string;
+  timestamp: string;
+  status?: "red" | "yellow" | "green";
+  vehicleCount?: number;
+  hasEmergencyVehicle?: boolean;
+  enabled?: boolean;
+}
+
+// Vehicle count rollups of one intersection from /api/traffic/history, as columns
+export interface TrafficHistorySeries {
+  time: number[];  // Bucket start, epoch seconds
+  min: number[];
+  mean: number[];
+  max: number[];
+  samples: number[];
+  signal: ("red" | "yellow" | "green" | null)[];
+  signalChanges: number[];
+}
+
+export interface TrafficHistory {
+  resolution: "1s" | "1m" | "1h";
+  since: number;
+  until: number;
+  intersections: Record<string, TrafficHistorySeries>;
 }
 
 // Base URL for the backend API
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000';
 
+// Evidence image URLs come back relative to the backend
+const withAbsoluteImageUrl = (violation: ViolationData): ViolationData =>
+  violation.imageUrl?.startsWith('/')
+    ? { ...violation, imageUrl: `${API_BASE_URL}${violation.imageUrl}` }
+    : violation;
+
 // Fetch traffic data from the backend
 export const fetchTrafficData = async (): Promise<TrafficData[]> => {
   try {
@@ -43,6 +99,22 @@ export const fetchTrafficData = async (): Promise<TrafficData[]> => {
   }
 };
 
+// Fetch recorded vehicle counts per intersection (the last 60 buckets by default)
+export const fetchTrafficHistory = async (resolution: TrafficHistory["resolution"] = "1m"): Promise<TrafficHistory | null> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/traffic/history?resolution=${resolution}`);
+    
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error("Error fetching traffic history:", error);
+    return null;
+  }
+};
+
 // Update traffic signal on the backend
 export const updateTrafficSignal = async (
   intersectionId: string,
@@ -105,9 +177,18 @@ export const toggleAutoMode = async (
   }
 };
 
+// Server-Sent Events stream of traffic state changes
+export const getTrafficEventsUrl = (): string => {
+  return `${API_BASE_URL}/api/traffic/events`;
+};
+
+// Named stream profiles served by the backend
+export type StreamProfile = "thumbnail" | "operator" | "evidence";
+
 // Get camera URL with appropriate parameters
-export const getCameraStreamUrl = (intersectionId: string, fps: number = 1): string => {
-  return `${API_BASE_URL}/api/video_feed/${intersectionId}?fps=${fps}`;
+export const getCameraStreamUrl = (intersectionId: string, fps: number = 1, profile?: StreamProfile): string => {
+  const profileParam = profile ? `&profile=${profile}` : '';
+  return `${API_BASE_URL}/api/video_feed/${intersectionId}?fps=${fps}${profileParam}`;
 };
 
 // Enhanced violation checking with better error handling
@@ -155,10 +236,37 @@ export const fetchViolations = async (): Promise<ViolationData[]> => {
     
     const data = await response.json();
     console.log('Successfully received violations data:', data);
-    return Array.isArray(data) ? data : [];
+    return Array.isArray(data) ? data.map(withAbsoluteImageUrl) : [];
   } catch (error) {
     console.error("Error fetching violations:", error);
     toast.error("Could not fetch violation data. Is the backend server running?");
     return [];
   }
 };
+
+// Fetch one page of violations; pass nextCursor back in the query for the next page
+export const fetchViolationsPage = async (query: ViolationQuery = {}): Promise<ViolationPage> => {
+  try {
+    const params = new URLSearchParams();
+    Object.entries(query).forEach(([key, value]) => {
+      if (value !== undefined && value !== "") {
+        params.set(key, String(value));
+      }
+    });
+    const response = await fetch(`${API_BASE_URL}/api/traffic/violations?${params.toString()}`);
+    
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    
+    const data = await response.json();
+    return {
+      violations: Array.isArray(data) ? data.map(withAbsoluteImageUrl) : [],
+      nextCursor: response.headers.get("X-Next-Cursor")
+    };
+  } catch (error) {
+    console.error("Error fetching violations page:", error);
+    toast.error("Could not fetch violation data. Is the backend server running?");
+    return { violations: [], nextCursor: null };
+  }
+};